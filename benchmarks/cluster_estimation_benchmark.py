@@ -0,0 +1,44 @@
+# Compares the cluster estimators of preprocessing_scripts/cluster_estimation.py against the exact KMeans +
+# silhouette sweep on synthetic gaze data (run from the repository root: python -m benchmarks.cluster_estimation_benchmark)
+import time
+
+import numpy as np
+import pandas as pd
+
+from preprocessing_scripts.cluster_estimation import estimate_clusters, CLUSTER_ESTIMATORS
+
+########################################################################################################################
+# Names
+########################################################################################################################
+N_SAMPLES = [1000, 4000, 12000]  # 12000 = 1 min of 200 Hz gaze data
+TRUE_CLUSTERS = [3, 6]
+REPETITIONS = 2
+
+
+def synthetic_gaze(n_samples, n_clusters, seed):
+    """Gaze positions in [0, 1]^2 around n_clusters fixation targets."""
+    rng = np.random.default_rng(seed)
+    targets = rng.uniform(0.1, 0.9, size=(n_clusters, 2))
+    labels = rng.integers(0, n_clusters, n_samples)
+    return np.clip(targets[labels] + rng.normal(0, 0.03, size=(n_samples, 2)), 0, 1.1)
+
+
+results = pd.DataFrame(columns=["n_samples", "true_k", "method", "seconds", "k", "score", "score_error"])
+for n_samples in N_SAMPLES:
+    for true_k in TRUE_CLUSTERS:
+        for rep in range(REPETITIONS):
+            X = synthetic_gaze(n_samples, true_k, seed=rep)
+            exact_score = None
+            for method in CLUSTER_ESTIMATORS.keys():
+                start = time.perf_counter()
+                k, score = estimate_clusters(X, method=method)
+                seconds = time.perf_counter() - start
+                if method == "exact":
+                    exact_score = score
+                results.loc[results.shape[0]] = [n_samples, true_k, method, seconds, k, score,
+                                                 abs(score - exact_score)]
+                print(f"n={n_samples} true k={true_k} {method}: {seconds:.2f}s k={k} score={score:.3f}")
+
+results["k_correct"] = results["k"] == results["true_k"]
+summary = results.groupby(["n_samples", "method"])[["seconds", "k_correct", "score_error"]].mean()
+print(summary)
@@ -0,0 +1,65 @@
+# Compares the native-rate EDA processing of calculate_eda_features against the 10 kHz upsampling on simulated 15 Hz
+# EDA recordings: feature parity on constants.ALL_EDA_FEATURES, run time and peak memory
+# (run from the repository root: python -m benchmarks.eda_processing_benchmark)
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+import pandas as pd
+import neurokit2 as nk
+
+import constants
+from preprocessing_scripts.eda_features import calculate_eda_features
+
+########################################################################################################################
+# Names
+########################################################################################################################
+DURATIONS = [60, 180, 300]  # seconds
+SCR_NUMBERS = [3, 10]
+REPETITIONS = 2
+MODES = {"upsample": 10000, "native": None}
+
+
+def simulated_eda(duration, scr_number, seed):
+    """EDA data frame as recorded by the device: 15 Hz, columns LocalTimestamp and EDA."""
+    eda = nk.eda_simulate(duration=duration, sampling_rate=constants.EDA_FREQ, scr_number=scr_number, drift=0.01,
+                          noise=0.01, random_state=seed)
+    return pd.DataFrame({"LocalTimestamp": np.arange(eda.shape[0]) / constants.EDA_FREQ, "EDA": eda})
+
+
+def run(eda_data, mode):
+    kwargs = {"mode": mode} if MODES[mode] is None else {"mode": mode, "target_f": MODES[mode]}
+    tracemalloc.start()
+    start = time.perf_counter()
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        features = calculate_eda_features(eda_data, **kwargs)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return features, seconds, peak / 2 ** 20
+
+
+results = pd.DataFrame(columns=["duration", "scr_number", "seed", "mode", "seconds", "peak_mb"] +
+                               constants.ALL_EDA_FEATURES)
+for duration in DURATIONS:
+    for scr_number in SCR_NUMBERS:
+        for seed in range(REPETITIONS):
+            eda_data = simulated_eda(duration, scr_number, seed)
+            for mode in MODES.keys():
+                features, seconds, peak_mb = run(eda_data, mode)
+                results.loc[results.shape[0]] = [duration, scr_number, seed, mode, seconds, peak_mb] + \
+                                                [features[k].iloc[0] for k in constants.ALL_EDA_FEATURES]
+                print(f"{duration}s, {scr_number} SCRs, seed {seed}, {mode}: {seconds:.2f}s, {peak_mb:.1f} MB")
+
+upsample = results.loc[results["mode"] == "upsample"].reset_index(drop=True)
+native = results.loc[results["mode"] == "native"].reset_index(drop=True)
+# relative deviation of the native features from the upsampled ones
+deviation = pd.DataFrame({k: np.abs(native[k].astype(float) - upsample[k].astype(float)) /
+                             np.abs(upsample[k].astype(float)).replace(0, np.nan)
+                          for k in constants.ALL_EDA_FEATURES})
+deviation["duration"] = upsample["duration"]
+print("relative feature deviation native vs. upsample (median):")
+print(deviation.groupby("duration").median().to_string())
+print(results.groupby(["duration", "mode"])[["seconds", "peak_mb"]].mean().to_string())
@@ -0,0 +1,74 @@
+# Compares the entropy kernels of preprocessing_scripts/entropy.py with neurokit on RR interval series of typical
+# recording lengths: parity of every measure and time per recording, plus the batched computation of a whole study
+# (run from the repository root: python -m benchmarks.entropy_benchmark)
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+import neurokit2 as nk
+
+from preprocessing_scripts import entropy
+
+########################################################################################################################
+# Names
+########################################################################################################################
+N_BEATS = [350, 700, 2000]  # ~5 min (Julia study ECG), ~10 min, ~30 min
+N_RECORDINGS = 40  # recordings of the batched study
+RELATIVE_TOLERANCE = 1e-10
+
+
+def rr_intervals(n, seed):
+    """Slowly drifting RR intervals in ms with beat-to-beat noise, quantized to 10 ms like peaks at 100 Hz."""
+    rng = np.random.default_rng(seed)
+    return np.round(850 + 0.3 * np.cumsum(rng.normal(0, 5, n)) + rng.normal(0, 30, n), -1)
+
+
+MEASURES = {
+    "ApEn": (lambda x, r: nk.entropy_approximate(x, delay=1, dimension=2, tolerance=r)[0],
+             lambda x, r: entropy.approximate_entropy(x, r)),
+    "SampEn": (lambda x, r: nk.entropy_sample(x, delay=1, dimension=2, tolerance=r)[0],
+               lambda x, r: entropy.sample_entropy(x, r)),
+    "FuzzyEn": (lambda x, r: nk.entropy_fuzzy(x, delay=1, dimension=2, tolerance=r)[0],
+                lambda x, r: entropy.fuzzy_entropy(x, r)),
+}
+for method in entropy.MULTISCALE_METHODS:
+    MEASURES[method] = (lambda x, r, method=method: nk.entropy_multiscale(x, dimension=2, tolerance=r, method=method)[0],
+                        lambda x, r, method=method: entropy.multiscale_entropy(x, r, dimension=2, method=method))
+
+warnings.simplefilter("ignore")
+
+########################################################################################################################
+# parity and time per recording
+########################################################################################################################
+results = pd.DataFrame(columns=["n_beats", "measure", "neurokit_ms", "native_ms", "parity"])
+for n in N_BEATS:
+    rri = rr_intervals(n, seed=n)
+    tolerance = 0.2 * np.std(rri, ddof=1)
+    for name, (reference, native) in MEASURES.items():
+        start = time.perf_counter()
+        expected = reference(rri, tolerance)
+        neurokit_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        value = native(rri, tolerance)
+        native_ms = (time.perf_counter() - start) * 1000
+        parity = np.isclose(expected, value, rtol=RELATIVE_TOLERANCE, atol=0, equal_nan=True)
+        results.loc[results.shape[0]] = [n, name, neurokit_ms, native_ms, parity]
+print(results.to_string(index=False))
+
+########################################################################################################################
+# batched: one pass over all recordings of a study
+########################################################################################################################
+recordings = [rr_intervals(N_BEATS[0], seed=i) for i in range(N_RECORDINGS)]
+tolerances = [0.2 * np.std(rri, ddof=1) for rri in recordings]
+for name, single, batch in [("SampEn", entropy.sample_entropy, entropy.sample_entropy_batch),
+                            ("RCMSEn", lambda x, r: entropy.multiscale_entropy(x, r, method="RCMSEn"),
+                             lambda x, r: entropy.multiscale_entropy_batch(x, r, method="RCMSEn"))]:
+    start = time.perf_counter()
+    expected = [single(rri, tolerance) for rri, tolerance in zip(recordings, tolerances)]
+    single_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    values = batch(recordings, tolerances)
+    batch_ms = (time.perf_counter() - start) * 1000
+    print(f"{name} of {N_RECORDINGS} recordings: one by one {single_ms:.0f} ms, batched {batch_ms:.0f} ms, "
+          f"same values {np.allclose(expected, values, rtol=RELATIVE_TOLERANCE, equal_nan=True)}")
@@ -0,0 +1,60 @@
+# Compares the HRV features of preprocessing_scripts/hrv.py with nk.ppg_analyze / nk.ecg_analyze on the same peaks:
+# parity of every feature, and the time of the full neurokit analysis vs. the native features with and without the
+# expensive (DFA, entropy, fractal) ones
+# (run from the repository root: python -m benchmarks.hrv_benchmark)
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+import neurokit2 as nk
+
+import constants
+from preprocessing_scripts.hrv import hrv_features, EXPENSIVE_FEATURES
+
+########################################################################################################################
+# Names
+########################################################################################################################
+SAMPLING_RATE = 100  # Hz, the upsampling rate of calculate_ppg_features_nk
+DURATIONS = [120, 600, 1500]  # seconds
+RELATIVE_TOLERANCE = 1e-9
+
+warnings.simplefilter("ignore")
+results = pd.DataFrame(columns=["signal", "duration", "neurokit_s", "native_s", "native_expensive_s", "mismatches"])
+for signal in ["ppg", "ecg"]:
+    for duration in DURATIONS:
+        if signal == "ppg":
+            raw = nk.ppg_simulate(duration=duration, sampling_rate=SAMPLING_RATE, heart_rate=70, ibi_randomness=0.3,
+                                  random_state=duration)
+            processed, info = nk.ppg_process(raw, sampling_rate=SAMPLING_RATE)
+            peaks = info["PPG_Peaks"]
+            start = time.perf_counter()
+            reference = nk.ppg_analyze(processed, sampling_rate=SAMPLING_RATE, method="interval-related")
+            neurokit_s = time.perf_counter() - start
+            features = [f for f in constants.ALL_PPG_FEATURES_NEUROKIT if f in reference.columns]
+        else:
+            raw = nk.ecg_simulate(duration=duration, sampling_rate=SAMPLING_RATE * 2, heart_rate=70,
+                                  random_state=duration)
+            processed, info = nk.ecg_process(raw, sampling_rate=SAMPLING_RATE * 2)
+            peaks = info["ECG_R_Peaks"]
+            start = time.perf_counter()
+            reference = nk.ecg_analyze(processed, sampling_rate=SAMPLING_RATE * 2, method="interval-related")
+            neurokit_s = time.perf_counter() - start
+            features = [f for f in constants.ALL_ECG_FEATURES_NEUROKIT if f in reference.columns]
+        rate = SAMPLING_RATE if signal == "ppg" else SAMPLING_RATE * 2
+        cheap = [f for f in features if f.replace("HRV_", "") not in EXPENSIVE_FEATURES]
+
+        start = time.perf_counter()
+        hrv_features(peaks, rate, cheap, n_samples=raw.shape[0])
+        native_s = time.perf_counter() - start
+        start = time.perf_counter()
+        native = hrv_features(peaks, rate, features, expensive=True, n_samples=raw.shape[0])
+        native_expensive_s = time.perf_counter() - start
+
+        mismatches = [f for f in features if not np.isclose(float(reference[f].iloc[0]), native[f],
+                                                            rtol=RELATIVE_TOLERANCE, atol=0, equal_nan=True)]
+        results.loc[results.shape[0]] = [signal, duration, neurokit_s, native_s, native_expensive_s, len(mismatches)]
+        print(f"{signal} {duration}s: {len(features)} features ({len(cheap)} without the expensive ones), "
+              f"mismatches {mismatches}")
+
+print(results.to_string(index=False))
@@ -0,0 +1,76 @@
+# Compares the resampling methods of preprocessing_scripts/resampling.py against the original FFT resampling:
+# accuracy on band-limited signals with a known continuous form, throughput, and parity of the neurokit PPG features
+# (run from the repository root: python -m benchmarks.resampling_benchmark)
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+import neurokit2 as nk
+
+import constants
+from preprocessing_scripts.ppg_features import calculate_ppg_features_nk
+from preprocessing_scripts.resampling import resample_signal, RESAMPLING_METHODS
+
+########################################################################################################################
+# Names
+########################################################################################################################
+OG_F = 25.0037  # measured rates are never exactly constants.PPG_FREQ
+TARGET_F = 100
+LENGTHS = [7499, 15013, 44987, 75011]  # prime lengths, i.e., the slow case of the original FFT resampling
+REPETITIONS = 5
+PPG_DURATIONS = [120, 300]  # seconds
+EDGE = 2.0  # seconds at both ends which are excluded from the accuracy (edge effects of all methods)
+REFERENCE_F = 1000  # the features of the original FFT resampling to 1 kHz serve as ground truth
+
+
+def band_limited(t, seed):
+    """Sum of sinusoids below 5 Hz, i.e., well below the Nyquist frequency of the original rate."""
+    rng = np.random.default_rng(seed)
+    frequencies = rng.uniform(0.1, 5, 8)
+    phases = rng.uniform(0, 2 * np.pi, 8)
+    return np.sin(2 * np.pi * frequencies[None, :] * t[:, None] + phases[None, :]).sum(axis=1)
+
+
+########################################################################################################################
+# accuracy and throughput of the resampling
+########################################################################################################################
+results = pd.DataFrame(columns=["n", "method", "milliseconds", "rms_error"])
+for n in LENGTHS:
+    x = band_limited(np.arange(n) / OG_F, seed=n)
+    for method in RESAMPLING_METHODS:
+        start = time.perf_counter()
+        for _ in range(REPETITIONS):
+            y, rate = resample_signal(x, OG_F, TARGET_F, method=method, return_rate=True)
+        milliseconds = (time.perf_counter() - start) / REPETITIONS * 1000
+        t = np.arange(y.shape[0]) / rate
+        inner = (t > EDGE) & (t < n / OG_F - EDGE)
+        rms_error = np.sqrt(np.mean((y[inner] - band_limited(t[inner], seed=n)) ** 2))
+        results.loc[results.shape[0]] = [n, method, milliseconds, rms_error]
+        print(f"n={n} {method}: {milliseconds:.1f} ms, rms error {rms_error:.2e}")
+print(results.pivot(index="n", columns="method", values=["milliseconds", "rms_error"]).to_string())
+
+########################################################################################################################
+# parity of the PPG features
+########################################################################################################################
+features = {}
+timings = pd.DataFrame(columns=["duration", "method", "seconds"])
+for duration in PPG_DURATIONS:
+    ppg = nk.ppg_simulate(duration=duration, sampling_rate=constants.PPG_FREQ, heart_rate=70, random_state=duration)
+    ppg_data = pd.DataFrame({"LocalTimestamp": np.arange(ppg.shape[0]) / OG_F, "PG": ppg})
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        reference = calculate_ppg_features_nk(ppg_data, target_f=REFERENCE_F).iloc[0].astype(float)
+        for method in RESAMPLING_METHODS:
+            start = time.perf_counter()
+            features[(duration, method)] = calculate_ppg_features_nk(ppg_data, target_f=TARGET_F,
+                                                                     resample_method=method)
+            timings.loc[timings.shape[0]] = [duration, method, time.perf_counter() - start]
+    # at 100 Hz the peaks are quantized to 10 ms, i.e., also the original method deviates from the reference
+    for method in RESAMPLING_METHODS:
+        other = features[(duration, method)].iloc[0].astype(float)
+        deviation = (np.abs(other - reference) / np.abs(reference).replace(0, np.nan)).dropna()
+        print(f"{duration}s {method} vs {REFERENCE_F} Hz: median relative feature deviation {deviation.median():.2e}, "
+              f"{(deviation > 0.01).sum()} of {deviation.shape[0]} features deviate > 1 %")
+
+print(timings.pivot(index="duration", columns="method", values="seconds").to_string())
@@ -0,0 +1,93 @@
+# Feeds simulated live sessions chunk by chunk into preprocessing_scripts/streaming.py: per-update latency, buffer
+# memory, and the deviation of the streamed HRV features from the offline neurokit features of the same windows
+# (run from the repository root: python -m benchmarks.streaming_benchmark)
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+import neurokit2 as nk
+
+import constants
+from preprocessing_scripts.ppg_features import calculate_ppg_features_nk
+from preprocessing_scripts.streaming import HRVStream, EDAStream, ThermopileStream, PupilStream, STREAM_HRV_FEATURES
+
+########################################################################################################################
+# Names
+########################################################################################################################
+DURATION = 600  # seconds of the session
+CHUNK = 1.0  # seconds per pushed chunk (sensor packets)
+WINDOW = 60.0
+HOP = 5.0
+
+
+def stream_session(stream, timestamps, values):
+    """Pushes the session in chunks, returns the emitted windows and the latency of every update in ms."""
+    rows, latencies = [], []
+    chunk = max(1, int(round(CHUNK * stream.sampling_rate)))
+    for i in range(0, timestamps.shape[0], chunk):
+        start = time.perf_counter()
+        rows += stream.push(timestamps[i:i + chunk], values[i:i + chunk])
+        latencies.append((time.perf_counter() - start) * 1000)
+    return pd.DataFrame(rows), np.array(latencies)
+
+
+def buffer_kb(stream):
+    total = stream.buffer._times.nbytes + stream.buffer._values.nbytes
+    if isinstance(stream, HRVStream):
+        total += stream.peaks._times.nbytes
+    return total / 1024
+
+
+def report(name, stream, rows, latencies):
+    print(f"{name}: {rows.shape[0]} windows, update latency median {np.median(latencies):.2f} ms, "
+          f"p99 {np.percentile(latencies, 99):.2f} ms, max {latencies.max():.2f} ms, buffers {buffer_kb(stream):.0f} kB")
+
+
+warnings.simplefilter("ignore")
+rng = np.random.default_rng(0)
+
+########################################################################################################################
+# PPG: streamed HRV vs. offline neurokit (calculate_ppg_features_nk) on the same windows
+########################################################################################################################
+ppg = nk.ppg_simulate(duration=DURATION, sampling_rate=constants.PPG_FREQ, heart_rate=70, ibi_randomness=0.2,
+                      random_state=1)
+ppg_time = np.arange(ppg.shape[0]) / constants.PPG_FREQ
+stream = HRVStream(WINDOW, HOP, constants.PPG_FREQ, kind="ppg")
+rows, latencies = stream_session(stream, ppg_time, ppg)
+report("PPG", stream, rows, latencies)
+
+offline = []
+start = time.perf_counter()
+for _, row in rows.iterrows():
+    inside = (ppg_time >= row["window_start"]) & (ppg_time <= row["window_end"])
+    offline.append(calculate_ppg_features_nk(pd.DataFrame({"LocalTimestamp": ppg_time[inside], "PG": ppg[inside]}),
+                                             features=STREAM_HRV_FEATURES).iloc[0])
+offline = pd.DataFrame(offline).reset_index(drop=True)
+print(f"offline neurokit: {(time.perf_counter() - start) / rows.shape[0] * 1000:.1f} ms per window")
+deviation = (rows[STREAM_HRV_FEATURES] - offline).abs() / offline.abs()
+print("relative deviation streamed vs. offline (median / 90th percentile):")
+print(pd.DataFrame({"median": deviation.median(), "p90": deviation.quantile(0.9)}).to_string())
+
+########################################################################################################################
+# EDA, thermo-pile and pupil: latency and memory
+########################################################################################################################
+eda = nk.eda_simulate(duration=DURATION, sampling_rate=constants.EDA_FREQ, scr_number=DURATION // 20, drift=0.01,
+                      noise=0.01, random_state=2)
+stream = EDAStream(WINDOW, HOP)
+rows, latencies = stream_session(stream, np.arange(eda.shape[0]) / constants.EDA_FREQ, eda)
+report("EDA", stream, rows, latencies)
+
+n_tmp = int(DURATION * constants.TMP_FREQ)
+tmp = np.column_stack((30 + 0.01 * np.cumsum(rng.normal(size=n_tmp)), 33 + 0.01 * np.cumsum(rng.normal(size=n_tmp))))
+stream = ThermopileStream(WINDOW, HOP)
+rows, latencies = stream_session(stream, np.arange(n_tmp) / constants.TMP_FREQ, tmp)
+report("thermo-pile", stream, rows, latencies)
+
+n_pupil = DURATION * 120
+pupil = np.column_stack([40 + np.cumsum(rng.normal(scale=0.1, size=n_pupil)) for _ in range(2)] +
+                        [4 + np.cumsum(rng.normal(scale=0.01, size=n_pupil)) for _ in range(2)] +
+                        [0.5 + np.cumsum(rng.normal(scale=0.002, size=n_pupil)) for _ in range(2)])
+stream = PupilStream(WINDOW, HOP)
+rows, latencies = stream_session(stream, np.arange(n_pupil) / 120, pupil)
+report("pupil", stream, rows, latencies)
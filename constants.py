@@ -1,5 +1,11 @@
+DATA_ROOT = "/Volumes/Data/chronopilot/"  # default data root of run_pipeline.py (raw data, caches, features)
 SCREAM_DATA_PATH = "/Volumes/Data/chronopilot/scream_experiment/"
 HELICOPTER_DATA_PATH = "/Volumes/Data/chronopilot/helicopter/"
+CSV_CACHE_PATH = "/Volumes/Data/chronopilot/cache/csv/"  # parquet copies of the raw csv files, see utils/csv_cache.py
+SIGNAL_STORE_PATH = "/Volumes/Data/chronopilot/cache/signals/"  # memory-mapped recordings, see utils/signal_store.py
+FEATURE_STORE_PATH = "/Volumes/Data/chronopilot/cache/features/"  # baseline features, see utils/feature_store.py
+FEATURE_CACHE_PATH = "/Volumes/Data/chronopilot/cache/results/"  # feature function results, see utils/feature_cache.py
+FEATURE_CACHE_MAX_SIZE = 20 * 2 ** 30  # bytes, least recently used results are evicted beyond
 SUBJECTS_STUDY_1 = [2, 4, 7, 8, 11, 16, 19, 22, 24, 25, 28, 29, 30, 31, 32, 33, 35, 36, 37, 39, 40, 41, 42, 43, 44, 47]
 SUBJECTS_STUDY_1_test = [4, 7, 8, 11, 19, 24, 25, 28, 29, 30, 33, 35, 39, 40, 41, 42, 44, 47]
 SUBJECTS_STUDY_2 = [1, 2, 3, 4, 5, 6, 7, 9, 11, 12, 13, 16, 18, 23, 25, 26, 27, 29, 31, 32, 33, 41, 42, 45, 46, 47]
@@ -53,6 +59,19 @@ ALL_EDA_FEATURES = ["SCR_Peaks_N",
                     "EDA_SympatheticN",
                     "EDA_Autocorrelation"]
 ALL_TMP_FEATURES = ["mean_tmp_dif", "mean_th", "mean_t1", "gradient", "psd_power"]
+# eye tracking, one row per time window (see utils/feature_block.py)
+EYE_WINDOW_KEYS = ["time", "robot", "participant", "slice"]
+ALL_PUPIL_FEATURES = ["pupil_diameter0_2d_mean", "pupil_diameter0_2d_max", "pupil_diameter0_2d_dev",
+                      "pupil_diameter0_2d_ipa",
+                      "pupil_diameter1_2d_mean", "pupil_diameter1_2d_max", "pupil_diameter1_2d_dev",
+                      "pupil_diameter1_2d_ipa",
+                      "pupil_diameter0_3d_mean", "pupil_diameter0_3d_max", "pupil_diameter0_3d_dev",
+                      "pupil_diameter0_3d_ipa",
+                      "pupil_diameter1_3d_mean", "pupil_diameter1_3d_max", "pupil_diameter1_3d_dev",
+                      "pupil_diameter1_3d_ipa"]
+ALL_FIXATION_FEATURES = ["fixation_frequency", "fixation_duration_mean", "fixation_duration_max",
+                         "fixation_dispersion_mean", "fixation_dispersion_max", "saccade_frequency",
+                         "saccade_durations_mean", "saccade_durations_max", "saccade_speed_mean", "saccade_speed_max"]
 
 ALL_ECG_FEATURES_NEUROKIT = ['ECG_Rate_Mean', 'HRV_MeanNN', 'HRV_SDNN', 'HRV_SDANN1', 'HRV_SDNNI1',
        'HRV_SDANN2', 'HRV_SDNNI2', 'HRV_SDANN5', 'HRV_SDNNI5', 'HRV_RMSSD',
@@ -80,6 +99,7 @@ ALL_ECG_FEATURES_NEUROKIT = ['ECG_Rate_Mean', 'HRV_MeanNN', 'HRV_SDNN', 'HRV_SDA
 # frequencies
 PPG_FREQ = 25  # Hz
 EDA_FREQ = 15  # Hz
+EDA_PROCESSING_FREQ = 4 * EDA_FREQ  # Hz, processing rate of calculate_eda_features(..., mode="native")
 TMP_FREQ = 7.5  # Hz
 
 
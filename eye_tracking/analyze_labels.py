@@ -7,6 +7,7 @@ import numpy as np
 
 import constants
 import pandas as pd
+from utils.labels import derive_labels, label_counts, JULIA_LABEL_SPECS, PPOT_5_CLASSES
 
 
 # for interactive plots
@@ -18,71 +19,43 @@ if platform.system() == "Darwin":
 elif platform.system() == "Linux":
     matplotlib.use('TkAgg')
 
+########################################################################################################################
+# Names
+########################################################################################################################
+JULIA_TIMES = [1, 3, 5]
+JULIA_ROBOTS = [1, 3, 5, 7, 9, 11, 13, 15]
+
 # in theory 600 settings
 labels = pd.read_csv("/Volumes/Data/chronopilot/Julia_study/features/all_labels.csv")
 labels.dropna(inplace=True)
 
-l, counts = np.unique(labels["ppot"], return_counts=True)
-# print(l, counts, np.sum(counts))
-l = ["very slow", "slow", "medium", "fast", "very fast"]
+# all derived labels (PPOT 5/3/2 classes, under/over estimation 3/2 classes) at once, see utils/labels.py
+labels = derive_labels(labels, JULIA_LABEL_SPECS)
+counts = {name: label_counts(labels, name, spec) for name, spec in JULIA_LABEL_SPECS.items()}
+
 fig, axs = plt.subplots(1, 2, figsize=(12, 5))
-axs[0].bar(l, counts)
+axs[0].bar(counts["ppot_5"].columns, counts["ppot_5"].loc["all"])
 axs[0].set_title("PPOT distribution")
 
-# over under estimation
-counts = np.zeros(3)
-l = ["under", "correct", "over"]
-for i, row in labels.iterrows():
-    if row["duration_estimate"] < row["time"] * 0.75:  # account for slight underestimation in all settings
-        counts[0] += 1
-    elif row["duration_estimate"] > row["time"] * 1.05:
-        counts[2] += 1
-    else:
-        counts[1] += 1
-
-axs[1].bar(l, counts)
+axs[1].bar(counts["estimation_3"].columns, counts["estimation_3"].loc["all"])
 axs[1].set_title("Over/Underestimation distribution")
 
 
-l, counts = np.unique(labels["ppot"], return_counts=True)
-counts_2 = [counts[0] + counts[1] + counts[2], counts[3] + counts[4]]
-l = ["slow", "fast"]
-print(l, counts_2, np.sum(counts_2))
+print(list(counts["ppot_2"].columns), counts["ppot_2"].loc["all"].to_list(), counts["ppot_2"].loc["all"].sum())
 fig, axs = plt.subplots(1, 2, figsize=(12, 5))
-axs[0].bar(l, counts_2)
+axs[0].bar(counts["ppot_2"].columns, counts["ppot_2"].loc["all"])
 axs[0].set_title("PPOT distribution 2 classes")
 
-counts_3 = [counts[0] + counts[1], counts[2], counts[3] + counts[4]]
-l = ["slow", "medium", "fast"]
-print(l, counts_3, np.sum(counts_3))
-axs[1].bar(l, counts_3)
+print(list(counts["ppot_3"].columns), counts["ppot_3"].loc["all"].to_list(), counts["ppot_3"].loc["all"].sum())
+axs[1].bar(counts["ppot_3"].columns, counts["ppot_3"].loc["all"])
 axs[1].set_title("PPOT distribution 3 classes")
 
 
-# over under estimation
-counts = np.zeros(2)
-l = ["under", "over"]
-for i, row in labels.iterrows():
-    if row["duration_estimate"] < row["time"] * 0.9:  # account for slight underestimation in all settings
-        counts[0] += 1
-    else:
-        counts[1] += 1
-
 fig, axs = plt.subplots(1, 2, figsize=(12, 5))
-axs[0].bar(l, counts)
+axs[0].bar(counts["estimation_2"].columns, counts["estimation_2"].loc["all"])
 axs[0].set_title("Over/Underestimation 2 classes")
 
-counts = np.zeros(3)
-l = ["under", "correct", "over"]
-for i, row in labels.iterrows():
-    if row["duration_estimate"] < row["time"] * 0.75:  # account for slight underestimation in all settings
-        counts[0] += 1
-    elif row["duration_estimate"] > row["time"] * 1.05:
-        counts[2] += 1
-    else:
-        counts[1] += 1
-
-axs[1].bar(l, counts)
+axs[1].bar(counts["estimation_3"].columns, counts["estimation_3"].loc["all"])
 axs[1].set_title("Over/Underestimation 3 classes")
 
 
@@ -102,194 +75,36 @@ plt.title("Duration estimates")
 
 
 # ppot distribution for time
-ppot_time_1 = labels[labels["time"] == 1]["ppot"]
-ppot_time_3 = labels[labels["time"] == 3]["ppot"]
-ppot_time_5 = labels[labels["time"] == 5]["ppot"]
-
-l, counts = np.unique(ppot_time_1, return_counts=True)
-c = np.zeros((5,))
-c[l.astype(int)] = counts
-counts = c
-label = ["very slow", "slow", "medium", "fast", "very fast"]
+ppot_per_time = label_counts(labels, "ppot_5", PPOT_5_CLASSES, by="time")
 _, axs = plt.subplots(1, 3, figsize=(12, 5))
-
-axs[0].bar(label, counts)
-axs[0].set_title("PPOT distribution time 1")
-axs[0].tick_params(axis='x', rotation=90)
-l, counts = np.unique(ppot_time_3, return_counts=True)
-c = np.zeros((5,))
-c[l.astype(int)] = counts
-counts = c
-axs[1].bar(label, counts)
-axs[1].set_title("PPOT distribution time 3")
-axs[1].tick_params(axis='x', rotation=90)
-
-l, counts = np.unique(ppot_time_5, return_counts=True)
-c = np.zeros((5,))
-c[l.astype(int)] = counts
-counts = c
-axs[2].bar(label, counts)
-axs[2].set_title("PPOT distribution time 5")
-axs[2].tick_params(axis='x', rotation=90)
+for ax, t in zip(axs, JULIA_TIMES):
+    ax.bar(ppot_per_time.columns, ppot_per_time.loc[t] if t in ppot_per_time.index else 0)
+    ax.set_title(f"PPOT distribution time {t}")
+    ax.tick_params(axis='x', rotation=90)
 
 plt.tight_layout()
 
 # ppot distribution for robot
-ppot_robot_1 = labels[labels["robot"] == 1]["ppot"]
-ppot_robot_3 = labels[labels["robot"] == 3]["ppot"]
-ppot_robot_5 = labels[labels["robot"] == 5]["ppot"]
-ppot_robot_7 = labels[labels["robot"] == 7]["ppot"]
-ppot_robot_9 = labels[labels["robot"] == 9]["ppot"]
-ppot_robot_11 = labels[labels["robot"] == 11]["ppot"]
-ppot_robot_13 = labels[labels["robot"] == 13]["ppot"]
-ppot_robot_15 = labels[labels["robot"] == 15]["ppot"]
-
-label = ["very slow", "slow", "medium", "fast", "very fast"]
+ppot_per_robot = label_counts(labels, "ppot_5", PPOT_5_CLASSES, by="robot")
 fig, axs = plt.subplots(2, 4, figsize=(12, 5))
 fig.suptitle("PPOT distribution for robots")
-
-l, counts = np.unique(ppot_robot_1, return_counts=True)
-c = np.zeros((5,))
-c[l.astype(int)] = counts
-counts = c
-axs[0, 0].bar(label, counts)
-axs[0, 0].set_title("1 robot")
-axs[0, 0].tick_params(axis='x', rotation=90)
-
-l, counts = np.unique(ppot_robot_3, return_counts=True)
-c = np.zeros((5,))
-c[l.astype(int)] = counts
-counts = c
-axs[0, 1].bar(label, counts)
-axs[0, 1].set_title("3 robot")
-axs[0, 1].tick_params(axis='x', rotation=90)
-
-l, counts = np.unique(ppot_robot_5, return_counts=True)
-c = np.zeros((5,))
-c[l.astype(int)] = counts
-counts = c
-axs[0, 2].bar(label, counts)
-axs[0, 2].set_title("5 robot")
-axs[0, 2].tick_params(axis='x', rotation=90)
-
-l, counts = np.unique(ppot_robot_7, return_counts=True)
-c = np.zeros((5,))
-c[l.astype(int)] = counts
-counts = c
-axs[0, 3].bar(label, counts)
-axs[0, 3].set_title("7 robot")
-axs[0, 3].tick_params(axis='x', rotation=90)
-
-l, counts = np.unique(ppot_robot_9, return_counts=True)
-c = np.zeros((5,))
-c[l.astype(int)] = counts
-counts = c
-axs[1, 0].bar(label, counts)
-axs[1, 0].set_title("9 robot")
-axs[1, 0].tick_params(axis='x', rotation=90)
-
-l, counts = np.unique(ppot_robot_11, return_counts=True)
-c = np.zeros((5,))
-c[l.astype(int)] = counts
-counts = c
-axs[1, 1].bar(label, counts)
-axs[1, 1].set_title("11 robot")
-axs[1, 1].tick_params(axis='x', rotation=90)
-
-l, counts = np.unique(ppot_robot_13, return_counts=True)
-c = np.zeros((5,))
-c[l.astype(int)] = counts
-counts = c
-axs[1, 2].bar(label, counts)
-axs[1, 2].set_title("13 robot")
-axs[1, 2].tick_params(axis='x', rotation=90)
-
-l, counts = np.unique(ppot_robot_15, return_counts=True)
-c = np.zeros((5,))
-c[l.astype(int)] = counts
-counts = c
-axs[1, 3].bar(label, counts)
-axs[1, 3].set_title("15 robot")
-axs[1, 3].tick_params(axis='x', rotation=90)
+for ax, r in zip(axs.flat, JULIA_ROBOTS):
+    ax.bar(ppot_per_robot.columns, ppot_per_robot.loc[r] if r in ppot_per_robot.index else 0)
+    ax.set_title(f"{r} robot")
+    ax.tick_params(axis='x', rotation=90)
 
 plt.tight_layout()
 
 # duration estimation robots
-duration_robot_1 = labels[labels["robot"] == 1][["duration_estimate", "time"]]
-duration_robot_3 = labels[labels["robot"] == 3][["duration_estimate", "time"]]
-duration_robot_5 = labels[labels["robot"] == 5][["duration_estimate", "time"]]
-duration_robot_7 = labels[labels["robot"] == 7][["duration_estimate", "time"]]
-duration_robot_9 = labels[labels["robot"] == 9][["duration_estimate", "time"]]
-duration_robot_11 = labels[labels["robot"] == 11][["duration_estimate", "time"]]
-duration_robot_13 = labels[labels["robot"] == 13][["duration_estimate", "time"]]
-duration_robot_15 = labels[labels["robot"] == 15][["duration_estimate", "time"]]
-
 fig, axs = plt.subplots(2, 4, figsize=(12, 5))
 fig.suptitle("Duration estimation for robots")
-
-axs[0, 0].hist(duration_robot_1[duration_robot_1["time"] == 1]["duration_estimate"], bins=20, alpha=0.5, label="1 min", color="blue")
-axs[0, 0].vlines(1, 0, 10, color="blue")
-axs[0, 0].hist(duration_robot_1[duration_robot_1["time"] == 3]["duration_estimate"], bins=20, alpha=0.5, label="3 min", color="orange")
-axs[0, 0].vlines(3, 0, 10, color="orange")
-axs[0, 0].hist(duration_robot_1[duration_robot_1["time"] == 5]["duration_estimate"], bins=20, alpha=0.5, label="5 min", color="green")
-axs[0, 0].vlines(5, 0, 10, color="green")
-axs[0, 0].set_title("1 robot")
-
-axs[0, 1].hist(duration_robot_3[duration_robot_3["time"] == 1]["duration_estimate"], bins=20, alpha=0.5, label="1 min", color="blue")
-axs[0, 1].vlines(1, 0, 10, color="blue")
-axs[0, 1].hist(duration_robot_3[duration_robot_3["time"] == 3]["duration_estimate"], bins=20, alpha=0.5, label="3 min", color="orange")
-axs[0, 1].vlines(3, 0, 10, color="orange")
-axs[0, 1].hist(duration_robot_3[duration_robot_3["time"] == 5]["duration_estimate"], bins=20, alpha=0.5, label="5 min", color="green")
-axs[0, 1].vlines(5, 0, 10, color="green")
-axs[0, 1].set_title("3 robot")
-
-axs[0, 2].hist(duration_robot_5[duration_robot_5["time"] == 1]["duration_estimate"], bins=20, alpha=0.5, label="1 min", color="blue")
-axs[0, 2].vlines(1, 0, 10, color="blue")
-axs[0, 2].hist(duration_robot_5[duration_robot_5["time"] == 3]["duration_estimate"], bins=20, alpha=0.5, label="3 min", color="orange")
-axs[0, 2].vlines(3, 0, 10, color="orange")
-axs[0, 2].hist(duration_robot_5[duration_robot_5["time"] == 5]["duration_estimate"], bins=20, alpha=0.5, label="5 min", color="green")
-axs[0, 2].vlines(5, 0, 10, color="green")
-axs[0, 2].set_title("5 robot")
-
-axs[0, 3].hist(duration_robot_7[duration_robot_7["time"] == 1]["duration_estimate"], bins=20, alpha=0.5, label="1 min", color="blue")
-axs[0, 3].vlines(1, 0, 10, color="blue")
-axs[0, 3].hist(duration_robot_7[duration_robot_7["time"] == 3]["duration_estimate"], bins=20, alpha=0.5, label="3 min", color="orange")
-axs[0, 3].vlines(3, 0, 10, color="orange")
-axs[0, 3].hist(duration_robot_7[duration_robot_7["time"] == 5]["duration_estimate"], bins=20, alpha=0.5, label="5 min", color="green")
-axs[0, 3].vlines(5, 0, 10, color="green")
-axs[0, 3].set_title("7 robot")
-
-axs[1, 0].hist(duration_robot_9[duration_robot_9["time"] == 1]["duration_estimate"], bins=20, alpha=0.5, label="1 min", color="blue")
-axs[1, 0].vlines(1, 0, 10, color="blue")
-axs[1, 0].hist(duration_robot_9[duration_robot_9["time"] == 3]["duration_estimate"], bins=20, alpha=0.5, label="3 min", color="orange")
-axs[1, 0].vlines(3, 0, 10, color="orange")
-axs[1, 0].hist(duration_robot_9[duration_robot_9["time"] == 5]["duration_estimate"], bins=20, alpha=0.5, label="5 min", color="green")
-axs[1, 0].vlines(5, 0, 10, color="green")
-axs[1, 0].set_title("9 robot")
-
-axs[1, 1].hist(duration_robot_11[duration_robot_11["time"] == 1]["duration_estimate"], bins=20, alpha=0.5, label="1 min", color="blue")
-axs[1, 1].vlines(1, 0, 10, color="blue")
-axs[1, 1].hist(duration_robot_11[duration_robot_11["time"] == 3]["duration_estimate"], bins=20, alpha=0.5, label="3 min", color="orange")
-axs[1, 1].vlines(3, 0, 10, color="orange")
-axs[1, 1].hist(duration_robot_11[duration_robot_11["time"] == 5]["duration_estimate"], bins=20, alpha=0.5, label="5 min", color="green")
-axs[1, 1].vlines(5, 0, 10, color="green")
-axs[1, 1].set_title("11 robot")
-
-axs[1, 2].hist(duration_robot_13[duration_robot_13["time"] == 1]["duration_estimate"], bins=20, alpha=0.5, label="1 min", color="blue")
-axs[1, 2].vlines(1, 0, 10, color="blue")
-axs[1, 2].hist(duration_robot_13[duration_robot_13["time"] == 3]["duration_estimate"], bins=20, alpha=0.5, label="3 min", color="orange")
-axs[1, 2].vlines(3, 0, 10, color="orange")
-axs[1, 2].hist(duration_robot_13[duration_robot_13["time"] == 5]["duration_estimate"], bins=20, alpha=0.5, label="5 min", color="green")
-axs[1, 2].vlines(5, 0, 10, color="green")
-axs[1, 2].set_title("13 robot")
-
-axs[1, 3].hist(duration_robot_15[duration_robot_15["time"] == 1]["duration_estimate"], bins=20, alpha=0.5, label="1 min", color="blue")
-axs[1, 3].vlines(1, 0, 10, color="blue")
-axs[1, 3].hist(duration_robot_15[duration_robot_15["time"] == 3]["duration_estimate"], bins=20, alpha=0.5, label="3 min", color="orange")
-axs[1, 3].vlines(3, 0, 10, color="orange")
-axs[1, 3].hist(duration_robot_15[duration_robot_15["time"] == 5]["duration_estimate"], bins=20, alpha=0.5, label="5 min", color="green")
-axs[1, 3].vlines(5, 0, 10, color="green")
-axs[1, 3].set_title("15 robot")
+for ax, r in zip(axs.flat, JULIA_ROBOTS):
+    duration_robot = labels[labels["robot"] == r][["duration_estimate", "time"]]
+    for t, color in zip(JULIA_TIMES, ["blue", "orange", "green"]):
+        ax.hist(duration_robot[duration_robot["time"] == t]["duration_estimate"], bins=20, alpha=0.5,
+                label=f"{t} min", color=color)
+        ax.vlines(t, 0, 10, color=color)
+    ax.set_title(f"{r} robot")
 
 plt.tight_layout()
-plt.show()
\ No newline at end of file
+plt.show()
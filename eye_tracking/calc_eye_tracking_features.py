@@ -4,8 +4,16 @@ import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 
-from preprocessing_scripts.eye_features import calc_pupil_features_tw, calc_fixation_features_tw, \
-    calc_pupil_features_baseline, calc_fixation_features_baseline
+from preprocessing_scripts.eye_features import calc_pupil_features_multi_tw, calc_fixation_features_multi_tw, \
+    calc_pupil_features_baseline, calc_fixation_features_baseline, pupil_baseline_statistics, \
+    fixation_baseline_statistics
+from eye_tracking.stages import PUPIL_COLUMNS, FIXATION_COLUMNS, NORM_COLUMNS, clean_pupil, clean_fixations
+from utils.csv_cache import read_csv_cached
+from utils.feature_block import SCHEMAS
+from utils.feature_cache import FeatureCache
+from utils.feature_store import FeatureStore
+from utils.job_runner import run_jobs
+from utils.result_accumulator import ResultAccumulator
 
 # for interactive plots
 if platform.system() == "Darwin":
@@ -26,103 +34,87 @@ JULIA_PARTICIPANTS = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17,
 confidence_threshold = 0.8
 
 tag = "bsl"  # bsl = baseline subtraction; no_bsl = no baseline subtraction; bs = baseline
+time_windows = [1, 2, 5, 10, 15, 20, 30, 45, 60]
+n_workers = None  # None = all cores but one, 1 = no multiprocessing
 
-# for the sake of automation we loop through all time windows
-for tw in [1, 2, 5, 10, 15, 20, 30, 45, 60]:
-    all_exp_fixations_features = pd.DataFrame(
-        columns=["time", "robot", "participant", "slice"] + ["fixation_frequency", "fixation_duration_mean",
-                                                             "fixation_duration_max", "fixation_dispersion_mean",
-                                                             "fixation_dispersion_max", "saccade_frequency",
-                                                             "saccade_durations_mean", "saccade_durations_max",
-                                                             "saccade_speed_mean", "saccade_speed_max"])
-    all_exp_pupil_features = pd.DataFrame(
-        columns=["time", "robot", "participant", "slice"] + ["pupil_diameter0_2d_mean",
-                                                             "pupil_diameter0_2d_max",
-                                                             "pupil_diameter0_2d_dev",
-                                                             "pupil_diameter0_2d_ipa",
-                                                             "pupil_diameter1_2d_mean",
-                                                             "pupil_diameter1_2d_max",
-                                                             "pupil_diameter1_2d_dev",
-                                                             "pupil_diameter1_2d_ipa",
-                                                             "pupil_diameter0_3d_mean",
-                                                             "pupil_diameter0_3d_max",
-                                                             "pupil_diameter0_3d_dev",
-                                                             "pupil_diameter0_3d_ipa",
-                                                             "pupil_diameter1_3d_mean",
-                                                             "pupil_diameter1_3d_max",
-                                                             "pupil_diameter1_3d_dev",
-                                                             "pupil_diameter1_3d_ipa"])
-
-    for t in JULIA_TIMES:
-        for r in JULIA_ROBOTS:
-            for p in JULIA_PARTICIPANTS:
-                print(f"Time: {t}, Robot: {r}, Participant: {p}")
-                try:
-                    df_pupillometry_experiment = pd.read_csv(
-                        f"/Volumes/Data/chronopilot/Julia_study/pupil/{t}-{r}/{p}-{t}_{r}_pupillometry_experiment.csv")
-                    df_pupillometry_baseline = pd.read_csv(
-                        f"/Volumes/Data/chronopilot/Julia_study/pupil/{t}-{r}/{p}-{t}_{r}_pupillometry_baseline.csv")
-                    df_fixations_experiment = pd.read_csv(
-                        f"/Volumes/Data/chronopilot/Julia_study/pupil/{t}-{r}/{p}-{t}_{r}_fixations_experiment.csv")
-                    df_fixations_baseline = pd.read_csv(
-                        f"/Volumes/Data/chronopilot/Julia_study/pupil/{t}-{r}/{p}-{t}_{r}_fixations_baseline.csv")
-
-                    # remove not confident data
-                    df_pupillometry_baseline = df_pupillometry_baseline.loc[
-                        df_pupillometry_baseline["confidence"] > confidence_threshold]
-                    df_pupillometry_experiment = df_pupillometry_experiment.loc[
-                        df_pupillometry_experiment["confidence"] > confidence_threshold]
-                    df_fixations_baseline = df_fixations_baseline.loc[
-                        df_fixations_baseline["confidence"] > confidence_threshold]
-                    df_fixations_experiment = df_fixations_experiment.loc[
-                        df_fixations_experiment["confidence"] > confidence_threshold]
-
-                    # remove unlogical norm values
-                    df_pupillometry_baseline = df_pupillometry_baseline.loc[
-                        (df_pupillometry_baseline["norm_pos_x"] >= 0) & (df_pupillometry_baseline["norm_pos_x"] <= 1.1)]
-                    df_pupillometry_experiment = df_pupillometry_experiment.loc[
-                        (df_pupillometry_experiment["norm_pos_y"] >= 0) & (df_pupillometry_experiment["norm_pos_y"] <= 1.1)]
-                    df_fixations_baseline = df_fixations_baseline.loc[
-                        (df_fixations_baseline["norm_pos_x"] >= 0) & (df_fixations_baseline["norm_pos_x"] <= 1.1)]
-                    df_fixations_experiment = df_fixations_experiment.loc[
-                        (df_fixations_experiment["norm_pos_y"] >= 0) & (df_fixations_experiment["norm_pos_y"] <= 1.1)]
-
-                    # remove unlogical diameter values
-                    df_pupillometry_baseline.loc[df_pupillometry_baseline['diameter0_2d'] > 150, 'diameter0_2d'] = np.NAN
-                    df_pupillometry_baseline.loc[df_pupillometry_baseline['diameter1_2d'] > 150, 'diameter1_2d'] = np.NAN
-                    df_pupillometry_baseline.loc[df_pupillometry_baseline['diameter0_3d'] > 10, 'diameter0_3d'] = np.NAN
-                    df_pupillometry_baseline.loc[df_pupillometry_baseline['diameter1_3d'] > 10, 'diameter1_3d'] = np.NAN
-
-                    df_pupillometry_experiment.loc[
-                        df_pupillometry_experiment['diameter0_2d'] > 150, 'diameter0_2d'] = np.NAN
-                    df_pupillometry_experiment.loc[
-                        df_pupillometry_experiment['diameter1_2d'] > 150, 'diameter1_2d'] = np.NAN
-                    df_pupillometry_experiment.loc[df_pupillometry_experiment['diameter0_3d'] > 10, 'diameter0_3d'] = np.NAN
-                    df_pupillometry_experiment.loc[df_pupillometry_experiment['diameter1_3d'] > 10, 'diameter1_3d'] = np.NAN
-
-                    # calculate features
-                    if tag == "bsl":
-                        tmp_df = calc_fixation_features_tw(df_fixations_experiment, tw, t, r, p, df_fixations_baseline)
-                    elif tag == "no_bsl":
-                        tmp_df = calc_fixation_features_tw(df_fixations_experiment, tw, t, r, p)
-                    elif tag == "bs":
-                        tmp_df = calc_fixation_features_baseline(df_fixations_baseline, tw, t, r, p)
-                    else:
-                        raise ValueError("tag not found")
-                    all_exp_fixations_features = pd.concat([all_exp_fixations_features, tmp_df], axis=0)
-
-                    if tag == "bsl":
-                        tmp_df = calc_pupil_features_tw(df_pupillometry_experiment, tw, t, r, p, df_pupillometry_baseline)
-                    elif tag == "no_bsl":
-                        tmp_df = calc_pupil_features_tw(df_pupillometry_experiment, tw, t, r, p)
-                    elif tag == "bs":
-                        tmp_df = calc_pupil_features_baseline(df_pupillometry_baseline, t, r, p)
-                    else:
-                        raise ValueError("tag not found")
-                    all_exp_pupil_features = pd.concat([all_exp_pupil_features, tmp_df], axis=0)
-                except FileNotFoundError:
-                    print("setting does not exist")
+# the baseline statistics are computed once per recording and reused by all tags and later runs
+feature_store = FeatureStore()
+# results of unchanged recordings and parameters are read from the cache, see utils/feature_cache.py
+feature_cache = FeatureCache()
+
+
+def calc_setting_features(setting):
+    """Calculates the fixation and pupil features of one (time, robot, participant) setting for all time windows.
+
+    The recordings are loaded and cleaned once and shared by all time windows.
+
+    :return: dict time window -> (fixation features, pupil features) or None if the setting does not exist.
+    """
+    t, r, p = setting
+    print(f"Time: {t}, Robot: {r}, Participant: {p}")
+    try:
+        df_pupillometry_experiment = read_csv_cached(
+            f"/Volumes/Data/chronopilot/Julia_study/pupil/{t}-{r}/{p}-{t}_{r}_pupillometry_experiment.csv",
+            columns=PUPIL_COLUMNS)
+        df_pupillometry_baseline = read_csv_cached(
+            f"/Volumes/Data/chronopilot/Julia_study/pupil/{t}-{r}/{p}-{t}_{r}_pupillometry_baseline.csv",
+            columns=PUPIL_COLUMNS)
+        df_fixations_experiment = read_csv_cached(
+            f"/Volumes/Data/chronopilot/Julia_study/pupil/{t}-{r}/{p}-{t}_{r}_fixations_experiment.csv",
+            columns=FIXATION_COLUMNS)
+        df_fixations_baseline = read_csv_cached(
+            f"/Volumes/Data/chronopilot/Julia_study/pupil/{t}-{r}/{p}-{t}_{r}_fixations_baseline.csv",
+            columns=FIXATION_COLUMNS)
+    except FileNotFoundError:
+        print("setting does not exist")
+        return None
+
+    # remove not confident data, unlogical norm and diameter values
+    df_pupillometry_baseline = clean_pupil(df_pupillometry_baseline, confidence_threshold, NORM_COLUMNS["baseline"])
+    df_pupillometry_experiment = clean_pupil(df_pupillometry_experiment, confidence_threshold,
+                                             NORM_COLUMNS["experiment"])
+    df_fixations_baseline = clean_fixations(df_fixations_baseline, confidence_threshold, NORM_COLUMNS["baseline"])
+    df_fixations_experiment = clean_fixations(df_fixations_experiment, confidence_threshold,
+                                              NORM_COLUMNS["experiment"])
+
+    # baseline statistics (independent of the time window)
+    if tag in ["bsl", "bs"]:
+        fixation_baseline = feature_store.get(fixation_baseline_statistics, df_fixations_baseline, subject=p,
+                                              session=f"{t}-{r}", modality="fixations",
+                                              confidence_threshold=confidence_threshold)
+        pupil_baseline = feature_store.get(pupil_baseline_statistics, df_pupillometry_baseline, subject=p,
+                                           session=f"{t}-{r}", modality="pupil",
+                                           confidence_threshold=confidence_threshold)
+
+    # calculate features
+    if tag == "bsl":
+        fixation_dfs = feature_cache.call(calc_fixation_features_multi_tw, df_fixations_experiment, time_windows, t,
+                                          r, p, base_line_statistics=fixation_baseline)
+    elif tag == "no_bsl":
+        fixation_dfs = feature_cache.call(calc_fixation_features_multi_tw, df_fixations_experiment, time_windows, t,
+                                          r, p)
+    elif tag == "bs":
+        fixation_dfs = {tw: calc_fixation_features_baseline(df_fixations_baseline, tw, t, r, p,
+                                                            statistics=fixation_baseline) for tw in time_windows}
+    else:
+        raise ValueError("tag not found")
 
+    if tag == "bsl":
+        pupil_dfs = feature_cache.call(calc_pupil_features_multi_tw, df_pupillometry_experiment, time_windows, t, r,
+                                       p, base_line_statistics=pupil_baseline)
+    elif tag == "no_bsl":
+        pupil_dfs = feature_cache.call(calc_pupil_features_multi_tw, df_pupillometry_experiment, time_windows, t, r,
+                                       p)
+    elif tag == "bs":
+        pupil_df = calc_pupil_features_baseline(df_pupillometry_baseline, t, r, p)
+        pupil_dfs = {tw: pupil_df for tw in time_windows}
+    else:
+        raise ValueError("tag not found")
+
+    return {tw: (fixation_dfs[tw], pupil_dfs[tw]) for tw in time_windows}
+
+
+def save_features(tw, all_exp_fixations_features, all_exp_pupil_features):
     if tag == "bsl":
         all_exp_fixations_features.to_csv(
             f"/Volumes/Data/chronopilot/Julia_study/features/all_exp_fixations_features_tw_{tw}_bls.csv", index=False)
@@ -139,4 +131,21 @@ for tw in [1, 2, 5, 10, 15, 20, 30, 45, 60]:
         all_exp_pupil_features.to_csv(
             f"/Volumes/Data/chronopilot/Julia_study/features/all_exp_pupil_features_baseline.csv", index=False)
     else:
-        raise ValueError("tag not found")
\ No newline at end of file
+        raise ValueError("tag not found")
+
+
+if __name__ == "__main__":
+    all_exp_fixations_features = {tw: ResultAccumulator(SCHEMAS["fixation"]) for tw in time_windows}
+    all_exp_pupil_features = {tw: ResultAccumulator(SCHEMAS["pupil"]) for tw in time_windows}
+
+    # every setting is loaded once and calculates the features of all time windows
+    settings = [(t, r, p) for t in JULIA_TIMES for r in JULIA_ROBOTS for p in JULIA_PARTICIPANTS]
+    for setting, features in run_jobs(calc_setting_features, settings, n_workers=n_workers, verbose=True):
+        if features is None:
+            continue
+        for tw in time_windows:
+            all_exp_fixations_features[tw].extend(features[tw][0])
+            all_exp_pupil_features[tw].extend(features[tw][1])
+
+    for tw in time_windows:
+        save_features(tw, all_exp_fixations_features[tw].to_frame(), all_exp_pupil_features[tw].to_frame())
@@ -0,0 +1,227 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import constants
+from preprocessing_scripts.ecg_features import calculate_ecg_features_nk
+from preprocessing_scripts.eye_features import calc_pupil_features_multi_tw, calc_fixation_features_multi_tw, \
+    calc_pupil_features_baseline, calc_fixation_features_baseline, pupil_baseline_statistics, \
+    fixation_baseline_statistics
+from utils.csv_cache import read_csv_cached
+from utils.feature_block import SCHEMAS
+from utils.feature_cache import FeatureCache
+from utils.feature_store import FeatureStore
+from utils.pipeline import cache_path
+from utils.result_accumulator import ResultAccumulator
+
+# Stages of the Julia study (see run_pipeline.py), per (time, robot, participant) setting:
+#   ECG: load -> features (experiment, baseline) -> baseline subtraction, then one write stage
+#   pupil / fixation: load -> clean -> baseline statistics -> features of all time windows (sliced in one pass), then
+#   one write stage
+JULIA_TIMES = [1, 3, 5]
+JULIA_ROBOTS = [1, 3, 5, 7, 9, 11, 13, 15]
+JULIA_PARTICIPANTS = list(range(1, 26))
+
+# only these columns are read (from the parquet cache after the first run, see utils/csv_cache.py)
+PUPIL_COLUMNS = ["timestamp", "confidence", "norm_pos_x", "norm_pos_y", "diameter0_2d", "diameter1_2d",
+                 "diameter0_3d", "diameter1_3d"]
+FIXATION_COLUMNS = ["timestamp", "confidence", "norm_pos_x", "norm_pos_y", "fixation id", "duration", "dispersion"]
+EYE_RECORDINGS = {"pupil": ("pupillometry", PUPIL_COLUMNS), "fixation": ("fixations", FIXATION_COLUMNS)}
+# the experiment recordings are filtered by norm_pos_y, the baselines by norm_pos_x (as in
+# calc_eye_tracking_features.py)
+NORM_COLUMNS = {"experiment": "norm_pos_y", "baseline": "norm_pos_x"}
+ECG_PARTS = ["experiment", "baseline", "sub"]
+
+
+def recording_path(data_root, directory, setting, name) -> str:
+    """:return: path of a recording of a setting, e.g., directory "pupil" and name "fixations_baseline"."""
+    t, r, p = setting
+    return os.path.join(data_root, "Julia_study", directory, f"{t}-{r}", f"{p}-{t}_{r}_{name}.csv")
+
+
+def ecg_output_path(output_root, part) -> str:
+    """:return: path of the ECG features of a part (experiment, baseline or sub)."""
+    return os.path.join(output_root, f"ecg_features_{part}_nk.csv")
+
+
+def eye_output_path(output_root, modality, tag, time_window) -> str:
+    """:return: path of the pupil / fixation features of a time window (tag see calc_eye_tracking_features.py)."""
+    name = {"pupil": "pupil", "fixation": "fixations"}[modality]
+    if tag == "bsl":
+        return os.path.join(output_root, f"all_exp_{name}_features_tw_{time_window}_bls.csv")
+    if tag == "no_bsl":
+        return os.path.join(output_root, f"all_exp_{name}_features_tw_{time_window}.csv")
+    if tag == "bs":
+        return os.path.join(output_root, f"all_exp_{name}_features_baseline.csv")
+    raise ValueError("tag not found")
+
+
+def clean_pupil(data, confidence_threshold=0.8, norm_column="norm_pos_x") -> pd.DataFrame:
+    """ Removes not confident samples and unlogical positions, and sets unlogical diameters to NaN.
+
+    :param data: Pupil recording with the PUPIL_COLUMNS.
+    :param confidence_threshold: Samples with a confidence up to this value are removed.
+    :param norm_column: Position column which has to be within [0, 1.1].
+
+    :return: cleaned data frame.
+    """
+    data = data.loc[(data["confidence"] > confidence_threshold) &
+                    (data[norm_column] >= 0) & (data[norm_column] <= 1.1)].copy()
+    for column, limit in [("diameter0_2d", 150), ("diameter1_2d", 150), ("diameter0_3d", 10), ("diameter1_3d", 10)]:
+        data.loc[data[column] > limit, column] = np.nan
+    return data
+
+
+def clean_fixations(data, confidence_threshold=0.8, norm_column="norm_pos_x") -> pd.DataFrame:
+    """:return: fixations without not confident ones and unlogical positions (norm_column within [0, 1.1])."""
+    return data.loc[(data["confidence"] > confidence_threshold) &
+                    (data[norm_column] >= 0) & (data[norm_column] <= 1.1)]
+
+
+def load_ecg(setting, data_root) -> dict:
+    """:return: dict part (experiment, baseline) -> (ECG signal, sampling rate), None if a recording does not exist."""
+    t, r, p = setting
+    recordings = {}
+    for part in ["experiment", "baseline"]:
+        try:
+            data = read_csv_cached(recording_path(data_root, "physio", setting, f"ecg_{part}"), columns=["channel_0"],
+                                   cache_path=cache_path(data_root, "csv"))
+        except FileNotFoundError:
+            print(f"setting does not exist (Time: {t}, Robot: {r}, Participant: {p})")
+            return None
+        recordings[part] = (data["channel_0"].to_numpy(), data.shape[0] / (t * 60))
+    return recordings
+
+
+def ecg_features(setting, recordings, data_root, features=None, expensive=True, entropy_backend="native") -> dict:
+    """ Neurokit ECG features of the experiment and the baseline, see calculate_ecg_features_nk (features None = full
+    nk.ecg_analyze).
+
+    :return: dict part (experiment, baseline) -> one-row data frame, None without recordings or if neurokit fails
+             on a recording (the setting is skipped, as in calc_ecg_features.py).
+    """
+    if recordings is None:
+        return None
+    feature_cache = FeatureCache(cache_path(data_root, "results"))
+    try:
+        return {part: feature_cache.call(calculate_ecg_features_nk, signal, sampling_rate, features=features,
+                                         expensive=expensive, entropy_backend=entropy_backend)
+                for part, (signal, sampling_rate) in recordings.items()}
+    except Exception as e:
+        print(f"no ECG features of setting {setting}: {type(e).__name__}: {e}")
+        return None
+
+
+def subtract_ecg_baseline(setting, features) -> dict:
+    """:return: dict part (experiment, baseline, sub) -> feature row (dict time, robot, participant, features...; the
+    full nk.ecg_analyze leaves out features which short recordings do not allow)."""
+    if features is None:
+        return None
+    t, r, p = setting
+    experiment, baseline = features["experiment"].iloc[0], features["baseline"].iloc[0]
+    setting_columns = {"time": t, "robot": r, "participant": p}
+    return {"experiment": {**setting_columns, **experiment.to_dict()},
+            "baseline": {**setting_columns, **baseline.to_dict()},
+            "sub": {**setting_columns, **(experiment - baseline).to_dict()}}
+
+
+def write_ecg_features(rows, features, files) -> list:
+    """ Writes the ECG feature rows of all settings (experiment, baseline and sub files).
+
+    :param rows: dict setting -> dict part -> row or None, see subtract_ecg_baseline.
+    :param features: Feature columns.
+    :param files: dict part -> path.
+
+    :return: written files.
+    """
+    results = {part: ResultAccumulator(["time", "robot", "participant"] + list(features), dtype=float)
+               for part in files}
+    for setting_rows in rows.values():
+        if setting_rows is not None:
+            for part in files:
+                results[part].append(setting_rows[part])
+    for part, file in files.items():
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        results[part].to_frame().to_csv(file, index=False)
+    return list(files.values())
+
+
+def load_eye(setting, data_root, modality) -> dict:
+    """:return: dict part (experiment, baseline) -> pupil or fixation recording, None if one does not exist."""
+    name, columns = EYE_RECORDINGS[modality]
+    try:
+        return {part: read_csv_cached(recording_path(data_root, "pupil", setting, f"{name}_{part}"), columns=columns,
+                                      cache_path=cache_path(data_root, "csv"))
+                for part in ["experiment", "baseline"]}
+    except FileNotFoundError:
+        print(f"setting does not exist (Time: {setting[0]}, Robot: {setting[1]}, Participant: {setting[2]})")
+        return None
+
+
+def clean_eye(setting, recordings, modality, confidence_threshold=0.8) -> dict:
+    """:return: dict part -> cleaned recording (clean_pupil / clean_fixations), None without recordings."""
+    if recordings is None:
+        return None
+    clean = clean_pupil if modality == "pupil" else clean_fixations
+    return {part: clean(data, confidence_threshold, NORM_COLUMNS[part]) for part, data in recordings.items()}
+
+
+def eye_baseline_statistics(setting, cleaned, modality, data_root, tag="bsl", confidence_threshold=0.8):
+    """:return: baseline statistics of the setting from the FeatureStore (None for tag no_bsl or without data)."""
+    if cleaned is None or tag == "no_bsl":
+        return None
+    t, r, p = setting
+    feature_store = FeatureStore(cache_path(data_root, "features"))
+    statistics_fn = pupil_baseline_statistics if modality == "pupil" else fixation_baseline_statistics
+    return feature_store.get(statistics_fn, cleaned["baseline"], subject=p, session=f"{t}-{r}",
+                             modality={"pupil": "pupil", "fixation": "fixations"}[modality],
+                             confidence_threshold=confidence_threshold)
+
+
+def eye_features(setting, cleaned, statistics, modality, data_root, time_windows, tag="bsl") -> dict:
+    """ Pupil or fixation features of all time windows, the windows are sliced in one pass over the recording.
+
+    :param tag: bsl = baseline subtraction; no_bsl = no baseline subtraction; bs = baseline.
+
+    :return: dict time window -> data frame, None without recordings.
+
+    :raises ValueError: If the tag is unknown.
+    """
+    if cleaned is None:
+        return None
+    t, r, p = setting
+    feature_cache = FeatureCache(cache_path(data_root, "results"))
+    multi_tw = calc_pupil_features_multi_tw if modality == "pupil" else calc_fixation_features_multi_tw
+    if tag == "bsl":
+        return feature_cache.call(multi_tw, cleaned["experiment"], time_windows, t, r, p,
+                                  base_line_statistics=statistics)
+    if tag == "no_bsl":
+        return feature_cache.call(multi_tw, cleaned["experiment"], time_windows, t, r, p)
+    if tag == "bs":
+        if modality == "pupil":
+            pupil_df = calc_pupil_features_baseline(cleaned["baseline"], t, r, p)
+            return {tw: pupil_df for tw in time_windows}
+        return {tw: calc_fixation_features_baseline(cleaned["baseline"], tw, t, r, p, statistics=statistics)
+                for tw in time_windows}
+    raise ValueError("tag not found")
+
+
+def write_eye_features(features, modality, files) -> list:
+    """ Writes the features of all settings, one file per time window.
+
+    :param features: dict setting -> dict time window -> data frame or None, see eye_features.
+    :param modality: "pupil" or "fixation".
+    :param files: dict time window -> path (the baseline features of all time windows share one file, the one of the
+                  last time window is kept as in calc_eye_tracking_features.py).
+
+    :return: written files.
+    """
+    for tw, file in files.items():
+        result = ResultAccumulator(SCHEMAS[modality])
+        for setting_features in features.values():
+            if setting_features is not None:
+                result.extend(setting_features[tw])
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        result.to_frame().to_csv(file, index=False)
+    return sorted(set(files.values()))
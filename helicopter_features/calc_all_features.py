@@ -1,14 +1,21 @@
 import platform
 import os
+from functools import partial
 import pandas as pd
 import matplotlib
 import matplotlib.pyplot as plt
 
 from utils.data_loader import Data_Loader
+from utils.feature_cache import FeatureCache
+from utils.feature_store import FeatureStore
+from utils.intervals import PhaseTable, cover
+from utils.result_accumulator import ResultAccumulator
 import constants
 
-from preprocessing_scripts.ppg_features import transform_ppg, calculate_ppg_features, calculate_ppg_features_nk
+from preprocessing_scripts.ppg_features import transform_ppg, calculate_ppg_features, calculate_ppg_features_nk, \
+    calculate_ppg_measures
 from preprocessing_scripts.eda_features import transform_eda, calculate_eda_features
+from preprocessing_scripts.peak_index import detect_ppg_peaks, detect_eda_peaks
 from preprocessing_scripts.tmp_features import transform_thermo_pile, calculate_thermo_pile_features
 
 # for interactive plots
@@ -25,7 +32,20 @@ elif platform.system() == "Linux":
 # Names
 ########################################################################################################################
 experiment_name = "helicopter_experiment"
-interval = "start_posttest"
+interval = "start_posttest"  # <start phase>_<end phase>, see utils/intervals.py
+baseline_interval = "start_takeoff"  # subtracted from the features of interval
+max_cached = 64  # number of memory-mapped recordings kept open
+eda_mode = "upsample"  # upsample = upsample EDA to 10 kHz, native = process it at constants.EDA_PROCESSING_FREQ
+# PPG / EDA (upsample mode) resampling: fft, fft_fast or poly, see preprocessing_scripts/resampling.py
+resample_method = "fft"
+# None = full nk.ppg_analyze; opt-in: only these neurokit PPG features, calculated from the peaks (much faster), e.g.,
+# constants.ALL_PPG_FEATURES_NEUROKIT_AVAILABLE, see preprocessing_scripts/hrv.py
+ppg_nk_features = None
+hrv_expensive = True  # with ppg_nk_features: False leaves the DFA, entropy and fractal features NaN (seconds)
+hrv_entropy_backend = "native"  # entropy features with preprocessing_scripts/entropy.py, "neurokit" = nk.entropy_*
+# opt-in: detect the PPG / SCR peaks once on the interval covering minuend and baseline (faster, but the features of
+# the sub-intervals differ slightly from processing every interval on its own), see preprocessing_scripts/peak_index.py
+reuse_peaks = False
 
 
 ########################################################################################################################
@@ -35,17 +55,13 @@ labels = pd.read_csv("/Volumes/Data/chronopilot/helicopter/new_label/labels_3_cl
 time_stamps = pd.read_csv("/Volumes/Data/chronopilot/helicopter/Physiological/timestamps.csv")
 
 data_loader = Data_Loader("data/")
+# the baseline (start - takeoff) features are the same for every minuend interval -> computed once, then looked up
+feature_store = FeatureStore()
+# results of unchanged recordings and parameters are read from the cache, see utils/feature_cache.py
+feature_cache = FeatureCache()
 
-## obtain all time steps
-pretests = time_stamps.loc[time_stamps["Phase"] == "pretest"]["LocalTimestamp"].to_numpy()
-start = time_stamps.loc[time_stamps["Phase"] == "start"]["LocalTimestamp"].to_numpy()
-takeoff = time_stamps.loc[time_stamps["Phase"] == "takeoff"]["LocalTimestamp"].to_numpy()
-p1 = time_stamps.loc[time_stamps["Phase"] == "p1"]["LocalTimestamp"].to_numpy()
-p1End = time_stamps.loc[time_stamps["Phase"] == "p1End"]["LocalTimestamp"].to_numpy()
-p2 = time_stamps.loc[time_stamps["Phase"] == "p2"]["LocalTimestamp"].to_numpy()
-p2End = time_stamps.loc[time_stamps["Phase"] == "p2End"]["LocalTimestamp"].to_numpy()
-landing = time_stamps.loc[time_stamps["Phase"] == "landing"]["LocalTimestamp"].to_numpy()
-posttest = time_stamps.loc[time_stamps["Phase"] == "posttest"]["LocalTimestamp"].to_numpy()
+## (subject, session, phase) -> timestamp, see utils/intervals.py
+phases = PhaseTable(time_stamps)
 
 ########################################################################################################################
 # feature extraction -- PPG (neurokit)
@@ -53,30 +69,42 @@ posttest = time_stamps.loc[time_stamps["Phase"] == "posttest"]["LocalTimestamp"]
 # check if directory exists for writing
 if not os.path.exists("./preprocessed_data/" + experiment_name + "/ppg_nk/" + interval + "/"):
     os.makedirs("./preprocessed_data/" + experiment_name + "/ppg_nk/" + interval + "/")
-data = data_loader.load_helicopter("PPG")
+data = data_loader.helicopter_store(["PPG"], max_cached=max_cached)
 for i in range(12):  # for all participants
     # for saving
-    neurokit_helicopter = pd.DataFrame(columns=constants.ALL_PPG_FEATURES_NEUROKIT_AVAILABLE)
-    print(f"person {i+1}: pretest {takeoff[i*4:(i+1)*4] - start[i*4:(i+1)*4]}")
+    neurokit_helicopter = ResultAccumulator(constants.ALL_PPG_FEATURES_NEUROKIT_AVAILABLE)
+    print(f"person {i+1}: pretest {[phases.duration(i + 1, s + 1, baseline_interval) for s in range(4)]}")
 
     for s in range(4):  # for all settings
         # cut data into pieces
         print(f"setting user {i+1} setting {s+1} ---------------------------")
-        d = data[i][s][0]
-        minuend = d.loc[((d["LocalTimestamp"] >= start[i*4 + s]) & (d["LocalTimestamp"] <= posttest[i*4 + s]))]
-        subtrahend = d.loc[((d["LocalTimestamp"] >= start[i*4 + s]) & (d["LocalTimestamp"] <= takeoff[i*4 + s]))]
-
-        # format data
-        minuend = transform_ppg(minuend)
-        subtrahend = transform_ppg(subtrahend)
-
-        # calculate features
-        if i == 10 and s == 1:  # hacking the only data point which is nan for some reason?
-            min_m = calculate_ppg_features_nk(minuend, target_f=200, verbose=False)
-            # sub_m = calculate_ppg_features_nk(subtrahend, target_f=200, verbose=False)
+        d = data[i + 1, s + 1, "PPG"]
+        if reuse_peaks and ppg_nk_features is not None:
+            target_f = 200 if i == 10 and s == 1 else 100  # hacking the only data point which is nan for some reason?
+            bounds = phases.bounds(i + 1, s + 1, interval)
+            sub_bounds = phases.bounds(i + 1, s + 1, baseline_interval)
+            ppg_peaks = feature_cache.call(detect_ppg_peaks, transform_ppg(d.frame(*cover(bounds, sub_bounds))),
+                                           target_f=target_f, resample_method=resample_method)
+            min_m = ppg_peaks.hrv_features(*bounds, features=ppg_nk_features, expensive=hrv_expensive,
+                                           entropy_backend=hrv_entropy_backend)
+            # sub_m = ppg_peaks.hrv_features(*sub_bounds, features=ppg_nk_features, expensive=hrv_expensive,
+            #                                entropy_backend=hrv_entropy_backend)
         else:
-            min_m = calculate_ppg_features_nk(minuend, target_f=100, verbose=False)
-            # sub_m = calculate_ppg_features_nk(subtrahend, target_f=100, verbose=False)
+            # format data
+            minuend = transform_ppg(phases.frame(d, i + 1, s + 1, interval))
+            subtrahend = transform_ppg(phases.frame(d, i + 1, s + 1, baseline_interval))
+
+            # calculate features
+            if i == 10 and s == 1:  # hacking the only data point which is nan for some reason?
+                min_m = feature_cache.call(calculate_ppg_features_nk, minuend, target_f=200, verbose=False,
+                                           features=ppg_nk_features, expensive=hrv_expensive,
+                                           entropy_backend=hrv_entropy_backend, resample_method=resample_method)
+                # sub_m = calculate_ppg_features_nk(subtrahend, target_f=200, verbose=False)
+            else:
+                min_m = feature_cache.call(calculate_ppg_features_nk, minuend, target_f=100, verbose=False,
+                                           features=ppg_nk_features, expensive=hrv_expensive,
+                                           entropy_backend=hrv_entropy_backend, resample_method=resample_method)
+                # sub_m = calculate_ppg_features_nk(subtrahend, target_f=100, verbose=False)
 
         # background subtraction
         # for k in min_m.keys():
@@ -89,12 +117,12 @@ for i in range(12):  # for all participants
 
         # neurokit_helicopter.loc[s] = min_m.values
         # append the two data frames
-        neurokit_helicopter = pd.concat([neurokit_helicopter, min_m], axis=0)
+        neurokit_helicopter.extend(min_m)
     # print results
     # print(f"participant: {i + 1} ---------------------------")
     # print(heartpy_helicopter)
     # or save the data
-    neurokit_helicopter.to_csv("/Volumes/Data/chronopilot/helicopter/features/" + experiment_name + "/ppg_nk/" + interval + f"/subjectID_{i+1}.csv")
+    neurokit_helicopter.to_frame().to_csv("/Volumes/Data/chronopilot/helicopter/features/" + experiment_name + "/ppg_nk/" + interval + f"/subjectID_{i+1}.csv")
 exit(111)
 ########################################################################################################################
 # feature extraction -- PPG (HeartPy)
@@ -102,41 +130,41 @@ exit(111)
 # check if directory exists for writing
 if not os.path.exists("./preprocessed_data/" + experiment_name + "/ppg_nk/" + interval + "/"):
     os.makedirs("./preprocessed_data/" + experiment_name + "/ppg_nk/" + interval + "/")
-data = data_loader.load_helicopter("PPG")
+data = data_loader.helicopter_store(["PPG"], max_cached=max_cached)
 for i in range(12):  # for all participants
     # for saving
-    heartpy_helicopter = pd.DataFrame(columns=constants.ALL_PPG_FEATURES_HEARTPY)
-    print(f"person {i+1}: pretest {takeoff[i*4:(i+1)*4] - start[i*4:(i+1)*4]}")
+    heartpy_helicopter = ResultAccumulator(constants.ALL_PPG_FEATURES_HEARTPY, dtype=float)
+    print(f"person {i+1}: pretest {[phases.duration(i + 1, s + 1, baseline_interval) for s in range(4)]}")
 
     for s in range(4):  # for all settings
         # cut data into pieces
-        d = data[i][s][0]
-        minuend = d.loc[((d["LocalTimestamp"] >= start[i*4 + s]) & (d["LocalTimestamp"] <= posttest[i*4 + s]))]
-        subtrahend = d.loc[((d["LocalTimestamp"] >= start[i*4 + s]) & (d["LocalTimestamp"] <= takeoff[i*4 + s]))]
+        d = data[i + 1, s + 1, "PPG"]
+        minuend = phases.frame(d, i + 1, s + 1, interval)
+        subtrahend = phases.frame(d, i + 1, s + 1, baseline_interval)
 
         # format data
         minuend = transform_ppg(minuend)
         subtrahend = transform_ppg(subtrahend)
 
         # calculate features
-        if i == 10 and s == 1:  # hacking the only data point which is nan for some reason?
-            min_wd, min_m = calculate_ppg_features(minuend, target_f=200, verbose=False)
-            sub_wd, sub_m = calculate_ppg_features(subtrahend, target_f=200, verbose=False)
-        else:
-            min_wd, min_m = calculate_ppg_features(minuend, target_f=100, verbose=False)
-            sub_wd, sub_m = calculate_ppg_features(subtrahend, target_f=100, verbose=False)
+        target_f = 200 if i == 10 and s == 1 else 100  # hacking the only data point which is nan for some reason?
+        min_wd, min_m = calculate_ppg_features(minuend, target_f=target_f, verbose=False,
+                                               resample_method=resample_method)
+        sub_m = feature_store.get(partial(calculate_ppg_measures, target_f=target_f, resample_method=resample_method),
+                                  subtrahend, subject=i + 1, session=s + 1, modality="ppg_heartpy",
+                                  interval=baseline_interval)
 
         # background subtraction
         for k in min_m.keys():
             min_m[k] = min_m[k] - sub_m[k]
             # min_m[k] = sub_m[k] - min_m[k]
 
-        heartpy_helicopter.loc[s] = min_m
+        heartpy_helicopter.append(min_m, index=s)
     # print results
     # print(f"participant: {i + 1} ---------------------------")
     # print(heartpy_helicopter)
     # or save the data
-    heartpy_helicopter.to_csv(f"preprocessed_data/" + experiment_name + f"/ppg_nk/" + interval + f"/subjectID_{i+1}.csv")
+    heartpy_helicopter.to_frame().to_csv(f"preprocessed_data/" + experiment_name + f"/ppg_nk/" + interval + f"/subjectID_{i+1}.csv")
 
 
 ########################################################################################################################
@@ -144,41 +172,45 @@ for i in range(12):  # for all participants
 ########################################################################################################################
 if not os.path.exists("./preprocessed_data/" + experiment_name + "/eda/" + interval + "/"):
     os.makedirs("./preprocessed_data/" + experiment_name + "/eda/" + interval + "/")
-data = data_loader.load_helicopter("EDA")
+data = data_loader.helicopter_store(["EDA"], max_cached=max_cached)
 for i in range(12):  # for all participants
     # for saving
-    eda_helicopter = pd.DataFrame(columns=constants.ALL_EDA_FEATURES)
-    print(f"person {i+1}: pretest {takeoff[i*4:(i+1)*4] - start[i*4:(i+1)*4]}")
+    eda_helicopter = ResultAccumulator(constants.ALL_EDA_FEATURES, dtype=float)
+    print(f"person {i+1}: pretest {[phases.duration(i + 1, s + 1, baseline_interval) for s in range(4)]}")
 
     for s in range(4):  # for all settings
         # cut data into pieces
-        d = data[i][s][0]
-
-        minuend = d.loc[
-            ((d["LocalTimestamp"] >= start[i * 4 + s]) & (d["LocalTimestamp"] <= posttest[i * 4 + s]))]
-        if i == 5 and s == 0:  # ACHTUNG Hack because the minimum required signal time is  10 sec and in this setting it is only 9
-            subtrahend = d.loc[
-                ((d["LocalTimestamp"] >= start[i * 4 + s] - 1.5) & (d["LocalTimestamp"] <= takeoff[i * 4 + s]))]
+        d = data[i + 1, s + 1, "EDA"]
+
+        # ACHTUNG Hack because the minimum required signal time is  10 sec and in this setting it is only 9
+        sub_offsets = (-1.5, 0) if i == 5 and s == 0 else (0, 0)
+        if reuse_peaks:
+            bounds = phases.bounds(i + 1, s + 1, interval)
+            sub_bounds = phases.bounds(i + 1, s + 1, baseline_interval, offsets=sub_offsets)
+            eda_peaks = feature_cache.call(detect_eda_peaks, transform_eda(d.frame(*cover(bounds, sub_bounds))),
+                                           mode=eda_mode, resample_method=resample_method)
+            min_m = eda_peaks.eda_features(*bounds)
+            sub_m = eda_peaks.eda_features(*sub_bounds)
         else:
-            subtrahend = d.loc[
-                ((d["LocalTimestamp"] >= start[i * 4 + s]) & (d["LocalTimestamp"] <= takeoff[i * 4 + s]))]
-
-        minuend = transform_eda(minuend)
-        subtrahend = transform_eda(subtrahend)
+            minuend = transform_eda(phases.frame(d, i + 1, s + 1, interval))
+            subtrahend = transform_eda(phases.frame(d, i + 1, s + 1, baseline_interval, offsets=sub_offsets))
 
-        min_m = calculate_eda_features(minuend)
-        sub_m = calculate_eda_features(subtrahend)
+            min_m = feature_cache.call(calculate_eda_features, minuend, mode=eda_mode,
+                                       resample_method=resample_method)
+            sub_m = feature_store.get(partial(calculate_eda_features, mode=eda_mode, resample_method=resample_method),
+                                      subtrahend, subject=i + 1, session=s + 1, modality="eda",
+                                      interval=baseline_interval)
 
         # background subtraction
         for k in min_m.keys():
             min_m[k] = min_m[k] - sub_m[k]
 
-        eda_helicopter.loc[s] = min_m.loc[0]
+        eda_helicopter.append(min_m.loc[0], index=s)
     # print results
     # print(f"participant: {i + 1} ---------------------------")
     # print(eda_helicopter)
     # or save the data
-    eda_helicopter.to_csv(f"preprocessed_data/" + experiment_name + f"/eda/" + interval + f"/subjectID_{i+1}.csv")
+    eda_helicopter.to_frame().to_csv(f"preprocessed_data/" + experiment_name + f"/eda/" + interval + f"/subjectID_{i+1}.csv")
 
 
 ########################################################################################################################
@@ -186,39 +218,35 @@ for i in range(12):  # for all participants
 ########################################################################################################################
 if not os.path.exists("./preprocessed_data/" + experiment_name + "/tmp/" + interval + "/"):
     os.makedirs("./preprocessed_data/" + experiment_name + "/tmp/" + interval + "/")
-data_t1 = data_loader.load_helicopter("T1")
-data_th = data_loader.load_helicopter("TH")
+data = data_loader.helicopter_store(["T1", "TH"], max_cached=max_cached)
 for i in range(12):  # for all participants
     # for saving
-    tmp_helicopter = pd.DataFrame(columns=constants.ALL_TMP_FEATURES)
-    print(f"person {i + 1}: pretest {takeoff[i * 4:(i + 1) * 4] - start[i * 4:(i + 1) * 4]}")
+    tmp_helicopter = ResultAccumulator(constants.ALL_TMP_FEATURES, dtype=float)
+    print(f"person {i + 1}: pretest {[phases.duration(i + 1, s + 1, baseline_interval) for s in range(4)]}")
 
     for s in range(4):  # for all settings
         # cut data into pieces
-        d_t1 = data_t1[i][s][0]
-        minuend_t1 = d_t1.loc[
-            ((d_t1["LocalTimestamp"] >= start[i * 4 + s]) & (d_t1["LocalTimestamp"] <= posttest[i * 4 + s]))]
-        subtrahend_t1 = d_t1.loc[
-            ((d_t1["LocalTimestamp"] >= start[i * 4 + s]) & (d_t1["LocalTimestamp"] <= takeoff[i * 4 + s]))]
-        d_th = data_th[i][s][0]
-        minuend_th = d_th.loc[
-            ((d_th["LocalTimestamp"] >= start[i * 4 + s]) & (d_th["LocalTimestamp"] <= posttest[i * 4 + s]))]
-        subtrahend_th = d_th.loc[
-            ((d_th["LocalTimestamp"] >= start[i * 4 + s]) & (d_th["LocalTimestamp"] <= takeoff[i * 4 + s]))]
+        d_t1 = data[i + 1, s + 1, "T1"]
+        minuend_t1 = phases.frame(d_t1, i + 1, s + 1, interval)
+        subtrahend_t1 = phases.frame(d_t1, i + 1, s + 1, baseline_interval)
+        d_th = data[i + 1, s + 1, "TH"]
+        minuend_th = phases.frame(d_th, i + 1, s + 1, interval)
+        subtrahend_th = phases.frame(d_th, i + 1, s + 1, baseline_interval)
 
         minuend = transform_thermo_pile(minuend_t1, minuend_th)
         subtrahend = transform_thermo_pile(subtrahend_t1, subtrahend_th)
 
         # calcualte features
-        min_m = calculate_thermo_pile_features(minuend)
-        sub_m = calculate_thermo_pile_features(subtrahend)
+        min_m = feature_cache.call(calculate_thermo_pile_features, minuend)
+        sub_m = feature_store.get(calculate_thermo_pile_features, subtrahend, subject=i + 1, session=s + 1,
+                                  modality="tmp", interval=baseline_interval)
         # background subtraction
         for k in min_m.keys():
             min_m[k] = min_m[k] - sub_m[k]
 
-        tmp_helicopter.loc[s] = min_m.loc[0]
+        tmp_helicopter.append(min_m.loc[0], index=s)
     # print results
     # print(f"participant: {i + 1} ---------------------------")
     # print(tmp_helicopter)
     # or save the data
-    tmp_helicopter.to_csv(f"preprocessed_data/" + experiment_name + f"/tmp/" + interval + f"/subjectID_{i+1}.csv")
\ No newline at end of file
+    tmp_helicopter.to_frame().to_csv(f"preprocessed_data/" + experiment_name + f"/tmp/" + interval + f"/subjectID_{i+1}.csv")
\ No newline at end of file
@@ -1,17 +1,12 @@
 import pandas as pd
 import constants
+from utils.labels import derive_labels, HELICOPTER_LABEL_SPECS
 
 
 data = pd.read_csv(constants.HELICOPTER_DATA_PATH + "timings.csv")
 
-labels = data[["ParticipantID", "Session", "PassageOfTimeSlowFast"]]
-for i in range(labels.shape[0]):
-    if labels["PassageOfTimeSlowFast"][i] < 3:
-        labels["PassageOfTimeSlowFast"][i] = 0
-    elif labels["PassageOfTimeSlowFast"][i] == 3:
-        labels["PassageOfTimeSlowFast"][i] = 1
-    else:
-        labels["PassageOfTimeSlowFast"][i] = 2
+# PassageOfTimeSlowFast: 1, 2 -> 0 (slow), 3 -> 1 (medium), 4, 5 -> 2 (fast)
+labels = derive_labels(data[["ParticipantID", "Session", "PassageOfTimeSlowFast"]], HELICOPTER_LABEL_SPECS)
 
 
-labels.to_csv(constants.HELICOPTER_DATA_PATH + "labels_3_classes.csv", index=False)
\ No newline at end of file
+labels.to_csv(constants.HELICOPTER_DATA_PATH + "labels_3_classes.csv", index=False)
@@ -0,0 +1,205 @@
+import os
+from functools import partial
+
+import pandas as pd
+
+import constants
+from preprocessing_scripts.eda_features import transform_eda, calculate_eda_features
+from preprocessing_scripts.peak_index import detect_ppg_peaks, detect_eda_peaks
+from preprocessing_scripts.ppg_features import transform_ppg, calculate_ppg_features_nk
+from preprocessing_scripts.tmp_features import transform_thermo_pile, calculate_thermo_pile_features
+from utils.csv_cache import read_csv_cached
+from utils.feature_cache import FeatureCache
+from utils.feature_store import FeatureStore
+from utils.intervals import PhaseTable, cover
+from utils.pipeline import cache_path
+from utils.result_accumulator import ResultAccumulator
+from utils.signal_store import open_signal_store
+
+# Stages of the helicopter study (see run_pipeline.py), per (subject, session) setting:
+#   load (memory-mapped recordings) -> slice (minuend interval and baseline) -> clean (column names, stream
+#   alignment) -> features -> baseline subtraction, then one write stage per modality.
+HELICOPTER_SUBJECTS = list(range(1, 13))
+HELICOPTER_SESSIONS = list(range(1, 5))
+HELICOPTER_MODALITIES = {"ppg": ["PPG"], "eda": ["EDA"], "tmp": ["T1", "TH"]}  # modality -> recordings
+HELICOPTER_FEATURES = {"ppg": constants.ALL_PPG_FEATURES_NEUROKIT_AVAILABLE, "eda": constants.ALL_EDA_FEATURES,
+                       "tmp": constants.ALL_TMP_FEATURES}
+HELICOPTER_OUTPUT_DIRECTORIES = {"ppg": "ppg_nk", "eda": "eda", "tmp": "tmp"}
+# the PPG baseline subtraction is disabled in calc_all_features.py
+SUBTRACT_BASELINE = {"ppg": False, "eda": True, "tmp": True}
+# ACHTUNG Hack because the minimum required signal time is 10 sec and in this setting it is only 9
+BASELINE_OFFSETS = {"eda": {(6, 1): (-1.5, 0)}}
+# hacking the only data point which is nan for some reason?
+PPG_TARGET_F = {(11, 2): 200}
+
+
+def recording_path(data_root, subject, session, kind) -> str:
+    """:return: path of the raw recording of a session, e.g., kind "PPG"."""
+    return os.path.join(data_root, "helicopter", "Physiological", kind, f"subject{subject}-{session}_{kind}.csv")
+
+
+def timestamps_path(data_root) -> str:
+    """:return: path of the phase timestamps of all sessions."""
+    return os.path.join(data_root, "helicopter", "Physiological", "timestamps.csv")
+
+
+def output_path(output_root, experiment_name, modality, interval, subject) -> str:
+    """:return: path of the feature file of a subject (one row per session)."""
+    return os.path.join(output_root, experiment_name, HELICOPTER_OUTPUT_DIRECTORIES[modality], interval,
+                        f"subjectID_{subject}.csv")
+
+
+def load_phase_table(data_root) -> PhaseTable:
+    """:return: (subject, session, phase) -> timestamp lookup, see utils/intervals.py."""
+    return PhaseTable(pd.read_csv(timestamps_path(data_root)))
+
+
+def load_recordings(setting, data_root, kinds) -> dict:
+    """ Opens the recordings of a session, ingested into memory-mapped stores on first access.
+
+    :param setting: (subject, session).
+    :param data_root: Directory of the study data and the caches, e.g., "/Volumes/Data/chronopilot".
+    :param kinds: Recordings of the modality, e.g., ["T1", "TH"].
+
+    :return: dict kind -> SignalStore, None if a recording does not exist.
+    """
+    subject, session = setting
+    stores = {}
+    for kind in kinds:
+        path = recording_path(data_root, subject, session, kind)
+        if not os.path.exists(path):
+            print(f"no {kind} recording of subject {subject} session {session}")
+            return None
+        name = os.path.splitext(os.path.basename(path))[0]
+        stores[kind] = open_signal_store(path, os.path.join(cache_path(data_root, "signals"), "helicopter", name),
+                                         read_fn=lambda p: read_csv_cached(p, cache_path=cache_path(data_root, "csv"),
+                                                                           header=0))
+    return stores
+
+
+def slice_intervals(setting, recordings, phases, modality, interval, baseline_interval, reuse_peaks=False) -> dict:
+    """ Cuts the minuend interval and the baseline out of the recordings of a session.
+
+    :param recordings: dict kind -> SignalStore, see load_recordings.
+    :param phases: PhaseTable of the study.
+    :param modality: "ppg", "eda" or "tmp".
+    :param interval: Minuend interval, e.g., "start_posttest".
+    :param baseline_interval: Baseline interval, e.g., "start_takeoff".
+    :param reuse_peaks: True cuts one interval covering both for a single peak detection (PPG, EDA).
+
+    :return: dict with the "bounds" (part -> (start, end)) and the "frames" (part -> kind -> data frame) of the parts
+             "interval" and "baseline" (or "cover"), None without recordings.
+    """
+    if recordings is None:
+        return None
+    subject, session = setting
+    offsets = BASELINE_OFFSETS.get(modality, {}).get(setting, (0, 0))
+    bounds = {"interval": phases.bounds(subject, session, interval),
+              "baseline": phases.bounds(subject, session, baseline_interval, offsets=offsets)}
+    parts = {"cover": cover(*bounds.values())} if reuse_peaks else bounds
+    return {"bounds": bounds,
+            "frames": {part: {kind: store.frame(*b) for kind, store in recordings.items()} for part, b in parts.items()}}
+
+
+def clean_intervals(setting, sliced, modality) -> dict:
+    """:return: sliced with one data frame per part in the format of the feature functions (transform_ppg,
+    transform_eda, transform_thermo_pile), None without recordings."""
+    if sliced is None:
+        return None
+    parts = list(sliced["frames"].keys())
+    if modality == "ppg":
+        frames = [transform_ppg(sliced["frames"][part]["PPG"]) for part in parts]
+    elif modality == "eda":
+        frames = [transform_eda(sliced["frames"][part]["EDA"]) for part in parts]
+    else:
+        frames = [transform_thermo_pile(sliced["frames"][part]["T1"], sliced["frames"][part]["TH"]) for part in parts]
+    return {"bounds": sliced["bounds"], "frames": dict(zip(parts, frames))}
+
+
+def calc_features(setting, cleaned, modality, baseline_interval, data_root, eda_mode="upsample",
+                  ppg_features=None, hrv_expensive=True,
+                  hrv_entropy_backend="native", resample_method="fft") -> dict:
+    """ Features of the minuend interval and, if it is subtracted (SUBTRACT_BASELINE), of the baseline.
+
+    With a "cover" part, the peaks are detected once on it and both intervals are sliced from the peak index (see
+    preprocessing_scripts/peak_index.py). Results are cached (utils/feature_cache.py), the baseline features are
+    kept in the FeatureStore.
+
+    :param eda_mode: native or upsample, see calculate_eda_features.
+    :param ppg_features: Names of the neurokit PPG features calculated from the peaks (see
+                         preprocessing_scripts/hrv.py), None for the full nk.ppg_analyze; a "cover" part (peak reuse)
+                         needs the names.
+    :param hrv_expensive: With ppg_features, True also calculates the DFA, entropy and fractal features.
+    :param hrv_entropy_backend: neurokit or native, see preprocessing_scripts/hrv.py.
+    :param resample_method: Resampling of the PPG and the EDA (upsample mode), see preprocessing_scripts/resampling.py.
+
+    :return: dict "interval" -> features, "baseline" -> features or None; None without recordings.
+    """
+    if cleaned is None:
+        return None
+    subject, session = setting
+    bounds, frames = cleaned["bounds"], cleaned["frames"]
+    parts = ["interval", "baseline"] if SUBTRACT_BASELINE[modality] else ["interval"]
+    feature_cache = FeatureCache(cache_path(data_root, "results"))
+    feature_store = FeatureStore(cache_path(data_root, "features"))
+    features = {"interval": None, "baseline": None}
+
+    if modality == "ppg":
+        target_f = PPG_TARGET_F.get(setting, 100)
+        if "cover" in frames:
+            ppg_peaks = feature_cache.call(detect_ppg_peaks, frames["cover"], target_f=target_f,
+                                           resample_method=resample_method)
+            for part in parts:
+                features[part] = ppg_peaks.hrv_features(*bounds[part], features=ppg_features, expensive=hrv_expensive,
+                                                        entropy_backend=hrv_entropy_backend)
+        else:
+            for part in parts:
+                features[part] = feature_cache.call(calculate_ppg_features_nk, frames[part], target_f=target_f,
+                                                    features=ppg_features, expensive=hrv_expensive,
+                                                    entropy_backend=hrv_entropy_backend,
+                                                    resample_method=resample_method)
+    elif modality == "eda":
+        if "cover" in frames:
+            eda_peaks = feature_cache.call(detect_eda_peaks, frames["cover"], mode=eda_mode,
+                                           resample_method=resample_method)
+            for part in parts:
+                features[part] = eda_peaks.eda_features(*bounds[part])
+        else:
+            features["interval"] = feature_cache.call(calculate_eda_features, frames["interval"], mode=eda_mode,
+                                                      resample_method=resample_method)
+            features["baseline"] = feature_store.get(
+                partial(calculate_eda_features, mode=eda_mode, resample_method=resample_method), frames["baseline"],
+                subject=subject, session=session, modality="eda", interval=baseline_interval)
+    else:
+        features["interval"] = feature_cache.call(calculate_thermo_pile_features, frames["interval"])
+        features["baseline"] = feature_store.get(calculate_thermo_pile_features, frames["baseline"], subject=subject,
+                                                 session=session, modality="tmp", interval=baseline_interval)
+    return features
+
+
+def subtract_baseline(setting, features) -> pd.DataFrame:
+    """:return: features of the interval minus the ones of the baseline (if calculated), None without recordings."""
+    if features is None:
+        return None
+    if features["baseline"] is None:
+        return features["interval"]
+    return features["interval"] - features["baseline"]
+
+
+def write_subject_features(features, columns, files) -> list:
+    """ Writes the features of every subject to its file, one row per session (index session - 1).
+
+    :param features: dict (subject, session) -> one-row data frame or None.
+    :param columns: Feature columns, e.g., constants.ALL_EDA_FEATURES.
+    :param files: dict subject -> path of the feature file.
+
+    :return: written files.
+    """
+    results = {subject: ResultAccumulator(columns, dtype=float) for subject in files}
+    for (subject, session), frame in features.items():
+        if frame is not None:
+            results[subject].append(frame.loc[0], index=session - 1)
+    for subject, file in files.items():
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        results[subject].to_frame().to_csv(file)
+    return list(files.values())
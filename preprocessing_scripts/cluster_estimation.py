@@ -0,0 +1,121 @@
+import numpy as np
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import silhouette_score
+from typing import Tuple
+
+
+def estimate_clusters(X, method="exact", k_min=2, k_max=10, sample_size=2000, random_state=42) -> Tuple[int, float]:
+    """ Estimates the number of clusters of gaze positions and the silhouette score of the best clustering.
+
+    Available methods (see CLUSTER_ESTIMATORS):
+        exact: KMeans for every k and the exact silhouette score (O(n^2), the original sweep).
+        subsampled: KMeans for every k, silhouette score on a random subsample of sample_size points.
+        minibatch: MiniBatchKMeans warm started from the centers of the previous k, subsampled silhouette score.
+        simplified: KMeans for every k and the simplified silhouette (distances to the centroids only, O(n k)).
+        grid: number of density peaks of a 2d histogram, scored with the simplified silhouette of one KMeans fit.
+
+    :param X: Feature matrix n_samples x 2, e.g., norm_pos_x and norm_pos_y.
+    :param method: Name of the estimator.
+    :param k_min: Smallest number of clusters.
+    :param k_max: Largest number of clusters.
+    :param sample_size: Number of samples used by the subsampled silhouette scores.
+    :param random_state: Random state of the clusterings and subsamples.
+
+    :return k: Best number of clusters.
+    :return score: Silhouette score of the best number of clusters.
+
+    :raises ValueError: If there are not enough samples for the clusterings (like KMeans / silhouette_score).
+    """
+    if method not in CLUSTER_ESTIMATORS:
+        raise ValueError(f"unknown cluster estimation method {method}, use one of {list(CLUSTER_ESTIMATORS)}")
+    X = np.asarray(X, dtype=float)
+    if X.shape[0] <= k_min:
+        raise ValueError(f"n_samples={X.shape[0]} should be > n_clusters={k_min}")
+    return CLUSTER_ESTIMATORS[method](X, k_min, k_max, sample_size, random_state)
+
+
+def _best(ks, scores) -> Tuple[int, float]:
+    best = int(np.argmax(scores))
+    return ks[best], float(scores[best])
+
+
+def _exact_sweep(X, k_min, k_max, sample_size, random_state) -> Tuple[int, float]:
+    ks = list(range(k_min, k_max + 1))
+    scores = []
+    for k in ks:
+        cluster_labels = KMeans(n_clusters=k, random_state=random_state).fit_predict(X)
+        scores.append(silhouette_score(X, cluster_labels))
+    return _best(ks, scores)
+
+
+def _subsampled_sweep(X, k_min, k_max, sample_size, random_state) -> Tuple[int, float]:
+    ks = list(range(k_min, k_max + 1))
+    scores = []
+    for k in ks:
+        cluster_labels = KMeans(n_clusters=k, random_state=random_state).fit_predict(X)
+        scores.append(_subsampled_silhouette(X, cluster_labels, sample_size, random_state))
+    return _best(ks, scores)
+
+
+def _minibatch_sweep(X, k_min, k_max, sample_size, random_state) -> Tuple[int, float]:
+    ks = []
+    scores = []
+    centers = None
+    for k in range(k_min, min(k_max, X.shape[0] - 1) + 1):
+        if centers is None:
+            init = "k-means++"
+        else:
+            # warm start: keep the previous centers and add the point farthest away from all of them
+            distances = np.min(((X[:, None, :] - centers[None, :, :]) ** 2).sum(axis=-1), axis=1)
+            init = np.vstack((centers, X[np.argmax(distances)]))
+        kmeans = MiniBatchKMeans(n_clusters=k, init=init, n_init=1, random_state=random_state,
+                                 batch_size=min(1024, X.shape[0]))
+        cluster_labels = kmeans.fit_predict(X)
+        centers = kmeans.cluster_centers_
+        ks.append(k)
+        scores.append(_subsampled_silhouette(X, cluster_labels, sample_size, random_state))
+    return _best(ks, scores)
+
+
+def _simplified_sweep(X, k_min, k_max, sample_size, random_state) -> Tuple[int, float]:
+    ks = list(range(k_min, k_max + 1))
+    scores = []
+    for k in ks:
+        kmeans = KMeans(n_clusters=k, random_state=random_state).fit(X)
+        scores.append(_simplified_silhouette(X, kmeans.labels_, kmeans.cluster_centers_))
+    return _best(ks, scores)
+
+
+def _grid_density(X, k_min, k_max, sample_size, random_state, bins=20) -> Tuple[int, float]:
+    histogram, _, _ = np.histogram2d(X[:, 0], X[:, 1], bins=bins)
+    # a cell is a density peak if it is populated above average and not smaller than any of its 8 neighbours
+    padded = np.pad(histogram, 1, constant_values=-1)
+    neighbours = np.stack([padded[1 + dx:1 + dx + bins, 1 + dy:1 + dy + bins]
+                           for dx in (-1, 0, 1) for dy in (-1, 0, 1) if dx != 0 or dy != 0])
+    peaks = (histogram >= neighbours.max(axis=0)) & (histogram > histogram[histogram > 0].mean())
+    k = int(np.clip(np.count_nonzero(peaks), k_min, min(k_max, X.shape[0] - 1)))
+    kmeans = KMeans(n_clusters=k, random_state=random_state).fit(X)
+    return k, _simplified_silhouette(X, kmeans.labels_, kmeans.cluster_centers_)
+
+
+def _subsampled_silhouette(X, cluster_labels, sample_size, random_state) -> float:
+    if X.shape[0] <= sample_size:
+        return silhouette_score(X, cluster_labels)
+    return silhouette_score(X, cluster_labels, sample_size=sample_size, random_state=random_state)
+
+
+def _simplified_silhouette(X, cluster_labels, centers) -> float:
+    # a = distance to the own centroid, b = distance to the closest other centroid
+    distances = np.sqrt(((X[:, None, :] - centers[None, :, :]) ** 2).sum(axis=-1))
+    a = distances[np.arange(X.shape[0]), cluster_labels]
+    distances[np.arange(X.shape[0]), cluster_labels] = np.inf
+    b = distances.min(axis=1)
+    denominator = np.maximum(a, b)
+    return float(np.mean(np.where(denominator > 0, (b - a) / np.where(denominator > 0, denominator, 1), 0.0)))
+
+
+CLUSTER_ESTIMATORS = {"exact": _exact_sweep,
+                      "subsampled": _subsampled_sweep,
+                      "minibatch": _minibatch_sweep,
+                      "simplified": _simplified_sweep,
+                      "grid": _grid_density}
@@ -0,0 +1,32 @@
+import neurokit2 as nk
+import pandas as pd
+
+from preprocessing_scripts.hrv import hrv_features
+
+
+def calculate_ecg_features_nk(ecg, sampling_rate, verbose=False, features=None, expensive=False,
+                              entropy_backend="neurokit") -> pd.DataFrame:
+    """ Calculates the interval-related ECG features with neurokit.
+
+    :param ecg: Raw ECG signal (1-d array).
+    :param sampling_rate: Sampling rate of the signal in Hz.
+    :param verbose: True gives debug prints.
+    :param features: Names of the features, e.g., a subset of constants.ALL_ECG_FEATURES_NEUROKIT, calculated from the
+                     R peaks (see preprocessing_scripts/hrv.py); None for all features of nk.ecg_analyze.
+    :param expensive: True also calculates the requested DFA, entropy and fractal features (only with features).
+    :param entropy_backend: neurokit or native, see preprocessing_scripts/hrv.py (only with features).
+
+    :return: features: data frame with one row of interval-related neurokit features.
+    """
+    if features is not None:
+        # the R peaks of nk.ecg_process, without its rate and quality signals
+        cleaned = nk.ecg_clean(ecg, sampling_rate=sampling_rate)
+        _, info = nk.ecg_peaks(cleaned, sampling_rate=sampling_rate, correct_artifacts=True)
+        if verbose:
+            print(f"found {len(info['ECG_R_Peaks'])} R peaks")
+        return pd.DataFrame([hrv_features(info["ECG_R_Peaks"], sampling_rate, features, expensive=expensive,
+                                          entropy_backend=entropy_backend, n_samples=len(cleaned))])
+    processed, info = nk.ecg_process(ecg, sampling_rate=sampling_rate)
+    if verbose:
+        print(f"found {len(info['ECG_R_Peaks'])} R peaks")
+    return nk.ecg_analyze(processed, sampling_rate=sampling_rate, method="interval-related")
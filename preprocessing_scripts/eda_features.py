@@ -2,19 +2,31 @@ import warnings
 import numpy as np
 import pandas as pd
 import neurokit2 as nk
-from scipy.signal import resample
+from scipy.interpolate import CubicSpline
 import constants
+from preprocessing_scripts.resampling import resample_signal
 
 
-def calculate_eda_features(eda_data: pd.DataFrame, target_f=10000, verbose=False):
+def calculate_eda_features(eda_data: pd.DataFrame, target_f=10000, verbose=False, mode="upsample",
+                           resample_method="fft"):
     """ Calculates eda features using the NeuroKit2 library.
 
         Filters the raw EDA data and calculates features from it.
 
+        Modes:
+            upsample: the signal is upsampled to target_f before the NeuroKit pipeline (the original approach).
+            native: the signal is interpolated (cubic spline) to constants.EDA_PROCESSING_FREQ, a small multiple of
+                    the device rate; the SCR peak and onset heights are refined by parabolic interpolation of the phasic
+                    component, which gives the sub-sample accuracy of the upsampling at a fraction of the samples
+                    (see benchmarks/eda_processing_benchmark.py). target_f is ignored.
+
         :param eda_data: Raw EDA data in a pandas data frame containing two columns: "LocalTimestamp" and "EDA".
         :param target_f: Target frequency in Hz on how much to upsample the signal for better calculation stability,
                             e.g., 10000 Hz.
         :param verbose: True gives debug prints.
+        :param mode: "upsample" or "native".
+        :param resample_method: Resampling method of the upsample mode, see
+                                preprocessing_scripts.resampling.resample_signal.
 
         :return p_1_features: EDA features of the raw time series.
 
@@ -25,25 +37,91 @@ def calculate_eda_features(eda_data: pd.DataFrame, target_f=10000, verbose=False
         warnings.warn("No EDA data -- returning nan")
         return pd.DataFrame(np.empty((len(constants.ALL_EDA_FEATURES),)).fill(np.nan), columns=constants.ALL_EDA_FEATURES, index=[0])
 
-    og_f = eda_data["EDA"].to_numpy().shape[0] / (
-            eda_data["LocalTimestamp"].iloc[-1] - eda_data["LocalTimestamp"].iloc[0])
-
-    signal_resampled = resample(eda_data["EDA"].to_numpy(),
-                                int(np.ceil((eda_data["EDA"].to_numpy()).shape[0] * target_f / og_f)))
-    f = signal_resampled.shape[0] / (eda_data["LocalTimestamp"].iloc[-1] - eda_data["LocalTimestamp"].iloc[0])
+    signal_resampled, f = resample_eda(eda_data, target_f=target_f, mode=mode, resample_method=resample_method)
 
     if verbose:
+        og_f = eda_data["EDA"].to_numpy().shape[0] / (
+                eda_data["LocalTimestamp"].iloc[-1] - eda_data["LocalTimestamp"].iloc[0])
         print(f"The original frequency is {og_f}")
         print(f"The new frequency is {f}")
         print(f"Length of the resampled signal {signal_resampled.shape}")
 
     p_1_process, info = nk.eda_process(signal_resampled, sampling_rate=f, method="neurokit")  # , report=f"myreport_{target_f}.html"
 
-    p_1_features = nk.eda_analyze(p_1_process, sampling_rate=f, method="interval-related")
+    # the autocorrelation lag is used as an index (lag * sampling_rate), i.e., NeuroKit needs an integer rate here; with
+    # the non-integer rates of the upsample mode, windows longer than 30 s raised an IndexError, for shorter windows the
+    # rate is not used by the interval-related features
+    p_1_features = nk.eda_analyze(p_1_process, sampling_rate=int(round(f)), method="interval-related")
+
+    if mode == "native":
+        amplitudes = _refined_scr_amplitudes(p_1_process["EDA_Phasic"].to_numpy(), info)
+        p_1_features["SCR_Peaks_Amplitude_Mean"] = np.nanmean(amplitudes) if np.any(~np.isnan(amplitudes)) \
+            else np.nan
 
     return p_1_features
 
 
+def resample_eda(eda_data: pd.DataFrame, target_f=10000, mode="upsample", resample_method="fft"):
+    """ Resamples raw EDA data to the processing rate of calculate_eda_features.
+
+    :param eda_data: Raw EDA data in a pandas data frame containing two columns: "LocalTimestamp" and "EDA".
+    :param target_f: Target frequency of the upsample mode in Hz.
+    :param mode: "upsample" or "native" (constants.EDA_PROCESSING_FREQ), see calculate_eda_features.
+    :param resample_method: Resampling method of the upsample mode.
+
+    :return signal_resampled: Resampled signal, spanning the first to the last timestamp.
+    :return f: Sampling rate of the resampled signal in Hz.
+
+    :raises ValueError: If the mode is unknown.
+    """
+    if mode not in ("upsample", "native"):
+        raise ValueError(f"unknown EDA processing mode {mode}, use upsample or native")
+    duration = eda_data["LocalTimestamp"].iloc[-1] - eda_data["LocalTimestamp"].iloc[0]
+    raw = eda_data["EDA"].to_numpy()
+
+    if mode == "native":
+        # exactly constants.EDA_PROCESSING_FREQ samples per second, i.e., an integer sampling rate throughout the
+        # NeuroKit pipeline; a cubic spline instead of the FFT resampling, whose periodic wrap-around rings at the end
+        # of the signal
+        target_f = constants.EDA_PROCESSING_FREQ
+        signal_resampled = CubicSpline(np.arange(raw.shape[0]), raw)(
+            np.linspace(0, raw.shape[0] - 1, max(2, int(round(duration * target_f)))))
+        return signal_resampled, target_f
+
+    signal_resampled = resample_signal(raw, raw.shape[0] / duration, target_f, method=resample_method)
+    return signal_resampled, signal_resampled.shape[0] / duration
+
+
+def _parabolic_extremum(y, indices) -> np.ndarray:
+    """Value of the vertex of the parabola through the samples indices - 1, indices, indices + 1."""
+    indices = np.asarray(indices, dtype=int)
+    values = y[indices].astype(float)
+    inner = (indices > 0) & (indices < y.shape[0] - 1)
+    y0, y1, y2 = y[indices[inner] - 1], y[indices[inner]], y[indices[inner] + 1]
+    curvature = y0 - 2 * y1 + y2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        offset = np.where(curvature != 0, 0.5 * (y0 - y2) / curvature, 0.0)
+    # only refine real local extrema, i.e., the vertex lies within half a sample
+    offset = np.where(np.abs(offset) <= 0.5, offset, 0.0)
+    values[inner] = y1 - 0.25 * (y0 - y2) * offset
+    return values
+
+
+def _refined_scr_amplitudes(phasic, info) -> np.ndarray:
+    """SCR amplitudes (peak height - onset height) like nk.eda_peaks, with interpolated peak and onset heights."""
+    peaks = np.asarray(info["SCR_Peaks"])
+    onsets = np.asarray(info["SCR_Onsets"], dtype=float)
+    amplitudes = np.full(peaks.shape[0], np.nan)
+    valid = ~np.isnan(onsets)
+    if peaks.shape[0] == 0 or not np.any(valid):
+        return amplitudes
+    # same pairing as nk.eda_peaks: only peaks after the first onset have an amplitude
+    valid &= peaks > np.nanmin(onsets)
+    amplitudes[valid] = _parabolic_extremum(phasic, peaks[valid]) - \
+        _parabolic_extremum(phasic, onsets[valid].astype(int))
+    return amplitudes
+
+
 def transform_eda(raw_data: pd.DataFrame) -> pd.DataFrame:
     """Helper function to rename the columns of a data frame such that they work with the rest of the pipeline.
 
@@ -0,0 +1,264 @@
+import numpy as np
+from scipy.spatial.distance import cdist
+
+# similarities of the fuzzy entropy computed at once (memory: 8 bytes each)
+FUZZY_BLOCK_SIZE = 2 ** 22
+MULTISCALE_METHODS = ["MSEn", "CMSEn", "RCMSEn"]
+
+
+def sample_entropy(signal, tolerance, dimension=2, delay=1) -> float:
+    """ Sample entropy, same definition as nk.entropy_sample (Chebyshev distance, self matches excluded).
+
+    :param signal: 1-d array, e.g., RR intervals.
+    :param tolerance: Tolerance r in units of the signal, e.g., 0.2 * np.std(signal, ddof=1).
+    :param dimension: Embedding dimension m.
+    :param delay: Embedding delay.
+
+    :return: SampEn = -log(matches of m + 1 / matches of m).
+    """
+    return sample_entropy_batch([signal], [tolerance], dimension=dimension, delay=delay)[0]
+
+
+def sample_entropy_batch(signals, tolerances, dimension=2, delay=1) -> np.ndarray:
+    """ Sample entropy of several signals (e.g., the recordings of a study) in one vectorized pass.
+
+    :param signals: List of 1-d arrays.
+    :param tolerances: Tolerance of every signal.
+
+    :return: array of the sample entropies.
+    """
+    return _phi_divide(*_sample_phis(signals, tolerances, dimension, delay))
+
+
+def approximate_entropy(signal, tolerance, dimension=2, delay=1) -> float:
+    """ Approximate entropy, same definition as nk.entropy_approximate (self matches included).
+
+    :return: ApEn = |phi_m - phi_m+1|.
+    """
+    return approximate_entropy_batch([signal], [tolerance], dimension=dimension, delay=delay)[0]
+
+
+def approximate_entropy_batch(signals, tolerances, dimension=2, delay=1) -> np.ndarray:
+    """:return: approximate entropy of several signals in one vectorized pass (see sample_entropy_batch)."""
+    templates = _Templates(signals, tolerances, dimension, delay)
+    n_series = len(signals)
+    first, second, match_next = templates.matches()
+    # matches per template incl. the template itself
+    counts = 1 + np.bincount(first, minlength=templates.size) + np.bincount(second, minlength=templates.size)
+    phi = _series_mean(np.log(counts / templates.series_size[templates.series]), templates.series, n_series)
+    first, second = first[match_next], second[match_next]
+    counts = 1 + np.bincount(first, minlength=templates.size) + np.bincount(second, minlength=templates.size)
+    has_next = templates.has_next
+    series = templates.series[has_next]
+    size_next = np.bincount(series, minlength=n_series)
+    phi_next = _series_mean(np.log(counts[has_next] / size_next[series]), series, n_series)
+    return np.abs(phi - phi_next)
+
+
+def fuzzy_entropy(signal, tolerance, dimension=2, delay=1) -> float:
+    """ Fuzzy entropy, same definition as nk.entropy_fuzzy: sample entropy with the similarity exp(-d / r) of the
+    baseline-free templates instead of d <= r.
+
+    Every pair of templates contributes, i.e., the cost stays quadratic; only the upper triangle of the similarity
+    matrix is computed, in blocks of FUZZY_BLOCK_SIZE similarities (bounded memory).
+
+    :return: FuzzyEn.
+    """
+    signal = np.asarray(signal, dtype=float)
+    phi = np.zeros(2)
+    for i, m in enumerate([dimension, dimension + 1]):
+        # like neurokit without the last template of dimension m
+        n_templates = signal.shape[0] - (m - 1) * delay - (1 if i == 0 else 0)
+        positions = np.arange(n_templates)[:, None] + delay * np.arange(m)[None, :]
+        templates = signal[positions]
+        templates = templates - templates.mean(axis=1, keepdims=True)
+        rows = max(1, FUZZY_BLOCK_SIZE // max(1, n_templates))
+        total = 0.0
+        for start in range(0, n_templates, rows):
+            block = templates[start:start + rows]
+            similarity = np.exp(-cdist(block, templates[start:], metric="chebyshev") / tolerance)
+            # pairs j > i only
+            total += np.triu(similarity, k=1).sum()
+        # mean over the templates of (similarity to the others) / (n - 1)
+        phi[i] = 2 * total / (n_templates * (n_templates - 1))
+    return _phi_divide(phi[:1], phi[1:])[0]
+
+
+def multiscale_entropy(signal, tolerance, dimension=2, method="MSEn", scale="default") -> float:
+    """ Multiscale sample entropy, same definition as nk.entropy_multiscale for MSEn, CMSEn and RCMSEn.
+
+    The coarse-grained series of all scales (and all time shifts of the composite variants) are counted in one
+    vectorized pass instead of one sample entropy per series.
+
+    :param signal: 1-d array, e.g., RR intervals.
+    :param tolerance: Tolerance r of all scales, e.g., 0.2 * np.std(signal, ddof=1).
+    :param dimension: Embedding dimension m.
+    :param method: MSEn (coarse-grained means), CMSEn (mean entropy of the time shifted series) or RCMSEn (entropy of
+                   the mean matches of the time shifted series).
+    :param scale: "default" (1 .. len / (dimension + 10)), int (1 .. scale) or list of scales.
+
+    :return: area under the entropy over the scales with a finite entropy, divided by their number.
+
+    :raises ValueError: If the method is unknown.
+    """
+    return multiscale_entropy_batch([signal], [tolerance], dimension=dimension, method=method, scale=scale)[0]
+
+
+def multiscale_entropy_batch(signals, tolerances, dimension=2, method="MSEn", scale="default") -> np.ndarray:
+    """:return: multiscale entropy of several signals in one vectorized pass (see multiscale_entropy)."""
+    if method not in MULTISCALE_METHODS:
+        raise ValueError(f"unknown method {method}, use one of {MULTISCALE_METHODS}")
+    series, series_tolerances, groups = [], [], []  # group = (signal, scale) of every coarse-grained series
+    scales = []
+    for k, (signal, tolerance) in enumerate(zip(signals, tolerances)):
+        signal = np.asarray(signal, dtype=float)
+        scales.append(_scales(signal, scale, dimension))
+        for s in scales[-1]:
+            coarse = _coarse_grain(signal, s, method)
+            series += coarse
+            series_tolerances += [tolerance] * len(coarse)
+            groups += [(k, s)] * len(coarse)
+    group_index = {group: i for i, group in enumerate(dict.fromkeys(groups))}
+    group_of_series = np.array([group_index[group] for group in groups], dtype=int)
+    n_groups = len(group_index)
+
+    phi, phi_next = _sample_phis(series, series_tolerances, dimension, 1)
+    if method == "RCMSEn":
+        # entropy of the mean matches of the time shifted series
+        values = _phi_divide(_valid_group_mean(phi, group_of_series, n_groups),
+                             _valid_group_mean(phi_next, group_of_series, n_groups))
+    else:
+        values = _valid_group_mean(_phi_divide(phi, phi_next), group_of_series, n_groups)
+
+    result = np.full(len(signals), np.nan)
+    for k in range(len(signals)):
+        value = np.array([values[group_index[(k, s)]] for s in scales[k]])
+        value = value[np.isfinite(value)]
+        if len(value) > 0:
+            result[k] = np.trapz(value) / len(value)
+    return result
+
+
+class _Templates:
+    """ Delay-embedded templates of several signals, stored as start positions in their concatenation. """
+
+    def __init__(self, signals, tolerances, dimension, delay):
+        self.dimension = dimension
+        self.delay = delay
+        signals = [np.asarray(signal, dtype=float) for signal in signals]
+        lengths = np.array([signal.shape[0] for signal in signals], dtype=int)
+        self.values = np.concatenate(signals + [np.full(dimension * delay + 1, np.nan)])
+        offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        # templates of dimension m of every signal, has_next: it also is a template of dimension m + 1
+        n_templates = np.maximum(0, lengths - (dimension - 1) * delay)
+        self.series = np.repeat(np.arange(len(signals)), n_templates)
+        position = np.arange(self.series.shape[0]) - np.repeat(np.cumsum(n_templates) - n_templates, n_templates)
+        self.start = offsets[self.series] + position
+        self.has_next = position < (lengths - dimension * delay)[self.series]
+        self.is_last = position == n_templates[self.series] - 1
+        self.series_size = np.bincount(self.series, minlength=len(signals))
+        self.tolerance = np.asarray(tolerances, dtype=float)[self.series]
+        self.size = self.series.shape[0]
+
+    def coordinate(self, k, templates=None) -> np.ndarray:
+        """:return: k-th value of the templates (NaN beyond the end of the signal for k = dimension)."""
+        start = self.start if templates is None else self.start[templates]
+        value = self.values[start + k * self.delay]
+        if k >= self.dimension:
+            value = np.where(self.has_next if templates is None else self.has_next[templates], value, np.nan)
+        return value
+
+    def matches(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """ All pairs of templates of the same signal within the tolerance (Chebyshev distance <= r).
+
+        Sorted-neighbour counting: after sorting the templates by their first value (offset by signal), the candidates
+        of a template are the following ones up to first value + r (binary search). Only these are compared in the
+        other values, and only pairs which match in dimension m are compared in the value m + 1.
+
+        :return: first, second template of each pair, whether the pair also matches in dimension m + 1.
+        """
+        first_value = self.coordinate(0)
+        finite = first_value[np.isfinite(first_value)]
+        spread = (finite.max() - finite.min()) if finite.shape[0] > 0 else 0.0
+        separation = spread + 2 * (self.tolerance.max() if self.size > 0 else 0.0) + 1
+        key = first_value + self.series * separation
+        order = np.argsort(key, kind="stable")
+        sorted_key = key[order]
+        # candidates: a slightly wider window than r (rounding of the offset keys), compared exactly below
+        margin = 1e-9 * (np.abs(sorted_key).max() + 1) if self.size > 0 else 0.0
+        end = np.searchsorted(sorted_key, sorted_key + self.tolerance[order] + margin, side="right")
+        n_candidates = np.maximum(0, end - np.arange(self.size) - 1)
+        first = np.repeat(np.arange(self.size), n_candidates)
+        second = first + 1 + np.arange(first.shape[0]) - np.repeat(np.cumsum(n_candidates) - n_candidates,
+                                                                   n_candidates)
+        first, second = order[first], order[second]
+
+        keep = self.series[first] == self.series[second]
+        for k in range(self.dimension):
+            first, second = first[keep], second[keep]
+            distance = np.abs(self.coordinate(k, first) - self.coordinate(k, second))
+            keep = distance <= self.tolerance[first]
+        first, second = first[keep], second[keep]
+        with np.errstate(invalid="ignore"):
+            match_next = np.abs(self.coordinate(self.dimension, first) -
+                                self.coordinate(self.dimension, second)) <= self.tolerance[first]
+        return first, second, match_next
+
+
+def _sample_phis(signals, tolerances, dimension, delay) -> tuple[np.ndarray, np.ndarray]:
+    # phi_m, phi_m+1 of the sample entropy of every signal: mean fraction of the other templates within the tolerance,
+    # like neurokit without the last template of dimension m (for delay 1 the templates of both dimensions are the same)
+    templates = _Templates(signals, tolerances, dimension, delay)
+    n_series = len(signals)
+    first, second, match_next = templates.matches()
+    both = ~templates.is_last[first] & ~templates.is_last[second]
+    pairs = np.bincount(templates.series[first[both]], minlength=n_series)
+    pairs_next = np.bincount(templates.series[first[match_next]], minlength=n_series)
+    size = np.bincount(templates.series[~templates.is_last], minlength=n_series).astype(float)
+    size_next = np.bincount(templates.series[templates.has_next], minlength=n_series).astype(float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return 2 * pairs / (size * (size - 1)), 2 * pairs_next / (size_next * (size_next - 1))
+
+
+def _phi_divide(phi, phi_next) -> np.ndarray:
+    # -log(phi_m+1 / phi_m) with the conventions of neurokit for zero matches
+    phi, phi_next = np.asarray(phi, dtype=float), np.asarray(phi_next, dtype=float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        division = phi_next / phi
+        result = -np.log(np.where(division > 0, division, np.nan))
+    result[division < 0] = np.nan
+    result[np.isclose(division, 0)] = np.inf
+    result[np.isclose(phi, 0)] = -np.inf
+    return result
+
+
+def _series_mean(values, series, n_series) -> np.ndarray:
+    size = np.bincount(series, minlength=n_series)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.bincount(series, weights=values, minlength=n_series) / size
+
+
+def _valid_group_mean(values, groups, n_groups) -> np.ndarray:
+    # mean of the finite values of every group, NaN for groups without finite values
+    finite = np.isfinite(values)
+    return _series_mean(values[finite], groups[finite], n_groups)
+
+
+def _scales(signal, scale, dimension) -> np.ndarray:
+    if scale == "default":
+        return np.arange(1, int(len(signal) / (dimension + 10)))
+    if isinstance(scale, int):
+        return np.arange(1, scale + 1)
+    return np.asarray(scale)
+
+
+def _coarse_grain(signal, scale, method) -> list:
+    # coarse-grained series of one scale: the means of non-overlapping windows (MSEn) or the scale time shifted
+    # series signal[shift::scale] (CMSEn, RCMSEn) like nk.complexity_coarsegraining
+    if scale in [0, 1]:
+        return [signal]
+    n = len(signal) // scale
+    windows = np.reshape(signal[:n * scale], (n, scale))
+    if method == "MSEn":
+        return [np.nanmean(windows, axis=1)] if n > 0 else [np.empty(0)]
+    return list(windows.T)
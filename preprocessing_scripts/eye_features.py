@@ -2,22 +2,29 @@ import warnings
 import numpy as np
 import pandas as pd
 import pywt
-from sklearn.cluster import KMeans
-from sklearn.metrics import silhouette_score
 from scipy.signal import savgol_filter
 from typing import Tuple
 
+import constants
+from preprocessing_scripts.time_windows import WindowIndex
+from preprocessing_scripts.saccade_detection import SaccadeDetector
+from preprocessing_scripts.cluster_estimation import estimate_clusters
+from utils.feature_block import FeatureBlock
+
+DIAMETER_COLUMNS = ["diameter0_2d", "diameter1_2d", "diameter0_3d", "diameter1_3d"]
+
 
 def distance(x1, y1, x2, y2):
     return np.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
 
 
-def calc_pupillometry_features(bsl_data, exp_data, slicing) -> tuple[list, list, list]:
+def calc_pupillometry_features(bsl_data, exp_data, slicing, cluster_method="exact") -> tuple[list, list, list]:
     '''
     features: norm_pos_x, norm_pos_y, diameter0_2d, diameter1_2d, diameter0_3d, diameter1_3d
     :param bsl_data: Baseline dataframe with columns: norm_pos_x, norm_pos_y, diameter0_2d, diameter1_2d, diameter0_3d, diameter1_3d
     :param exp_data: Experiment dataframe with columns: norm_pos_x, norm_pos_y, diameter0_2d, diameter1_2d, diameter0_3d, diameter1_3d
     :param slicing: True if the data are sliced to 1 min pieces
+    :param cluster_method: cluster estimation method, see cluster_estimation.estimate_clusters
     :return: bsl_features, exp_features, sub_features
     '''
     # bsl
@@ -34,12 +41,7 @@ def calc_pupillometry_features(bsl_data, exp_data, slicing) -> tuple[list, list,
     X = bsl_data[['norm_pos_x', 'norm_pos_y']].values
 
     # Silhouette Method -> starts at 2
-    silhouette_scores = []
-    for i in range(2, 11):
-        kmeans = KMeans(n_clusters=i, random_state=42)
-        cluster_labels = kmeans.fit_predict(X)
-        silhouette_avg = silhouette_score(X, cluster_labels)
-        silhouette_scores.append(silhouette_avg)
+    _, best_silhouette_score = estimate_clusters(X, method=cluster_method)
 
     # plt.figure(figsize=(8, 6))
     # plt.plot(range(2, 11), silhouette_scores, marker='o', linestyle='--')
@@ -48,7 +50,7 @@ def calc_pupillometry_features(bsl_data, exp_data, slicing) -> tuple[list, list,
     # plt.title('Silhouette Method')
     # plt.show()
 
-    bsl_number_clusters = np.max(silhouette_scores) / 120  # max silhouette score is the best fitting of clusters
+    bsl_number_clusters = best_silhouette_score / 120  # max silhouette score is the best fitting of clusters
     # bsl_number_clusters = np.nan
 
     # TODO we need to interpolate the diameter values to do not have NaNs in the data
@@ -89,12 +91,7 @@ def calc_pupillometry_features(bsl_data, exp_data, slicing) -> tuple[list, list,
     X = exp_data[['norm_pos_x', 'norm_pos_y']].values
 
     # Silhouette Method -> starts at 2
-    silhouette_scores = []
-    for i in range(2, 11):
-        kmeans = KMeans(n_clusters=i, random_state=42)
-        cluster_labels = kmeans.fit_predict(X)
-        silhouette_avg = silhouette_score(X, cluster_labels)
-        silhouette_scores.append(silhouette_avg)
+    _, best_silhouette_score = estimate_clusters(X, method=cluster_method)
 
     # plt.figure(figsize=(8, 6))
     # plt.plot(range(2, 11), silhouette_scores, marker='o', linestyle='--')
@@ -104,10 +101,10 @@ def calc_pupillometry_features(bsl_data, exp_data, slicing) -> tuple[list, list,
     # plt.show()
 
     if slicing:
-        exp_number_clusters = np.max(silhouette_scores) / int(
+        exp_number_clusters = best_silhouette_score / int(
             60)  # max silhouette score is the best fitting of clusters
     else:
-        exp_number_clusters = np.max(silhouette_scores) / int(
+        exp_number_clusters = best_silhouette_score / int(
             exp_data["timestamp"].iloc[-1])  # max silhouette score is the best fitting of clusters
     # exp_number_clusters = np.nan
 
@@ -140,12 +137,13 @@ def calc_pupillometry_features(bsl_data, exp_data, slicing) -> tuple[list, list,
     return bsl_features, exp_features, [x - y for x, y in zip(exp_features, bsl_features)]
 
 
-def calc_fixations_features(bsl_data, exp_data, slicing) -> tuple[list, list, list]:
+def calc_fixations_features(bsl_data, exp_data, slicing, cluster_method="exact") -> tuple[list, list, list]:
     '''
     features: norm_pos_x, norm_pos_y, dispersion, duration
     :param bsl_data: Baseline dataframe with columns: norm_pos_x, norm_pos_y, dispersion, duration
     :param exp_data: Experiment dataframe with columns: norm_pos_x, norm_pos_y, dispersion, duration
     :param slicing: True if the data are sliced to 1 min pieces
+    :param cluster_method: cluster estimation method, see cluster_estimation.estimate_clusters
     :return: bsl_features, exp_features, sub_features
     '''
     # bsl
@@ -166,14 +164,9 @@ def calc_fixations_features(bsl_data, exp_data, slicing) -> tuple[list, list, li
 
     # Silhouette Method -> starts at 2
     try:
-        silhouette_scores = []
-        for i in range(2, 11):
-            kmeans = KMeans(n_clusters=i, random_state=42)
-            cluster_labels = kmeans.fit_predict(X)
-            silhouette_avg = silhouette_score(X, cluster_labels)
-            silhouette_scores.append(silhouette_avg)
-
-        bsl_number_clusters = np.max(silhouette_scores) / 120  # max silhouette score is the best fitting of clusters
+        _, best_silhouette_score = estimate_clusters(X, method=cluster_method)
+
+        bsl_number_clusters = best_silhouette_score / 120  # max silhouette score is the best fitting of clusters
     except ValueError:
         print("ValueError in cluster calculatation")
         bsl_number_clusters = np.nan
@@ -196,17 +189,12 @@ def calc_fixations_features(bsl_data, exp_data, slicing) -> tuple[list, list, li
 
     # Silhouette Method -> starts at 2
     try:
-        silhouette_scores = []
-        for i in range(2, 11):
-            kmeans = KMeans(n_clusters=i, random_state=42)
-            cluster_labels = kmeans.fit_predict(X)
-            silhouette_avg = silhouette_score(X, cluster_labels)
-            silhouette_scores.append(silhouette_avg)
+        _, best_silhouette_score = estimate_clusters(X, method=cluster_method)
 
         if slicing:
-            exp_number_clusters = np.max(silhouette_scores) / int(60)
+            exp_number_clusters = best_silhouette_score / int(60)
         else:
-            exp_number_clusters = np.max(silhouette_scores) / int(
+            exp_number_clusters = best_silhouette_score / int(
                 exp_data["timestamp"].iloc[-1])  # max silhouette score is the best fitting of clusters
     except ValueError:
         print("ValueError in cluster calculatation")
@@ -229,190 +217,116 @@ def calc_fixations_features(bsl_data, exp_data, slicing) -> tuple[list, list, li
 
 
 def calc_pupil_features_baseline(exp_data, time, robot, participant) -> pd.DataFrame:
-    feature_df = pd.DataFrame(columns=["time", "robot", "participant", "slice"] + ["pupil_diameter0_2d_mean",
-                                                                                   "pupil_diameter0_2d_max",
-                                                                                   "pupil_diameter0_2d_dev",
-                                                                                   "pupil_diameter0_2d_ipa",
-                                                                                   "pupil_diameter1_2d_mean",
-                                                                                   "pupil_diameter1_2d_max",
-                                                                                   "pupil_diameter1_2d_dev",
-                                                                                   "pupil_diameter1_2d_ipa",
-                                                                                   "pupil_diameter0_3d_mean",
-                                                                                   "pupil_diameter0_3d_max",
-                                                                                   "pupil_diameter0_3d_dev",
-                                                                                   "pupil_diameter0_3d_ipa",
-                                                                                   "pupil_diameter1_3d_mean",
-                                                                                   "pupil_diameter1_3d_max",
-                                                                                   "pupil_diameter1_3d_dev",
-                                                                                   "pupil_diameter1_3d_ipa"])
-
-    # diameter 2d parameters
-    bsl_dia_0_2d_max = exp_data["diameter0_2d"].dropna().max()
-    bsl_dia_1_2d_max = exp_data["diameter1_2d"].dropna().max()
-    bsl_dia_0_2d_mean = exp_data["diameter0_2d"].dropna().mean()
-    bsl_dia_1_2d_mean = exp_data["diameter1_2d"].dropna().mean()
-    bsl_dia_0_2d_dev = exp_data["diameter0_2d"].dropna().std()
-    bsl_dia_1_2d_dev = exp_data["diameter1_2d"].dropna().std()
-    # diameter 3d parameters
-    bsl_dia_0_3d_max = exp_data["diameter0_3d"].dropna().max()
-    bsl_dia_1_3d_max = exp_data["diameter1_3d"].dropna().max()
-    bsl_dia_0_3d_mean = exp_data["diameter0_3d"].dropna().mean()
-    bsl_dia_1_3d_mean = exp_data["diameter1_3d"].dropna().mean()
-    bsl_dia_0_3d_dev = exp_data["diameter0_3d"].dropna().std()
-    bsl_dia_1_3d_dev = exp_data["diameter1_3d"].dropna().std()
-    # ipa parameters
-    bsl_dia_0_2d_ipa = _ipa(exp_data[["timestamp", "diameter0_2d"]].dropna().to_numpy())
-    bsl_dia_1_2d_ipa = _ipa(exp_data[["timestamp", "diameter1_2d"]].dropna().to_numpy())
-    bsl_dia_0_3d_ipa = _ipa(exp_data[["timestamp", "diameter0_3d"]].dropna().to_numpy())
-    bsl_dia_1_3d_ipa = _ipa(exp_data[["timestamp", "diameter1_3d"]].dropna().to_numpy())
-
-    feature_df.loc[0] = [time, robot, participant, 0] + [bsl_dia_0_2d_mean, bsl_dia_0_2d_max, bsl_dia_0_2d_dev, bsl_dia_0_2d_ipa,
-                                                         bsl_dia_1_2d_mean, bsl_dia_1_2d_max, bsl_dia_1_2d_dev, bsl_dia_1_2d_ipa,
-                                                         bsl_dia_0_3d_mean, bsl_dia_0_3d_max, bsl_dia_0_3d_dev, bsl_dia_0_3d_ipa,
-                                                         bsl_dia_1_3d_mean, bsl_dia_1_3d_max, bsl_dia_1_3d_dev, bsl_dia_1_3d_ipa]
-    return feature_df
+    statistics = pupil_baseline_statistics(exp_data)
+    block = FeatureBlock("pupil", 1)
+    block["time"], block["robot"], block["participant"], block["slice"] = time, robot, participant, 0
+    for col in DIAMETER_COLUMNS:
+        for statistic, value in zip(["mean", "max", "dev", "ipa"], statistics[col]):
+            block[f"pupil_{col}_{statistic}"] = value
+    return block.to_frame()
 
 
 # TODO make Pupil data -> pupil diameter positively correlated with task difficulty
 def calc_pupil_features_tw(exp_data, time_window, time, robot, participant, base_line=None) -> pd.DataFrame:
-    # data frame
-    feature_df = pd.DataFrame(columns=["time", "robot", "participant", "slice"] + ["pupil_diameter0_2d_mean",
-                                                                                   "pupil_diameter0_2d_max",
-                                                                                   "pupil_diameter0_2d_dev",
-                                                                                   "pupil_diameter0_2d_ipa",
-                                                                                   "pupil_diameter1_2d_mean",
-                                                                                   "pupil_diameter1_2d_max",
-                                                                                   "pupil_diameter1_2d_dev",
-                                                                                   "pupil_diameter1_2d_ipa",
-                                                                                   "pupil_diameter0_3d_mean",
-                                                                                   "pupil_diameter0_3d_max",
-                                                                                   "pupil_diameter0_3d_dev",
-                                                                                   "pupil_diameter0_3d_ipa",
-                                                                                   "pupil_diameter1_3d_mean",
-                                                                                   "pupil_diameter1_3d_max",
-                                                                                   "pupil_diameter1_3d_dev",
-                                                                                   "pupil_diameter1_3d_ipa"])
-
-    if base_line is not None:
-        # diameter 2d parameters
-        bsl_dia_0_2d_max = base_line["diameter0_2d"].dropna().max()
-        bsl_dia_1_2d_max = base_line["diameter1_2d"].dropna().max()
-        bsl_dia_0_2d_mean = base_line["diameter0_2d"].dropna().mean()
-        bsl_dia_1_2d_mean = base_line["diameter1_2d"].dropna().mean()
-        bsl_dia_0_2d_dev = base_line["diameter0_2d"].dropna().std()
-        bsl_dia_1_2d_dev = base_line["diameter1_2d"].dropna().std()
-        # diameter 3d parameters
-        bsl_dia_0_3d_max = base_line["diameter0_3d"].dropna().max()
-        bsl_dia_1_3d_max = base_line["diameter1_3d"].dropna().max()
-        bsl_dia_0_3d_mean = base_line["diameter0_3d"].dropna().mean()
-        bsl_dia_1_3d_mean = base_line["diameter1_3d"].dropna().mean()
-        bsl_dia_0_3d_dev = base_line["diameter0_3d"].dropna().std()
-        bsl_dia_1_3d_dev = base_line["diameter1_3d"].dropna().std()
-        # ipa parameters
-        bsl_dia_0_2d_ipa = _ipa(base_line[["timestamp", "diameter0_2d"]].dropna().to_numpy())
-        bsl_dia_1_2d_ipa = _ipa(base_line[["timestamp", "diameter1_2d"]].dropna().to_numpy())
-        bsl_dia_0_3d_ipa = _ipa(base_line[["timestamp", "diameter0_3d"]].dropna().to_numpy())
-        bsl_dia_1_3d_ipa = _ipa(base_line[["timestamp", "diameter1_3d"]].dropna().to_numpy())
+    return calc_pupil_features_multi_tw(exp_data, [time_window], time, robot, participant, base_line)[time_window]
+
+
+def pupil_baseline_statistics(base_line) -> dict:
+    '''
+    Statistics of the baseline which are subtracted from the pupil features; they do not depend on the time window, i.e.,
+    they can be computed once per recording and stored (see utils/feature_store.py).
+    :param base_line: Baseline dataframe with columns: timestamp, diameter0_2d, diameter1_2d, diameter0_3d, diameter1_3d
+    :return: statistics: dict column -> (mean, max, dev, ipa)
+    '''
+    ipas = _ipa_batch([base_line[["timestamp", col]].dropna().to_numpy() for col in DIAMETER_COLUMNS])
+    return {col: (base_line[col].dropna().mean(), base_line[col].dropna().max(), base_line[col].dropna().std(), ipa)
+            for col, ipa in zip(DIAMETER_COLUMNS, ipas)}
+
+
+def calc_pupil_features_multi_tw(exp_data, time_windows, time, robot, participant, base_line=None,
+                                 base_line_statistics=None) -> dict:
+    '''
+    Calculates the pupil features for several time window sizes from one prefix-sum index over the data, i.e., the
+    data are loaded, cleaned and sorted only once for all time windows.
+    :param exp_data: Dataframe with columns: timestamp, diameter0_2d, diameter1_2d, diameter0_3d, diameter1_3d
+    :param time_windows: list of time windows in seconds
+    :param time: time should be in seconds!
+    :param robot: number of robots in the experiment
+    :param participant: number of participants in the experiment
+    :param base_line: Baseline dataframe (same columns as exp_data) which is subtracted, None for no subtraction
+    :param base_line_statistics: Precomputed pupil_baseline_statistics of the baseline, used instead of base_line
+    :return: features: dict time window -> Dataframe with columns: time, robot, participant, slice, pupil features
+    '''
+    if base_line_statistics is None and base_line is not None:
+        base_line_statistics = pupil_baseline_statistics(base_line)
+    if base_line_statistics is not None:
+        bsl = base_line_statistics
 
     # time window should be in seconds
     print(f"shape: {exp_data.shape[0]}")
     # if data are empty
     if exp_data.shape[0] == 0:
-        feature_df.loc[0] = [time, robot, participant, 0] + [np.nan] * 10
-        return
-    n_time_window = int(np.round(exp_data["timestamp"].iloc[-1] / time_window))
-    print(f"{n_time_window} = {exp_data['timestamp'].iloc[-1]} / {(time_window)}")
-    for i in range(n_time_window):
-        slice = i * time_window
-        # bsl_tw = bsl_data.loc[(df_pupillometry_baseline["timestamp"] >= slice) & (df_pupillometry_baseline["timestamp"] < slice + time_window)]
-        exp_tw = exp_data.loc[
-            (exp_data["timestamp"] >= slice) & (exp_data["timestamp"] < slice + time_window)]
-        print(
-            f"Time slice: {slice}, {slice + time_window}; {exp_tw.shape[0]} values within the confidence threshold")
-        if exp_tw.shape[0] < 10:
-            print(f"haaa {exp_tw.shape[0]}")
-            print("no values within the confidence threshold")
-            continue
+        return {time_window: None for time_window in time_windows}
+
+    # one index for all time windows -> every additional time window only costs O(n_windows) for the aggregates
+    index = WindowIndex(exp_data, DIAMETER_COLUMNS)
+
+    features = {}
+    for time_window in time_windows:
+        n_time_window = int(np.round(exp_data["timestamp"].iloc[-1] / time_window))
+        print(f"{n_time_window} = {exp_data['timestamp'].iloc[-1]} / {(time_window)}")
+        starts, ends = index.bounds(time_window, n_time_window)
+        maxs = {col: index.max(col, starts, ends) for col in DIAMETER_COLUMNS}
+        means = {col: index.mean(col, starts, ends) for col in DIAMETER_COLUMNS}
+        devs = {col: index.std(col, starts, ends) for col in DIAMETER_COLUMNS}
+        # collect the diameter signals of all windows x channels to calculate their IPA in one batch
+        windows = []
+        ipa_signals = []
+        for i in range(n_time_window):
+            slice = i * time_window
+            exp_tw = index.data.iloc[starts[i]:ends[i]]
+            print(
+                f"Time slice: {slice}, {slice + time_window}; {exp_tw.shape[0]} values within the confidence threshold")
+            if exp_tw.shape[0] < 10:
+                print(f"haaa {exp_tw.shape[0]}")
+                print("no values within the confidence threshold")
+                continue
+            windows.append(i)
+            ipa_signals += [exp_tw[["timestamp", col]].dropna().to_numpy() for col in DIAMETER_COLUMNS]
+        ipas = _ipa_batch(ipa_signals).reshape(len(windows), 4)
 
         # IPA (Index of pupillary activity): IPA0, mean pupil diameter, pupil0 deviation, max pupil0 diameter,
         #   IPA1, mean pupil1 diameter, pupil1 deviation, max pupil diameter1 diameter
         #   0 = left, 1 = right -> bei uns probably anders rum?! aber ist das wichtig?
-        dia_0_2d_max = exp_tw["diameter0_2d"].dropna().max()
-        dia_1_2d_max = exp_tw["diameter1_2d"].dropna().max()
-        dia_0_2d_mean = exp_tw["diameter0_2d"].dropna().mean()
-        dia_1_2d_mean = exp_tw["diameter1_2d"].dropna().mean()
-        dia_0_2d_dev = exp_tw["diameter0_2d"].dropna().std()
-        dia_1_2d_dev = exp_tw["diameter1_2d"].dropna().std()
-
-        dia_0_3d_max = exp_tw["diameter0_3d"].dropna().max()
-        dia_1_3d_max = exp_tw["diameter1_3d"].dropna().max()
-        dia_0_3d_mean = exp_tw["diameter0_3d"].dropna().mean()
-        dia_1_3d_mean = exp_tw["diameter1_3d"].dropna().mean()
-        dia_0_3d_dev = exp_tw["diameter0_3d"].dropna().std()
-        dia_1_3d_dev = exp_tw["diameter1_3d"].dropna().std()
-
-
-        dia_0_2d_ipa = _ipa(exp_tw[["timestamp", "diameter0_2d"]].dropna().to_numpy())
-        dia_1_2d_ipa = _ipa(exp_tw[["timestamp", "diameter1_2d"]].dropna().to_numpy())
-        dia_0_3d_ipa = _ipa(exp_tw[["timestamp", "diameter0_3d"]].dropna().to_numpy())
-        dia_1_3d_ipa = _ipa(exp_tw[["timestamp", "diameter1_3d"]].dropna().to_numpy())
-
-        if base_line is not None:
-            dia_0_2d_max = dia_0_2d_max - bsl_dia_0_2d_max
-            dia_1_2d_max = dia_1_2d_max - bsl_dia_1_2d_max
-            dia_0_2d_mean = dia_0_2d_mean - bsl_dia_0_2d_mean
-            dia_1_2d_mean = dia_1_2d_mean - bsl_dia_1_2d_mean
-            dia_0_2d_dev = dia_0_2d_dev - bsl_dia_0_2d_dev
-            dia_1_2d_dev = dia_1_2d_dev - bsl_dia_1_2d_dev
-
-            dia_0_3d_max = dia_0_3d_max - bsl_dia_0_3d_max
-            dia_1_3d_max = dia_1_3d_max - bsl_dia_1_3d_max
-            dia_0_3d_mean = dia_0_3d_mean - bsl_dia_0_3d_mean
-            dia_1_3d_mean = dia_1_3d_mean - bsl_dia_1_3d_mean
-            dia_0_3d_dev = dia_0_3d_dev - bsl_dia_0_3d_dev
-            dia_1_3d_dev = dia_1_3d_dev - bsl_dia_1_3d_dev
-
-            dia_0_2d_ipa = dia_0_2d_ipa - bsl_dia_0_2d_ipa
-            dia_1_2d_ipa = dia_1_2d_ipa - bsl_dia_1_2d_ipa
-            dia_0_3d_ipa = dia_0_3d_ipa - bsl_dia_0_3d_ipa
-            dia_1_3d_ipa = dia_1_3d_ipa - bsl_dia_1_3d_ipa
-
-        feature_df.loc[i] = [time, robot, participant, i] + [dia_0_2d_mean, dia_0_2d_max, dia_0_2d_dev, dia_0_2d_ipa,
-                                                             dia_1_2d_mean, dia_1_2d_max, dia_1_2d_dev, dia_1_2d_ipa,
-                                                             dia_0_3d_mean, dia_0_3d_max, dia_0_3d_dev, dia_0_3d_ipa,
-                                                             dia_1_3d_mean, dia_1_3d_max, dia_1_3d_dev, dia_1_3d_ipa]
-
-    return feature_df
-
-
-def calc_fixation_features_baseline(exp_data, time_window, time, robot, participant) -> pd.DataFrame:
-    feature_df = pd.DataFrame(
-        columns=["time", "robot", "participant", "slice"] + ["fixation_frequency", "fixation_duration_mean",
-                                                             "fixation_duration_max", "fixation_dispersion_mean",
-                                                             "fixation_dispersion_max", "saccade_frequency",
-                                                             "saccade_durations_mean", "saccade_durations_max",
-                                                             "saccade_speed_mean", "saccade_speed_max"])
-    # fixation frequency
-    bsl_fix_frequency = exp_data["fixation id"].nunique() / time_window
-    # mean fixation duration
-    bsl_fix_duration_mean = exp_data["duration"].mean()
-    # max fixation duration
-    bsl_fix_duration_max = exp_data["duration"].max()
-    # mean dispersion
-    bsl_fix_dispersion_mean = np.nanmean(exp_data["dispersion"])
-    # max dispersion
-    bsl_fix_dispersion_max = np.nanmax(exp_data["dispersion"])
-    # saccade features
-    bsl_saccade_frequency, bsl_saccade_durations_mean, bsl_saccade_durations_max, bsl_saccade_speed_mean, bsl_saccade_speed_max = _saccade_features(
-        exp_data, time_window)
-
-    feature_df.loc[0] = [time, robot, participant, 0] + [bsl_fix_frequency, bsl_fix_duration_mean,
-                                                         bsl_fix_duration_max, bsl_fix_dispersion_mean,
-                                                         bsl_fix_dispersion_max, bsl_saccade_frequency,
-                                                         bsl_saccade_durations_mean, bsl_saccade_durations_max,
-                                                         bsl_saccade_speed_mean, bsl_saccade_speed_max]
-
-    return feature_df
+        windows = np.asarray(windows, dtype=int)
+        block = FeatureBlock("pupil", len(windows), index=windows)
+        block["time"], block["robot"], block["participant"], block["slice"] = time, robot, participant, windows
+        for c, col in enumerate(DIAMETER_COLUMNS):
+            block[f"pupil_{col}_mean"] = means[col][windows]
+            block[f"pupil_{col}_max"] = maxs[col][windows]
+            block[f"pupil_{col}_dev"] = devs[col][windows]
+            block[f"pupil_{col}_ipa"] = ipas[:, c]
+            if base_line_statistics is not None:
+                for statistic, value in zip(["mean", "max", "dev", "ipa"], bsl[col]):
+                    block[f"pupil_{col}_{statistic}"] -= value
+        features[time_window] = block.to_frame()
+
+    return features
+
+
+def calc_fixation_features_baseline(exp_data, time_window, time, robot, participant, statistics=None) -> pd.DataFrame:
+    if statistics is None:
+        statistics = fixation_baseline_statistics(exp_data)
+    block = FeatureBlock("fixation", 1)
+    block["time"], block["robot"], block["participant"], block["slice"] = time, robot, participant, 0
+    # frequencies from the counts, all other features are the statistics themselves
+    block["fixation_frequency"] = statistics["fixation_count"] / time_window
+    block["saccade_frequency"] = statistics["saccade_count"] / time_window
+    for feature in constants.ALL_FIXATION_FEATURES:
+        if feature in statistics:
+            block[feature] = statistics[feature]
+    return block.to_frame()
+
 
 def calc_fixation_features_tw(exp_data, time_window, time, robot, participant, base_line=None) -> pd.DataFrame:
     '''
@@ -427,77 +341,116 @@ def calc_fixation_features_tw(exp_data, time_window, time, robot, participant, b
                                                                 saccade_frequency, saccade_durations_mean, saccade_durations_max,
                                                                 saccade_speed_mean, saccade_speed_max
     '''
-    # data frame
-    feature_df = pd.DataFrame(
-        columns=["time", "robot", "participant", "slice"] + ["fixation_frequency", "fixation_duration_mean",
-                                                             "fixation_duration_max", "fixation_dispersion_mean",
-                                                             "fixation_dispersion_max", "saccade_frequency",
-                                                             "saccade_durations_mean", "saccade_durations_max",
-                                                             "saccade_speed_mean", "saccade_speed_max"])
+    return calc_fixation_features_multi_tw(exp_data, [time_window], time, robot, participant, base_line)[time_window]
+
+
+def fixation_baseline_statistics(base_line) -> dict:
+    '''
+    Statistics of the baseline which are subtracted from the fixation features; they do not depend on the time window
+    (counts instead of frequencies), i.e., they can be computed once per recording and stored (see
+    utils/feature_store.py).
+    :param base_line: Baseline dataframe with columns: fixation id, duration, dispersion, timestamp, norm_pos_x, norm_pos_y
+    :return: statistics: dict with fixation_count, fixation_duration_mean, fixation_duration_max,
+                         fixation_dispersion_mean, fixation_dispersion_max, saccade_count, saccade_durations_mean,
+                         saccade_durations_max, saccade_speed_mean, saccade_speed_max
+    '''
+    # saccade features; a time window of 1 gives the saccade count instead of the frequency
+    saccade_count, saccade_durations_mean, saccade_durations_max, saccade_speed_mean, saccade_speed_max = \
+        _saccade_features(base_line, 1)
+    return {"fixation_count": base_line["fixation id"].nunique(),
+            "fixation_duration_mean": base_line["duration"].mean(),
+            "fixation_duration_max": base_line["duration"].max(),
+            "fixation_dispersion_mean": np.nanmean(base_line["dispersion"]),
+            "fixation_dispersion_max": np.nanmax(base_line["dispersion"]),
+            "saccade_count": saccade_count,
+            "saccade_durations_mean": saccade_durations_mean,
+            "saccade_durations_max": saccade_durations_max,
+            "saccade_speed_mean": saccade_speed_mean,
+            "saccade_speed_max": saccade_speed_max}
+
+
+def calc_fixation_features_multi_tw(exp_data, time_windows, time, robot, participant, base_line=None,
+                                    base_line_statistics=None) -> dict:
+    '''
+    Calculates the fixation features for several time window sizes from one prefix-sum index over the data, i.e., the
+    data are loaded, cleaned and sorted only once for all time windows.
+    :param exp_data: Dataframe with columns: fixation id, duration, dispersion, timestamp (from the expeirment)
+    :param time_windows: list of time windows in seconds
+    :param time: time should be in seconds!
+    :param robot: number of robots in the experiment
+    :param participant: number of participants in the experiment
+    :param base_line: Baseline dataframe (same columns as exp_data) which is subtracted, None for no subtraction
+    :param base_line_statistics: Precomputed fixation_baseline_statistics of the baseline, used instead of base_line
+    :return: features: dict time window -> Dataframe with the same columns as calc_fixation_features_tw
+    '''
     # do background subtraction
-    if base_line is not None:
-        # fixation frequency
-        bsl_fix_frequency = base_line["fixation id"].nunique() / time_window
-        # mean fixation duration
-        bsl_fix_duration_mean = base_line["duration"].mean()
-        # max fixation duration
-        bsl_fix_duration_max = base_line["duration"].max()
-        # mean dispersion
-        bsl_fix_dispersion_mean = np.nanmean(base_line["dispersion"])
-        # max dispersion
-        bsl_fix_dispersion_max = np.nanmax(base_line["dispersion"])
-        # saccade features
-        bsl_saccade_frequency, bsl_saccade_durations_mean, bsl_saccade_durations_max, bsl_saccade_speed_mean, bsl_saccade_speed_max = _saccade_features(
-            base_line, time_window)
+    if base_line_statistics is None and base_line is not None:
+        base_line_statistics = fixation_baseline_statistics(base_line)
+    if base_line_statistics is not None:
+        bsl = base_line_statistics
     # if data are empty
     if exp_data.shape[0] == 0:
-        feature_df.loc[0] = [time, robot, participant, 0] + [np.nan] * 10
-        return
-    n_time_window = int(np.round(exp_data["timestamp"].iloc[-1] / time_window))
-    print(f"{n_time_window} = {exp_data['timestamp'].iloc[-1]} / {(time_window)}")
-    for i in range(n_time_window):
-        slice = i * time_window
-        exp_tw = exp_data.loc[(exp_data["timestamp"] >= slice) & (exp_data["timestamp"] < slice + time_window)]
-        print(f"Time slice: {slice}, {slice + time_window}; {exp_tw.shape[0]} values within the confidence threshold")
-        if exp_tw.shape[0] < 10:
-            print(f"haaa {exp_tw.shape[0]}")
-            print("no values within the confidence threshold")
-            continue
-        # calculate eye-movement features
+        return {time_window: None for time_window in time_windows}
+
+    # one index for all time windows -> every additional time window only costs O(n_windows) for the aggregates
+    index = WindowIndex(exp_data, ["duration", "dispersion"])
+    # saccades are detected once on the whole (continuously filtered) gaze trace and assigned to the windows
+    saccade_detector = SaccadeDetector()
+    saccade_detector.update(index.data["timestamp"].to_numpy(), index.data["norm_pos_x"].to_numpy(),
+                            index.data["norm_pos_y"].to_numpy())
+    saccade_detector.finalize()
+
+    features = {}
+    for time_window in time_windows:
+        if base_line_statistics is not None:
+            bsl_fix_frequency = bsl["fixation_count"] / time_window
+            bsl_saccade_frequency = bsl["saccade_count"] / time_window
+
+        n_time_window = int(np.round(exp_data["timestamp"].iloc[-1] / time_window))
+        print(f"{n_time_window} = {exp_data['timestamp'].iloc[-1]} / {(time_window)}")
+        starts, ends = index.bounds(time_window, n_time_window)
+        fixation_counts = index.nunique("fixation id", starts, ends)
+        duration_means = index.mean("duration", starts, ends)
+        duration_maxs = index.max("duration", starts, ends)
+        dispersion_means = index.mean("dispersion", starts, ends)
+        dispersion_maxs = index.max("dispersion", starts, ends)
+        saccade_features = saccade_detector.window_features(time_window, n_time_window)
+        windows = []
+        for i in range(n_time_window):
+            slice = i * time_window
+            exp_tw = index.data.iloc[starts[i]:ends[i]]
+            print(f"Time slice: {slice}, {slice + time_window}; {exp_tw.shape[0]} values within the confidence threshold")
+            if exp_tw.shape[0] < 10:
+                print(f"haaa {exp_tw.shape[0]}")
+                print("no values within the confidence threshold")
+                continue
+            windows.append(i)
+
+        # calculate eye-movement features of all windows at once
+        windows = np.asarray(windows, dtype=int)
+        block = FeatureBlock("fixation", len(windows), index=windows)
+        block["time"], block["robot"], block["participant"], block["slice"] = time, robot, participant, windows
         # fixation frequency = total number of eye fixations on a target stimuli; i.e., fixation ids?
-        fixation_frequency = exp_tw["fixation id"].nunique() / time_window
-        # mean fixation duration
-        fixation_duration_mean = exp_tw["duration"].mean()
-        # max fixation duration
-        fixation_duration_max = exp_tw["duration"].max()
-
+        block["fixation_frequency"] = fixation_counts[windows] / time_window
+        block["fixation_duration_mean"] = duration_means[windows]
+        block["fixation_duration_max"] = duration_maxs[windows]
         # calculate dispersion
-        fixation_dispersion_mean = np.nanmean(exp_tw["dispersion"])
-        fixation_dispersion_max = np.nanmax(exp_tw["dispersion"])
-
+        block["fixation_dispersion_mean"] = dispersion_means[windows]
+        block["fixation_dispersion_max"] = dispersion_maxs[windows]
         # calcualte saccade features
-        saccade_frequency, saccade_durations_mean, saccade_durations_max, saccade_speed_mean, saccade_speed_max = _saccade_features(
-            exp_tw, time_window)
-
-        if base_line is not None:
-            fixation_frequency = fixation_frequency - bsl_fix_frequency
-            fixation_duration_mean = fixation_duration_mean - bsl_fix_duration_mean
-            fixation_duration_max = fixation_duration_max - bsl_fix_duration_max
-            fixation_dispersion_mean = fixation_dispersion_mean - bsl_fix_dispersion_mean
-            fixation_dispersion_max = fixation_dispersion_max - bsl_fix_dispersion_max
-            saccade_frequency = saccade_frequency - bsl_saccade_frequency
-            saccade_durations_mean = saccade_durations_mean - bsl_saccade_durations_mean
-            saccade_durations_max = saccade_durations_max - bsl_saccade_durations_max
-            saccade_speed_mean = saccade_speed_mean - bsl_saccade_speed_mean
-            saccade_speed_max = saccade_speed_max - bsl_saccade_speed_max
-
-        feature_df.loc[i] = [time, robot, participant, i] + [fixation_frequency, fixation_duration_mean,
-                                                             fixation_duration_max, fixation_dispersion_mean,
-                                                             fixation_dispersion_max, saccade_frequency,
-                                                             saccade_durations_mean, saccade_durations_max,
-                                                             saccade_speed_mean, saccade_speed_max]
-
-    return feature_df
+        for c, feature in enumerate(["saccade_frequency", "saccade_durations_mean", "saccade_durations_max",
+                                     "saccade_speed_mean", "saccade_speed_max"]):
+            block[feature] = saccade_features[windows, c]
+
+        if base_line_statistics is not None:
+            block["fixation_frequency"] -= bsl_fix_frequency
+            block["saccade_frequency"] -= bsl_saccade_frequency
+            for feature in constants.ALL_FIXATION_FEATURES:
+                if feature in bsl:
+                    block[feature] -= bsl[feature]
+        features[time_window] = block.to_frame()
+
+    return features
 
 
 def _saccade_features(tw_df, time_window) -> Tuple[float, float, float, float, float]:
@@ -526,11 +479,10 @@ def _saccade_features(tw_df, time_window) -> Tuple[float, float, float, float, f
                                 0] + 1
     saccade_end_indices = np.where((velocity[:-1] >= saccade_threshold) & (velocity[1:] < saccade_threshold))[0] + 1
 
-    # Calculate saccade durations
-    saccade_durations = []
-    for start, end in zip(saccade_start_indices, saccade_end_indices):
-        duration = tw_df["timestamp"].iloc[end] - tw_df["timestamp"].iloc[start]
-        saccade_durations.append(duration)
+    # Calculate saccade durations (starts and ends are paired in order like zip)
+    n_saccades = min(saccade_start_indices.shape[0], saccade_end_indices.shape[0])
+    timestamps = tw_df["timestamp"].to_numpy()
+    saccade_durations = timestamps[saccade_end_indices[:n_saccades]] - timestamps[saccade_start_indices[:n_saccades]]
 
     if len(saccade_durations) == 0:
         print("no saccades found")
@@ -550,55 +502,62 @@ def _saccade_features(tw_df, time_window) -> Tuple[float, float, float, float, f
     return saccade_frequency, saccade_durations_mean, saccade_durations_max, saccade_speed_mean, saccade_speed_max
 
 
+# the wavelet is constructed once and shared by all IPA calculations
+_IPA_WAVELET = pywt.Wavelet('sym16')
+
+
+def _modmax(d) -> np.ndarray:
+    '''
+    Modulus maxima of a signal (listing 2 of Duchowski et al. (2018)), vectorized along the last axis.
+    :param d: signal, e.g., wavelet coefficients; 2d arrays are treated as one signal per row
+    :return: |d| where |d| is a local maximum, i.e., larger or equal than both neighbours and strictly larger than
+             either of them, 0 otherwise. The first and last value are compared against themselves.
+    '''
+    m = np.fabs(d)
+    ll = np.concatenate((m[..., :1], m[..., :-1]), axis=-1)
+    rr = np.concatenate((m[..., 1:], m[..., -1:]), axis=-1)
+    is_max = (ll <= m) & (m >= rr) & ((ll < m) | (m > rr))
+    return np.where(is_max, m, 0.0)
+
+
 def _ipa(d):
     '''
     Taken from "The Index of Pupillary Activity" by A. T. Duchowski et al. (2018)
     :param d: pupil diameter signal
     :return:
     '''
+    return _ipa_batch([d])[0]
 
-    def modmax(d):
-        # compute signal
-        m = [0.0] * len(d)
-        for i in range(len(d)):
-            m[i] = np.fabs(d[i])
-        # if value is larger than both neighbours, and strictly
-        # larger than either, then it is a local maximum
-        t = [0.0] * len(d)
-        for i in range(len(d)):
-            ll = m[i - 1] if i >= 1 else m[i]
-            oo = m[i]
-            rr = m[i + 1] if i < len(d) - 2 else m[i]
-            if (ll <= oo and oo >= rr) and (ll < oo or oo > rr):
-                # compute magnitude
-                t[i] = np.sqrt(d[i] ** 2)
-            else:
-                t[i] = 0.0
-        return t
-
-    # obtain 2-level DWT of pupil diameter signal d
-    try:
-        (cA2, cD2, cD1) = pywt.wavedec(d[:, 1], 'sym16', 'per', level=2)
-    except ValueError:
-        return np.nan
-    # get signal duration (in seconds)
-    tt = float(d[-1, 0] - d[0, 0])
-    if tt == 0:
-        return np.nan
-    # normalize by 1 / 2j, j = 2
-    cA2[:] = [x / np.sqrt(4.0) for x in cA2]
-    cD1[:] = [x / np.sqrt(2.0) for x in cD1]
-    cD2[:] = [x / np.sqrt(4.0) for x in cD2]
-
-    # detect modulus maxima , see listing 2
-    cD2m = modmax(cD2)
-
-    lambda_univ = np.std(cD2m) * np.sqrt(2.0 * np.log2(len(cD2m)))
-    cD2t = pywt.threshold(cD2m, lambda_univ, mode="hard")
-    # compute IPA
-    ctr = 0
-    for ii in range(len(cD2t)):
-        if np.fabs(cD2t[ii]) > 0:
-            ctr += 1
-        IPA = float(ctr) / tt
-    return IPA
+
+def _ipa_batch(signals) -> np.ndarray:
+    '''
+    IPA of many pupil diameter signals at once (e.g., all windows x channels of a recording).
+    Signals of the same length are stacked into a 2d array and transformed together, which gives exactly the same
+    results as calling _ipa on every signal but replaces many small wavelet transforms by a few large ones.
+    :param signals: list of pupil diameter signals with columns timestamp, diameter
+    :return: IPA of every signal (NaN if it cannot be calculated)
+    '''
+    ipa = np.full(len(signals), np.nan)
+    lengths = np.array([d.shape[0] for d in signals])
+    for length in np.unique(lengths):
+        members = np.flatnonzero(lengths == length)
+        if length == 0:
+            continue
+        stacked = np.stack([signals[k] for k in members]).astype(float)
+        # obtain 2-level DWT of pupil diameter signals
+        (cA2, cD2, cD1) = pywt.wavedec(stacked[:, :, 1], _IPA_WAVELET, 'per', level=2, axis=-1)
+        # get signal duration (in seconds)
+        tt = stacked[:, -1, 0] - stacked[:, 0, 0]
+        # normalize by 1 / 2j, j = 2 (only the level 2 detail coefficients are used)
+        cD2 = cD2 / np.sqrt(4.0)
+
+        # detect modulus maxima , see listing 2
+        cD2m = _modmax(cD2)
+
+        lambda_univ = np.std(cD2m, axis=-1) * np.sqrt(2.0 * np.log2(cD2m.shape[-1]))
+        # hard threshold: coefficients below the universal threshold are set to 0
+        ctr = np.count_nonzero((cD2m >= lambda_univ[:, None]) & (cD2m > 0), axis=-1)
+        # compute IPA
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ipa[members] = np.where(tt == 0, np.nan, ctr / tt)
+    return ipa
@@ -0,0 +1,267 @@
+import numpy as np
+import scipy.stats
+import neurokit2 as nk
+
+from preprocessing_scripts import entropy
+
+# HRV features (neurokit names without the HRV_ prefix) by the group which computes them
+TIME_FEATURES = ["MeanNN", "SDNN", "SDANN1", "SDNNI1", "SDANN2", "SDNNI2", "SDANN5", "SDNNI5", "RMSSD", "SDSD", "CVNN",
+                 "CVSD", "MedianNN", "MadNN", "MCVNN", "IQRNN", "SDRMSSD", "Prc20NN", "Prc80NN", "pNN50", "pNN20",
+                 "MinNN", "MaxNN", "HTI", "TINN"]
+FREQUENCY_FEATURES = ["ULF", "VLF", "LF", "HF", "VHF", "TP", "LFHF", "LFn", "HFn", "LnHF"]
+POINCARE_FEATURES = ["SD1", "SD2", "SD1SD2", "S", "CSI", "CVI", "CSI_Modified"]
+FRAGMENTATION_FEATURES = ["PIP", "IALS", "PSS", "PAS"]
+ASYMMETRY_FEATURES = ["GI", "SI", "AI", "PI", "C1d", "C1a", "SD1d", "SD1a", "C2d", "C2a", "SD2d", "SD2a", "Cd", "Ca",
+                      "SDNNd", "SDNNa"]
+MFDFA_MEASURES = ["Width", "Peak", "Mean", "Max", "Delta", "Asymmetry", "Fluctuation", "Increment"]
+DFA_FEATURES = ["DFA_alpha1"] + ["MFDFA_alpha1_" + m for m in MFDFA_MEASURES] + \
+               ["DFA_alpha2"] + ["MFDFA_alpha2_" + m for m in MFDFA_MEASURES]
+COMPLEXITY_FEATURES = ["ApEn", "SampEn", "ShanEn", "FuzzyEn", "MSEn", "CMSEn", "RCMSEn", "CD", "HFD", "KFD", "LZC"]
+# seconds to minutes per feature for a recording of a few thousand beats, only computed if asked for explicitly
+EXPENSIVE_FEATURES = DFA_FEATURES + COMPLEXITY_FEATURES
+RATE_FEATURES = ["PPG_Rate_Mean", "ECG_Rate_Mean"]
+# neurokit: nk.entropy_*, native: preprocessing_scripts/entropy.py for ApEn, SampEn, FuzzyEn, MSEn, CMSEn and RCMSEn
+ENTROPY_BACKENDS = ["neurokit", "native"]
+
+
+def hrv_features(peaks, sampling_rate, features, expensive=False, n_samples=None, entropy_backend="neurokit") -> dict:
+    """ Calculates a subset of the interval-related neurokit HRV features from detected peaks.
+
+    Same definitions as nk.ppg_analyze / nk.ecg_analyze(method="interval-related"), but only the requested features are
+    computed. Time-domain, Poincaré, heart rate asymmetry and fragmentation features are vectorized numpy, the
+    frequency domain uses nk.hrv_frequency (one Welch PSD), the DFA / MFDFA, entropy and fractal features
+    (EXPENSIVE_FEATURES) call the neurokit complexity functions (or the kernels of preprocessing_scripts/entropy.py, see
+    entropy_backend) and are only computed if expensive is True.
+
+    :param peaks: Sample indices of the detected peaks (R peaks or systolic PPG peaks).
+    :param sampling_rate: Sampling rate of the signal the peaks were detected in, in Hz.
+    :param features: Feature names, e.g., constants.ALL_PPG_FEATURES_NEUROKIT_AVAILABLE or a subset of it.
+    :param expensive: True computes the requested EXPENSIVE_FEATURES, False leaves them NaN.
+    :param n_samples: Length of the signal, the rate (PPG_Rate_Mean, ECG_Rate_Mean) is averaged over it like neurokit;
+                      None averages the rate at the peaks.
+    :param entropy_backend: Implementation of the entropy features, see ENTROPY_BACKENDS (same values).
+
+    :return: dict feature -> value in the order of features.
+
+    :raises ValueError: If a feature or the entropy backend is unknown.
+    """
+    if entropy_backend not in ENTROPY_BACKENDS:
+        raise ValueError(f"unknown entropy backend {entropy_backend}, use one of {ENTROPY_BACKENDS}")
+    requested = {_strip_prefix(f): f for f in features}
+    unknown = [f for name, f in requested.items() if name not in _ALL_FEATURES]
+    if unknown:
+        raise ValueError(f"unknown HRV features {unknown}")
+
+    peaks = np.asarray(peaks, dtype=float)
+    rri = np.diff(peaks) / sampling_rate * 1000
+    values = {}
+    for group, compute in [(TIME_FEATURES, _time_features), (FREQUENCY_FEATURES, _frequency_features),
+                           (POINCARE_FEATURES, _poincare_features),
+                           (FRAGMENTATION_FEATURES, _fragmentation_features),
+                           (ASYMMETRY_FEATURES, _asymmetry_features)]:
+        if any(name in requested for name in group):
+            values.update(compute(rri, peaks=peaks, sampling_rate=sampling_rate))
+    if expensive:
+        if any(name in requested for name in DFA_FEATURES):
+            values.update(_dfa_features(rri))
+        values.update(_complexity_features(rri, [name for name in COMPLEXITY_FEATURES if name in requested],
+                                           entropy_backend))
+    for name in RATE_FEATURES:
+        if name in requested:
+            values[name] = np.mean(nk.signal_rate(peaks.astype(int), sampling_rate=sampling_rate,
+                                                  desired_length=n_samples))
+
+    return {f: values.get(name, np.nan) for name, f in requested.items()}
+
+
+def _strip_prefix(feature):
+    return feature[len("HRV_"):] if feature.startswith("HRV_") else feature
+
+
+def _time_features(rri, **kwargs) -> dict:
+    # nk.hrv_time
+    diff_rri = np.diff(rri)
+    out = {"MeanNN": np.nanmean(rri), "SDNN": np.nanstd(rri, ddof=1)}
+    rri_cumsum = np.nancumsum(rri / 1000)
+    rri_cumsum = (rri_cumsum - rri_cumsum[0]) * 1000 + rri[0]
+    for window in [1, 2, 5]:
+        out[f"SDANN{window}"], out[f"SDNNI{window}"] = _window_statistics(rri, rri_cumsum, window)
+    out["RMSSD"] = np.sqrt(np.nanmean(diff_rri ** 2))
+    out["SDSD"] = np.nanstd(diff_rri, ddof=1)
+    out["CVNN"] = out["SDNN"] / out["MeanNN"]
+    out["CVSD"] = out["RMSSD"] / out["MeanNN"]
+    out["MedianNN"] = np.nanmedian(rri)
+    out["MadNN"] = 1.4826 * np.nanmedian(np.abs(rri - out["MedianNN"]))
+    out["MCVNN"] = out["MadNN"] / out["MedianNN"]
+    out["IQRNN"] = scipy.stats.iqr(rri)
+    out["SDRMSSD"] = out["SDNN"] / out["RMSSD"]
+    out["Prc20NN"], out["Prc80NN"] = np.nanpercentile(rri, q=[20, 80])
+    out["pNN50"] = np.sum(np.abs(diff_rri) > 50) / (len(diff_rri) + 1) * 100
+    out["pNN20"] = np.sum(np.abs(diff_rri) > 20) / (len(diff_rri) + 1) * 100
+    out["MinNN"] = np.nanmin(rri)
+    out["MaxNN"] = np.nanmax(rri)
+    binsize = 1000 / 128
+    bar_y, bar_x = np.histogram(rri, bins=np.arange(0, np.max(rri) + binsize, binsize))
+    out["HTI"] = len(rri) / np.max(bar_y)
+    out["TINN"] = _tinn(rri, bar_x, bar_y, binsize)
+    return out
+
+
+def _window_statistics(rri, rri_cumsum, window):
+    # SDANN (std of the window means) and SDNNI (mean of the window stds) of windows of window minutes
+    window_size = window * 60 * 1000
+    n_windows = int(np.round(rri_cumsum[-1] / window_size))
+    if n_windows < 3:
+        return np.nan, np.nan
+    starts = np.arange(n_windows) * window_size
+    # first interval at or after the window start, last one before the window end (excluded like in neurokit)
+    start_idx = np.searchsorted(rri_cumsum, starts, side="left")
+    end_idx = np.searchsorted(rri_cumsum, starts + window_size, side="left") - 1
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = [np.nanmean(rri[lo:hi]) if hi > lo else np.nan for lo, hi in zip(start_idx, end_idx)]
+        stds = [np.nanstd(rri[lo:hi], ddof=1) if hi - lo > 1 else np.nan for lo, hi in zip(start_idx, end_idx)]
+    return np.nanstd(means, ddof=1), np.nanmean(stds)
+
+
+def _tinn(rri, bar_x, bar_y, binsize):
+    # triangular interpolation of the RR histogram. The search of neurokit evaluates the first left corner N with all
+    # right corners M (its M loop is not reset), and the squared error splits into a left and a right part -> the
+    # errors of all M at once
+    max_bin = np.argmax(bar_y)
+    x_max, y_max = bar_x[max_bin], bar_y[max_bin]
+    left = np.flatnonzero(bar_x - np.min(rri) > 0)
+    if len(left) == 0:
+        return np.nan
+    n = left[0]
+    # right corners X + binsize, X + 2 * binsize, ... below the maximal interval (bin edges of the histogram)
+    m = np.arange(max_bin + 1, len(bar_x))
+    m = m[bar_x[m] < np.max(rri)]
+    if n >= max_bin or len(m) == 0:
+        return 0.0
+    left_x, left_y = bar_x[n:max_bin], bar_y[n:max_bin]
+    error_left = np.sum((left_y - y_max * (left_x - bar_x[n]) / (x_max - bar_x[n])) ** 2)
+    k = np.arange(max_bin, len(bar_y))
+    q = y_max * (bar_x[m][:, None] - bar_x[k][None, :]) / (bar_x[m] - x_max)[:, None]
+    inside = k[None, :] <= m[:, None]
+    errors = error_left + np.sum(np.where(inside, (bar_y[k][None, :] - q) ** 2, 0), axis=1)
+    best = np.argmin(errors)
+    if errors[best] >= 2 ** 14:
+        return 0.0
+    return bar_x[m[best]] - bar_x[n]
+
+
+def _frequency_features(rri, peaks, sampling_rate, **kwargs) -> dict:
+    out = nk.hrv_frequency(peaks.astype(int), sampling_rate=sampling_rate)
+    return {_strip_prefix(k): out[k].iloc[0] for k in out.columns}
+
+
+def _poincare_features(rri, **kwargs) -> dict:
+    # nk.hrv_nonlinear, Poincaré plot
+    x1 = (rri[:-1] - rri[1:]) / np.sqrt(2)
+    x2 = (rri[:-1] + rri[1:]) / np.sqrt(2)
+    sd1, sd2 = np.std(x1, ddof=1), np.std(x2, ddof=1)
+    t, l = 4 * sd1, 4 * sd2
+    return {"SD1": sd1, "SD2": sd2, "SD1SD2": sd1 / sd2, "S": np.pi * sd1 * sd2, "CSI": l / t,
+            "CVI": np.log10(l * t), "CSI_Modified": l ** 2 / t}
+
+
+def _fragmentation_features(rri, **kwargs) -> dict:
+    # nk.hrv_nonlinear, heart rate fragmentation
+    diff_rri = np.diff(rri)
+    zerocrossings = np.flatnonzero(np.abs(np.diff(np.sign(diff_rri))) > 0)
+    lengths = np.concatenate((_run_lengths(np.flatnonzero(diff_rri > 0)), _run_lengths(np.flatnonzero(diff_rri < 0))))
+    alternations = _run_lengths(zerocrossings)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return {"PIP": len(zerocrossings) / (len(diff_rri) + 1), "IALS": 1 / np.mean(lengths),
+                "PSS": np.sum(lengths < 3) / len(lengths), "PAS": np.sum(alternations >= 4) / len(alternations)}
+
+
+def _run_lengths(indices) -> np.ndarray:
+    # lengths of the runs of consecutive indices
+    if len(indices) == 0:
+        return np.empty(0, dtype=int)
+    breaks = np.flatnonzero(np.diff(indices) != 1)
+    return np.diff(np.concatenate(([0], breaks + 1, [len(indices)])))
+
+
+def _asymmetry_features(rri, **kwargs) -> dict:
+    # nk.hrv_nonlinear, heart rate asymmetry of the Poincaré plot
+    x, y = rri[:-1], rri[1:]
+    n = len(x)
+    diff = y - x
+    decelerate, accelerate, no_change = diff > 0, diff < 0, diff == 0
+    dist_l2 = np.abs((x - np.mean(x)) + (y - np.mean(y))) / np.sqrt(2)
+    dist = np.abs(diff) / np.sqrt(2)
+    theta = np.abs(np.arctan(1) - np.arctan(y / x))
+    area = 0.5 * theta * (x ** 2 + y ** 2)
+    out = {"GI": np.sum(dist[decelerate]) / np.sum(dist) * 100,
+           "SI": np.sum(theta[decelerate]) / np.sum(theta) * 100,
+           "AI": np.sum(area[decelerate]) / np.sum(area) * 100,
+           "PI": np.sum(accelerate) / (n - np.sum(no_change)) * 100}
+    sd1d = np.sqrt(np.sum(dist[decelerate] ** 2) / (n - 1))
+    sd1a = np.sqrt(np.sum(dist[accelerate] ** 2) / (n - 1))
+    sd1 = np.sqrt(sd1d ** 2 + sd1a ** 2)
+    no_change_term = 0.5 * np.sum(dist_l2[no_change] ** 2) / (n - 1)
+    sd2d = np.sqrt(np.sum(dist_l2[decelerate] ** 2) / (n - 1) + no_change_term)
+    sd2a = np.sqrt(np.sum(dist_l2[accelerate] ** 2) / (n - 1) + no_change_term)
+    sd2 = np.sqrt(sd2d ** 2 + sd2a ** 2)
+    sdnnd = np.sqrt(0.5 * (sd1d ** 2 + sd2d ** 2))
+    sdnna = np.sqrt(0.5 * (sd1a ** 2 + sd2a ** 2))
+    sdnn = np.sqrt(sdnnd ** 2 + sdnna ** 2)
+    out.update({"C1d": (sd1d / sd1) ** 2, "C1a": (sd1a / sd1) ** 2, "SD1d": sd1d, "SD1a": sd1a,
+                "C2d": (sd2d / sd2) ** 2, "C2a": (sd2a / sd2) ** 2, "SD2d": sd2d, "SD2a": sd2a,
+                "Cd": (sdnnd / sdnn) ** 2, "Ca": (sdnna / sdnn) ** 2, "SDNNd": sdnnd, "SDNNa": sdnna})
+    return out
+
+
+def _dfa_features(rri) -> dict:
+    # nk.hrv_nonlinear, (multifractal) detrended fluctuation analysis of short (4 - 11 beats) and long term windows
+    out = {}
+    if len(rri) < 12:
+        return out
+    short_window = np.linspace(4, 11, 8).astype(int)
+    out["DFA_alpha1"], _ = nk.fractal_dfa(rri, multifractal=False, scale=short_window)
+    mfdfa, _ = nk.fractal_dfa(rri, multifractal=True, q=np.arange(-5, 6), scale=short_window)
+    out.update({"MFDFA_alpha1_" + k: mfdfa[k].values[0] for k in mfdfa.columns})
+    max_beats = (len(rri) + 1) / 10
+    if max_beats < 13:
+        return out
+    long_window = np.linspace(12, int(max_beats), int(max_beats - 12 + 1)).astype(int)
+    out["DFA_alpha2"], _ = nk.fractal_dfa(rri, multifractal=False, scale=long_window)
+    mfdfa, _ = nk.fractal_dfa(rri, multifractal=True, q=np.arange(-5, 6), scale=long_window)
+    out.update({"MFDFA_alpha2_" + k: mfdfa[k].values[0] for k in mfdfa.columns})
+    return out
+
+
+def _complexity_features(rri, names, entropy_backend) -> dict:
+    # nk.hrv_nonlinear, entropy and fractal dimension of the RR intervals
+    tolerance = 0.2 * np.std(rri, ddof=1)
+    if entropy_backend == "native":
+        native = {
+            "ApEn": lambda: entropy.approximate_entropy(rri, tolerance, dimension=2, delay=1),
+            "SampEn": lambda: entropy.sample_entropy(rri, tolerance, dimension=2, delay=1),
+            "FuzzyEn": lambda: entropy.fuzzy_entropy(rri, tolerance, dimension=2, delay=1),
+            "MSEn": lambda: entropy.multiscale_entropy(rri, tolerance, dimension=2, method="MSEn"),
+            "CMSEn": lambda: entropy.multiscale_entropy(rri, tolerance, dimension=2, method="CMSEn"),
+            "RCMSEn": lambda: entropy.multiscale_entropy(rri, tolerance, dimension=2, method="RCMSEn"),
+        }
+        out = {name: native[name]() for name in names if name in native}
+        return {**out, **_complexity_features(rri, [name for name in names if name not in native], "neurokit")}
+    functions = {
+        "ApEn": lambda: nk.entropy_approximate(rri, delay=1, dimension=2, tolerance=tolerance),
+        "SampEn": lambda: nk.entropy_sample(rri, delay=1, dimension=2, tolerance=tolerance),
+        "ShanEn": lambda: nk.entropy_shannon(rri),
+        "FuzzyEn": lambda: nk.entropy_fuzzy(rri, delay=1, dimension=2, tolerance=tolerance),
+        "MSEn": lambda: nk.entropy_multiscale(rri, dimension=2, tolerance=tolerance, method="MSEn"),
+        "CMSEn": lambda: nk.entropy_multiscale(rri, dimension=2, tolerance=tolerance, method="CMSEn"),
+        "RCMSEn": lambda: nk.entropy_multiscale(rri, dimension=2, tolerance=tolerance, method="RCMSEn"),
+        "CD": lambda: nk.fractal_correlation(rri, delay=1, dimension=2),
+        "HFD": lambda: nk.fractal_higuchi(rri, k_max=10),
+        "KFD": lambda: nk.fractal_katz(rri),
+        "LZC": lambda: nk.complexity_lempelziv(rri),
+    }
+    return {name: functions[name]()[0] for name in names}
+
+
+_ALL_FEATURES = set(TIME_FEATURES + FREQUENCY_FEATURES + POINCARE_FEATURES + FRAGMENTATION_FEATURES +
+                    ASYMMETRY_FEATURES + EXPENSIVE_FEATURES + RATE_FEATURES)
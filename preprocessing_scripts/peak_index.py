@@ -0,0 +1,169 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import neurokit2 as nk
+
+import constants
+from preprocessing_scripts.eda_features import resample_eda, _refined_scr_amplitudes
+from preprocessing_scripts.hrv import hrv_features
+from preprocessing_scripts.resampling import resample_signal
+
+
+class PeakIndex:
+    """ Peaks of a processed signal on the time axis of its recording.
+
+    Peak detection (filtering, resampling, peak finding, SCR decomposition) is the costly part of the PPG, ECG and EDA
+    features; the interval features only need the peaks within the interval. A PeakIndex is detected once on the
+    longest interval of a session which covers all intervals of interest (see utils.intervals.cover) and answers every
+    sub-interval, e.g., the start_takeoff baseline within start_posttest, by slicing:
+
+        index = feature_cache.call(detect_ppg_peaks, transform_ppg(d.frame(*cover(bounds, baseline_bounds))))
+        minuend = index.hrv_features(*bounds, features=ppg_nk_features)
+        subtrahend = index.hrv_features(*baseline_bounds, features=ppg_nk_features)
+
+    The samples are uniform: sample k is at start_time + k / sampling_rate. A PeakIndex is picklable, i.e., it can be
+    kept in the FeatureCache. Note that the features of a sub-interval can differ slightly from processing the
+    sub-interval on its own, since filtering (and the EDA decomposition) ran on the longer signal, without edge effects
+    at the sub-interval bounds.
+    """
+
+    def __init__(self, kind, peaks, sampling_rate, n_samples, start_time=0.0, signals=None, amplitudes=None):
+        """
+        :param kind: "ppg", "ecg" or "eda".
+        :param peaks: Sample indices of the peaks (PPG peaks, R peaks or SCR peaks), ascending.
+        :param sampling_rate: Sampling rate of the processed signal in Hz.
+        :param n_samples: Number of samples of the processed signal.
+        :param start_time: Timestamp of the first sample in seconds.
+        :param signals: Processed signals which the interval features need, e.g., {"EDA_Clean": ..., "EDA_Tonic": ...}.
+        :param amplitudes: Amplitude of every peak (SCR amplitudes), NaN if there is none.
+        """
+        self.kind = kind
+        self.peaks = np.asarray(peaks, dtype=np.int64)
+        self.sampling_rate = sampling_rate
+        self.n_samples = n_samples
+        self.start_time = start_time
+        self.signals = {} if signals is None else signals
+        self.amplitudes = amplitudes
+
+    @property
+    def end_time(self) -> float:
+        """:return: timestamp of the last sample in seconds."""
+        return self.start_time + (self.n_samples - 1) / self.sampling_rate
+
+    def rows(self, start, end) -> slice:
+        """:return: slice of the samples with start <= time <= end (clipped to the processed signal)."""
+        lo = int(np.ceil((start - self.start_time) * self.sampling_rate - 1e-9))
+        hi = int(np.floor((end - self.start_time) * self.sampling_rate + 1e-9)) + 1
+        lo, hi = max(lo, 0), min(hi, self.n_samples)
+        return slice(lo, max(lo, hi))
+
+    def peaks_between(self, start, end) -> np.ndarray:
+        """:return: sample indices of the peaks within start <= time <= end, relative to the first sample there."""
+        rows = self.rows(start, end)
+        lo, hi = np.searchsorted(self.peaks, [rows.start, rows.stop], side="left")
+        return self.peaks[lo:hi] - rows.start
+
+    def rr_intervals(self, start, end) -> np.ndarray:
+        """:return: intervals between successive peaks within start <= time <= end in ms."""
+        return np.diff(self.peaks_between(start, end)) / self.sampling_rate * 1000
+
+    def hrv_features(self, start, end, features, expensive=False, entropy_backend="neurokit") -> pd.DataFrame:
+        """ HRV features of the peaks within start <= time <= end, see preprocessing_scripts/hrv.py.
+
+        :param features: Names of the features, e.g., constants.ALL_PPG_FEATURES_NEUROKIT_AVAILABLE.
+        :param expensive: True also calculates the requested DFA, entropy and fractal features.
+        :param entropy_backend: neurokit or native, see preprocessing_scripts/hrv.py.
+
+        :return: data frame with one row of features, like calculate_ppg_features_nk(..., features=features).
+
+        :raises ValueError: If the index holds no heart beats.
+        """
+        if self.kind not in ("ppg", "ecg"):
+            raise ValueError(f"no HRV features of a {self.kind} peak index")
+        rows = self.rows(start, end)
+        return pd.DataFrame([hrv_features(self.peaks_between(start, end), self.sampling_rate, features,
+                                          expensive=expensive, entropy_backend=entropy_backend,
+                                          n_samples=rows.stop - rows.start)])
+
+    def eda_features(self, start, end) -> pd.DataFrame:
+        """ EDA features of start <= time <= end, like calculate_eda_features on the data of the interval.
+
+        :return: data frame with one row of constants.ALL_EDA_FEATURES.
+
+        :raises ValueError: If the index holds no SCR peaks.
+        """
+        if self.kind != "eda":
+            raise ValueError(f"no EDA features of a {self.kind} peak index")
+        rows = self.rows(start, end)
+        if rows.stop - rows.start < 2:
+            warnings.warn("No EDA data -- returning nan")
+            return pd.DataFrame(np.nan, columns=constants.ALL_EDA_FEATURES, index=[0])
+
+        lo, hi = np.searchsorted(self.peaks, [rows.start, rows.stop], side="left")
+        scr_peaks = np.zeros(rows.stop - rows.start)
+        scr_amplitude = np.zeros(rows.stop - rows.start)
+        scr_peaks[self.peaks[lo:hi] - rows.start] = 1
+        scr_amplitude[self.peaks[lo:hi] - rows.start] = self.amplitudes[lo:hi]
+        processed = pd.DataFrame({"EDA_Clean": self.signals["EDA_Clean"][rows],
+                                  "EDA_Tonic": self.signals["EDA_Tonic"][rows],
+                                  "SCR_Peaks": scr_peaks, "SCR_Amplitude": scr_amplitude})
+        # the autocorrelation lag is used as an index (lag * sampling_rate), i.e., NeuroKit needs an integer rate here
+        return nk.eda_analyze(processed, sampling_rate=int(round(self.sampling_rate)), method="interval-related")
+
+
+def detect_ppg_peaks(ppg_data: pd.DataFrame, target_f=100, resample_method="fft") -> PeakIndex:
+    """ PPG peaks of calculate_ppg_features_nk(..., features=...) as a PeakIndex.
+
+    :param ppg_data: Raw PPG data in a pandas data frame containing two columns: "LocalTimestamp" and "PG".
+    :param target_f: Target frequency in Hz on how much to upsample the signal, e.g., 100 Hz.
+    :param resample_method: Resampling method, see preprocessing_scripts.resampling.resample_signal.
+
+    :return: index of the peaks.
+    """
+    duration = ppg_data["LocalTimestamp"].iloc[-1] - ppg_data["LocalTimestamp"].iloc[0]
+    og_f = ppg_data["PG"].to_numpy().shape[0] / duration
+    signal_resampled = resample_signal(ppg_data["PG"].to_numpy(), og_f, target_f, method=resample_method)
+    f = signal_resampled.shape[0] / duration
+
+    _, info = nk.ppg_peaks(nk.ppg_clean(signal_resampled, sampling_rate=f), sampling_rate=f)
+    return PeakIndex("ppg", info["PPG_Peaks"], f, signal_resampled.shape[0],
+                     start_time=float(ppg_data["LocalTimestamp"].iloc[0]))
+
+
+def detect_ecg_peaks(ecg, sampling_rate, start_time=0.0) -> PeakIndex:
+    """ R peaks of calculate_ecg_features_nk(..., features=...) as a PeakIndex.
+
+    :param ecg: Raw ECG signal (1-d array).
+    :param sampling_rate: Sampling rate of the signal in Hz.
+    :param start_time: Timestamp of the first sample in seconds.
+
+    :return: index of the R peaks.
+    """
+    cleaned = nk.ecg_clean(ecg, sampling_rate=sampling_rate)
+    _, info = nk.ecg_peaks(cleaned, sampling_rate=sampling_rate, correct_artifacts=True)
+    return PeakIndex("ecg", info["ECG_R_Peaks"], sampling_rate, len(cleaned), start_time=start_time)
+
+
+def detect_eda_peaks(eda_data: pd.DataFrame, target_f=10000, mode="upsample", resample_method="fft") -> PeakIndex:
+    """ SCR peaks, amplitudes and the clean and tonic signals of calculate_eda_features as a PeakIndex.
+
+    :param eda_data: Raw EDA data in a pandas data frame containing two columns: "LocalTimestamp" and "EDA".
+    :param target_f: Target frequency of the upsample mode in Hz.
+    :param mode: "upsample" or "native", see calculate_eda_features.
+    :param resample_method: Resampling method of the upsample mode.
+
+    :return: index of the SCR peaks.
+    """
+    signal_resampled, f = resample_eda(eda_data, target_f=target_f, mode=mode, resample_method=resample_method)
+    processed, info = nk.eda_process(signal_resampled, sampling_rate=f, method="neurokit")
+
+    peaks = np.asarray(info["SCR_Peaks"], dtype=np.int64)
+    if mode == "native":
+        amplitudes = _refined_scr_amplitudes(processed["EDA_Phasic"].to_numpy(), info)
+    else:
+        amplitudes = processed["SCR_Amplitude"].to_numpy()[peaks]
+    return PeakIndex("eda", peaks, f, signal_resampled.shape[0], start_time=float(eda_data["LocalTimestamp"].iloc[0]),
+                     signals={"EDA_Clean": processed["EDA_Clean"].to_numpy(),
+                              "EDA_Tonic": processed["EDA_Tonic"].to_numpy()},
+                     amplitudes=amplitudes)
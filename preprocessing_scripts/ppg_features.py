@@ -3,10 +3,13 @@ import numpy as np
 import pandas as pd
 import heartpy as hp
 import neurokit2 as nk
-from scipy.signal import resample
 
+from preprocessing_scripts.filter_bank import filter_signal
+from preprocessing_scripts.hrv import hrv_features
+from preprocessing_scripts.resampling import resample_signal
 
-def calculate_ppg_features(ppg_data: pd.DataFrame, target_f=100, verbose=False):
+
+def calculate_ppg_features(ppg_data: pd.DataFrame, target_f=100, verbose=False, resample_method="fft"):
     """ Calculates ppg_nk features using the heartPy library.
 
     Filters the raw PPG data and calculates features from it.
@@ -15,6 +18,7 @@ def calculate_ppg_features(ppg_data: pd.DataFrame, target_f=100, verbose=False):
     :param target_f: Target frequency in Hz on how much to upsample the signal for better calculation stability, e.g.,
                         100 Hz.
     :param verbose: True gives debug prints.
+    :param resample_method: Resampling method, see preprocessing_scripts.resampling.resample_signal.
 
     :return wd: working directories, temporary save object.
     :return m: features of the PPG time series.
@@ -32,9 +36,10 @@ def calculate_ppg_features(ppg_data: pd.DataFrame, target_f=100, verbose=False):
         print(f"original frequency {og_f}")
 
     # how to choose the cutoff frequencies: below 0.7Hz (42 BPM) and above 3.5 Hz (210 BPM)
-    filtered = hp.filter_signal(ppg_data["PG"].to_numpy(), [0.7, 3.5], sample_rate=og_f, order=3, filtertype='bandpass')
+    # the filter is designed once per (rounded) sampling rate, see preprocessing_scripts/filter_bank.py
+    filtered = filter_signal(ppg_data["PG"].to_numpy(), [0.7, 3.5], sample_rate=og_f, order=3, filtertype='bandpass')
 
-    signal_resampled = resample(filtered, int(np.ceil(filtered.shape[0] * target_f / og_f)))
+    signal_resampled = resample_signal(filtered, og_f, target_f, method=resample_method)
 
     f = signal_resampled.shape[0] / (ppg_data["LocalTimestamp"].iloc[-1] - ppg_data["LocalTimestamp"].iloc[0])
     if verbose:
@@ -59,15 +64,27 @@ def calculate_ppg_features(ppg_data: pd.DataFrame, target_f=100, verbose=False):
     return wd, m
 
 
-def calculate_ppg_features_nk(ppg_data: pd.DataFrame, target_f=100, verbose=False):
+def calculate_ppg_measures(ppg_data: pd.DataFrame, target_f=100, resample_method="fft") -> dict:
+    """:return: only the HeartPy features (measures) of calculate_ppg_features, e.g., for the FeatureStore."""
+    return calculate_ppg_features(ppg_data, target_f=target_f, resample_method=resample_method)[1]
+
+
+def calculate_ppg_features_nk(ppg_data: pd.DataFrame, target_f=100, verbose=False, resample_method="fft",
+                              features=None, expensive=False, entropy_backend="neurokit"):
     """ Calculates ppg_nk features using the neurokit library.
 
-    Filters the raw PPG data and calculates features from it.
+    Filters the raw PPG data and calculates features from it. With a list of features, only these are calculated from
+    the detected peaks (see preprocessing_scripts/hrv.py) instead of the full nk.ppg_analyze.
 
     :param ppg_data: Raw PPG data in a pandas data frame containing two columns: "LocalTimestamp" and "PG".
     :param target_f: Target frequency in Hz on how much to upsample the signal for better calculation stability, e.g.,
                         100 Hz.
     :param verbose: True gives debug prints.
+    :param resample_method: Resampling method, see preprocessing_scripts.resampling.resample_signal.
+    :param features: Names of the features, e.g., a subset of constants.ALL_PPG_FEATURES_NEUROKIT_AVAILABLE, None for
+                     all features of nk.ppg_analyze.
+    :param expensive: True also calculates the requested DFA, entropy and fractal features (only with features).
+    :param entropy_backend: neurokit or native, see preprocessing_scripts/hrv.py (only with features).
 
     :return wd: working directories, temporary save object.
     :return m: features of the PPG time series.
@@ -84,8 +101,7 @@ def calculate_ppg_features_nk(ppg_data: pd.DataFrame, target_f=100, verbose=Fals
     if verbose:
         print(f"original frequency {og_f}")
 
-    signal_resampled = resample(ppg_data["PG"].to_numpy(),
-                                int(np.ceil((ppg_data["PG"].to_numpy()).shape[0] * target_f / og_f)))
+    signal_resampled = resample_signal(ppg_data["PG"].to_numpy(), og_f, target_f, method=resample_method)
     f = signal_resampled.shape[0] / (ppg_data["LocalTimestamp"].iloc[-1] - ppg_data["LocalTimestamp"].iloc[0])
 
     if verbose:
@@ -93,6 +109,12 @@ def calculate_ppg_features_nk(ppg_data: pd.DataFrame, target_f=100, verbose=Fals
         print(f"The new frequency is {f}")
         print(f"Length of the resampled signal {signal_resampled.shape}")
 
+    if features is not None:
+        # the peaks of nk.ppg_process, without its rate and quality signals
+        _, info = nk.ppg_peaks(nk.ppg_clean(signal_resampled, sampling_rate=f), sampling_rate=f)
+        return pd.DataFrame([hrv_features(info["PPG_Peaks"], f, features, expensive=expensive,
+                                          entropy_backend=entropy_backend, n_samples=signal_resampled.shape[0])])
+
     p_1_process, info = nk.ppg_process(signal_resampled, sampling_rate=f)  # , report=f"ppg_report_{int(target_f)}.html" -> somewhat broken
     p_1_features = nk.ppg_analyze(p_1_process, sampling_rate=f, method="interval-related")
 
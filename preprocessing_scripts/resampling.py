@@ -0,0 +1,84 @@
+from fractions import Fraction
+from functools import lru_cache
+
+import numpy as np
+from scipy.fft import next_fast_len
+from scipy.signal import firwin, resample, resample_poly
+
+RESAMPLING_METHODS = ["fft", "fft_fast", "poly"]
+
+
+def resample_signal(x, og_f, target_f, method="fft", max_denominator=100, return_rate=False):
+    """ Resamples a uniformly sampled signal from og_f to (approximately) target_f.
+
+    Methods:
+        fft: scipy.signal.resample to int(np.ceil(n * target_f / og_f)) samples (the original behaviour).
+        fft_fast: like fft, but the FFTs run over fast (5-smooth) lengths: the signal is padded (smoothly back to its
+            first sample) to a fast length whose resampled length is fast as well, which moves the rate at most 0.1 %
+            above target_f. The padding also removes most of the ringing of the periodic wrap-around at the end.
+        poly: scipy.signal.resample_poly with a rational approximation up / down of target_f / og_f (denominator at
+            most max_denominator); the anti-aliasing filter is designed once per (up, down) pair.
+
+    The output lengths of the methods differ by a few samples, i.e., compute the new sampling rate from the length of
+    the output (as the feature functions do: len(output) / duration).
+
+    :param x: Signal.
+    :param og_f: Sampling rate of the signal in Hz.
+    :param target_f: Target sampling rate in Hz.
+    :param method: Resampling method, see RESAMPLING_METHODS.
+    :param max_denominator: Largest up / down factor of the poly method.
+    :param return_rate: Also return the exact sampling rate of the output.
+
+    :return: Resampled signal (and its sampling rate in Hz if return_rate).
+
+    :raises ValueError: If the method is unknown.
+    """
+    x = np.asarray(x, dtype=float)
+    n_out = int(np.ceil(x.shape[0] * target_f / og_f))
+    if method == "fft":
+        resampled, rate = resample(x, n_out), og_f * n_out / x.shape[0]
+    elif method == "fft_fast":
+        resampled, rate = _resample_fft_fast(x, n_out)
+        rate *= og_f
+    elif method == "poly":
+        up, down = rational_factors(og_f, target_f, max_denominator)
+        resampled, rate = resample_poly(x, up, down, window=_poly_filter(up, down)), og_f * up / down
+    else:
+        raise ValueError(f"unknown resampling method {method}, use one of {RESAMPLING_METHODS}")
+    return (resampled, rate) if return_rate else resampled
+
+
+def rational_factors(og_f, target_f, max_denominator=100) -> tuple[int, int]:
+    """:return: up, down with up / down ~ target_f / og_f."""
+    ratio = Fraction(target_f / og_f).limit_denominator(max_denominator)
+    if ratio == 0:
+        ratio = Fraction(1, max_denominator)
+    return ratio.numerator, ratio.denominator
+
+
+@lru_cache(maxsize=64)
+def _poly_filter(up, down) -> np.ndarray:
+    # the default anti-aliasing filter of scipy.signal.resample_poly
+    max_rate = max(up, down) // np.gcd(up, down)
+    return firwin(2 * 10 * max_rate + 1, 1. / max_rate, window=("kaiser", 5.0))
+
+
+def _resample_fft_fast(x, n_out, max_rate_error=1e-3) -> tuple[np.ndarray, float]:
+    # returns the resampled signal and the ratio of the output to the input rate
+    n = x.shape[0]
+    if n < 2 or n_out < 1:
+        return resample(x, n_out), n_out / n
+    # fast input length m >= n and fast output length m_out whose rate m_out / m is at most max_rate_error above
+    # n_out / n (the callers compute the sampling rate from the output length)
+    m = next_fast_len(n, real=True)
+    while True:
+        m_out = next_fast_len(int(np.ceil(m * n_out / n)), real=True)
+        if m_out * n <= (1 + max_rate_error) * m * n_out:
+            break
+        if m > 2 * n:
+            return resample(x, n_out), n_out / n
+        m = next_fast_len(m + 1, real=True)
+    # pad with a raised cosine from the last back to the first sample, i.e., without a jump at the wrap-around
+    ramp = 0.5 - 0.5 * np.cos(np.pi * np.arange(1, m - n + 1) / (m - n + 1))
+    padded = np.concatenate((x, x[-1] + (x[0] - x[-1]) * ramp))
+    return resample(padded, m_out)[:int(round(n * m_out / m))], m_out / m
@@ -0,0 +1,179 @@
+import warnings
+import numpy as np
+from scipy.signal import savgol_filter
+
+from preprocessing_scripts.time_windows import window_index
+
+
+class SaccadeDetector:
+    """ Streaming velocity-threshold saccade detector.
+
+    The gaze trace is filtered once as a whole (also if it is fed in chunks) with the same Savitzky-Golay filter as
+    _saccade_features, so there are no filter edge effects at window boundaries. Saccade onsets and offsets are
+    detected on the continuous velocity signal and assigned to time windows afterwards (see window_features).
+    The raw gaze samples are not kept, only the velocity samples above the threshold and the saccades, i.e., the memory
+    grows with the number of fast samples (not with the length of the recording as such). They are kept per sample
+    because the time windows are only known in window_features, which is called once per window size.
+    """
+
+    def __init__(self, saccade_threshold=0.3, window_length=5, polyorder=3):
+        """
+        :param saccade_threshold: velocity threshold (normalized position / s) above which a sample is a saccade.
+        :param window_length: window length of the Savitzky-Golay filter.
+        :param polyorder: polynomial order of the Savitzky-Golay filter.
+        """
+        self.saccade_threshold = saccade_threshold
+        self.window_length = window_length
+        self.polyorder = polyorder
+
+        # raw samples which are not processed yet (plus the context needed by the filter)
+        self._buffer = np.empty((0, 3))
+        self._started = False
+        # last filtered sample (timestamp, x, y) and last velocity
+        self._last = None
+        self._last_velocity = None
+        self._open_saccade = None
+
+        self._fast_timestamps = []
+        self._fast_velocities = []
+        self._saccade_starts = []
+        self._saccade_ends = []
+
+    def update(self, timestamps, x, y) -> None:
+        """ Adds the next chunk of gaze samples (in temporal order).
+
+        :param timestamps: timestamps in seconds.
+        :param x: normalized x position.
+        :param y: normalized y position.
+        """
+        chunk = np.column_stack((np.asarray(timestamps, dtype=float), np.asarray(x, dtype=float),
+                                 np.asarray(y, dtype=float)))
+        self._buffer = np.concatenate((self._buffer, chunk))
+        if self._buffer.shape[0] < self.window_length:
+            return
+        half = self.window_length // 2
+        filtered = self._filter(self._buffer)
+        # the last half window is filtered again once its right neighbours are known
+        self._process(filtered[self._first_new_sample():self._buffer.shape[0] - half])
+        # keep one full filter window as context, of which only the last half window is not processed yet
+        self._buffer = self._buffer[-self.window_length:]
+        self._started = True
+
+    def finalize(self) -> None:
+        """Processes the remaining samples at the end of the recording."""
+        if self._buffer.shape[0] < self.window_length:
+            if not self._started and self._buffer.shape[0] > 0:
+                warnings.warn("Not enough gaze samples to detect saccades")
+            self._buffer = self._buffer[:0]
+            return
+        filtered = self._filter(self._buffer)
+        self._process(filtered[self._first_new_sample():])
+        self._buffer = self._buffer[:0]
+        self._started = False
+
+    def _first_new_sample(self) -> int:
+        # all but the last half window of the kept context have been processed already
+        return self.window_length - self.window_length // 2 if self._started else 0
+
+    def _filter(self, samples) -> np.ndarray:
+        x = savgol_filter(samples[:, 1], self.window_length, self.polyorder)
+        y = savgol_filter(samples[:, 2], self.window_length, self.polyorder)
+        return np.column_stack((samples[:, 0], x, y))
+
+    def _process(self, filtered) -> None:
+        if filtered.shape[0] == 0:
+            return
+        if self._last is not None:
+            filtered = np.concatenate((self._last[None, :], filtered))
+        self._last = filtered[-1]
+        if filtered.shape[0] < 2:
+            return
+
+        timestamps = filtered[:, 0]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            velocity_x = np.diff(filtered[:, 1]) / np.diff(timestamps)
+            velocity_y = np.diff(filtered[:, 2]) / np.diff(timestamps)
+        velocity = np.sqrt(velocity_x ** 2 + velocity_y ** 2)
+        # velocity k belongs to the sample k (it is the velocity between the samples k and k + 1)
+        velocity_timestamps = timestamps[:-1]
+
+        fast = velocity > self.saccade_threshold
+        self._fast_timestamps.append(velocity_timestamps[fast])
+        self._fast_velocities.append(velocity[fast])
+
+        # onsets and offsets, including the transition from the last velocity of the previous chunk
+        previous = np.concatenate(([self._last_velocity], velocity[:-1])) if self._last_velocity is not None \
+            else np.concatenate(([np.nan], velocity[:-1]))
+        onsets = np.flatnonzero((previous < self.saccade_threshold) & (velocity >= self.saccade_threshold))
+        offsets = np.flatnonzero((previous >= self.saccade_threshold) & (velocity < self.saccade_threshold))
+        self._last_velocity = velocity[-1]
+
+        events = np.concatenate((onsets, offsets))
+        is_onset = np.concatenate((np.ones(onsets.shape[0], dtype=bool), np.zeros(offsets.shape[0], dtype=bool)))
+        for k in np.argsort(events, kind="stable"):
+            if is_onset[k]:
+                self._open_saccade = velocity_timestamps[events[k]]
+            elif self._open_saccade is not None:
+                self._saccade_starts.append(self._open_saccade)
+                self._saccade_ends.append(velocity_timestamps[events[k]])
+                self._open_saccade = None
+
+    def saccades(self):
+        """:return: start and end timestamps of all completed saccades."""
+        return np.array(self._saccade_starts, dtype=float), np.array(self._saccade_ends, dtype=float)
+
+    def window_features(self, time_window, n_time_window) -> np.ndarray:
+        """ Saccade features per time window [i * time_window, i * time_window + time_window).
+
+        Velocity samples are assigned to the window of their first sample and saccades to the window of their onset.
+
+        :param time_window: time window in seconds.
+        :param n_time_window: number of time windows.
+
+        :return: array n_time_window x (saccade_frequency, saccade_durations_mean, saccade_durations_max,
+                 saccade_speed_mean, saccade_speed_max); NaN if there is no saccade in a window.
+        """
+        fast_timestamps = np.concatenate(self._fast_timestamps) if self._fast_timestamps else np.empty(0)
+        fast_velocities = np.concatenate(self._fast_velocities) if self._fast_velocities else np.empty(0)
+        starts, ends = self.saccades()
+
+        features = np.full((n_time_window, 5), np.nan)
+        # saccade frequency and speed
+        window = window_index(fast_timestamps, time_window, n_time_window)
+        inside = window >= 0
+        count = np.bincount(window[inside], minlength=n_time_window)
+        features[:, 0] = count / time_window
+        with np.errstate(divide="ignore", invalid="ignore"):
+            features[:, 3] = np.bincount(window[inside], weights=fast_velocities[inside], minlength=n_time_window) / count
+        speed_max = np.full(n_time_window, -np.inf)
+        np.maximum.at(speed_max, window[inside], fast_velocities[inside])
+        features[count > 0, 4] = speed_max[count > 0]
+        features[count == 0, 3] = np.nan
+
+        # saccade durations
+        window = window_index(starts, time_window, n_time_window)
+        inside = window >= 0
+        durations = ends[inside] - starts[inside]
+        n_saccades = np.bincount(window[inside], minlength=n_time_window)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            features[:, 1] = np.bincount(window[inside], weights=durations, minlength=n_time_window) / n_saccades
+        duration_max = np.full(n_time_window, -np.inf)
+        np.maximum.at(duration_max, window[inside], durations)
+        features[n_saccades > 0, 2] = duration_max[n_saccades > 0]
+        features[n_saccades == 0, 1] = np.nan
+        return features
+
+
+def detect_saccades_chunked(chunks, saccade_threshold=0.3) -> SaccadeDetector:
+    """ Runs the saccade detection over a recording which is read in chunks, e.g., pd.read_csv(..., chunksize=10000).
+
+    :param chunks: iterable of data frames with columns: timestamp, norm_pos_x, norm_pos_y (in temporal order).
+    :param saccade_threshold: velocity threshold above which a sample is a saccade.
+
+    :return: detector with all saccades of the recording, see SaccadeDetector.window_features.
+    """
+    detector = SaccadeDetector(saccade_threshold=saccade_threshold)
+    for chunk in chunks:
+        detector.update(chunk["timestamp"].to_numpy(), chunk["norm_pos_x"].to_numpy(), chunk["norm_pos_y"].to_numpy())
+    detector.finalize()
+    return detector
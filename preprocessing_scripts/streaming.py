@@ -0,0 +1,300 @@
+import numpy as np
+import pandas as pd
+import neurokit2 as nk
+
+import constants
+from preprocessing_scripts.eda_features import calculate_eda_features
+from preprocessing_scripts.eye_features import DIAMETER_COLUMNS, _ipa, _saccade_features
+from preprocessing_scripts.hrv import hrv_features
+from preprocessing_scripts.tmp_features import calculate_thermo_pile_features
+
+# margin of the buffer capacities for sampling rates above the nominal one
+CAPACITY_MARGIN = 1.25
+# seconds of signal the PPG / ECG peak detection needs (filter transients)
+MIN_DETECTION_LENGTH = 3.0
+# default HRV features of a window besides the rate (its name depends on the kind of the stream), cheap for every hop
+STREAM_HRV_FEATURES = ["HRV_MeanNN", "HRV_SDNN", "HRV_RMSSD", "HRV_SDSD", "HRV_pNN20", "HRV_pNN50", "HRV_MadNN",
+                       "HRV_SD1", "HRV_SD2", "HRV_SD1SD2", "HRV_S"]
+
+
+class RingBuffer:
+    """ Fixed capacity buffer of the latest samples (timestamp + channels), i.e., bounded memory for endless streams.
+
+    Samples have to arrive in temporal order; older samples are overwritten once the buffer is full.
+    """
+
+    def __init__(self, capacity, n_channels=1):
+        """
+        :param capacity: Maximal number of samples.
+        :param n_channels: Number of values per sample (0 for timestamps only, e.g., detected peaks).
+        """
+        self.capacity = int(capacity)
+        self._times = np.empty(self.capacity)
+        self._values = np.empty((self.capacity, n_channels))
+        self._start = 0
+        self._length = 0
+
+    def extend(self, timestamps, values=None):
+        """ Appends samples.
+
+        :param timestamps: Timestamps of the samples in seconds.
+        :param values: Values, shape (samples, channels) or (samples,) for one channel.
+        """
+        timestamps = np.asarray(timestamps, dtype=float)
+        n = timestamps.shape[0]
+        values = np.empty((n, 0)) if values is None else np.asarray(values, dtype=float).reshape(n, -1)
+        if n > self.capacity:
+            timestamps, values, n = timestamps[-self.capacity:], values[-self.capacity:], self.capacity
+        positions = (self._start + self._length + np.arange(n)) % self.capacity
+        self._times[positions] = timestamps
+        self._values[positions] = values
+        overflow = max(0, self._length + n - self.capacity)
+        self._start = (self._start + overflow) % self.capacity
+        self._length = min(self.capacity, self._length + n)
+
+    def latest(self) -> float:
+        """:return: timestamp of the latest sample (NaN if empty)."""
+        if self._length == 0:
+            return np.nan
+        return self._times[(self._start + self._length - 1) % self.capacity]
+
+    def window(self, start=-np.inf, end=np.inf) -> tuple[np.ndarray, np.ndarray]:
+        """:return: timestamps, values (copies in temporal order) of the samples with start <= timestamp <= end."""
+        positions = (self._start + np.arange(self._length)) % self.capacity
+        times = self._times[positions]
+        lo = np.searchsorted(times, start, side="left")
+        hi = np.searchsorted(times, end, side="right")
+        return times[lo:hi], self._values[positions[lo:hi]]
+
+    def __len__(self) -> int:
+        return self._length
+
+
+class WindowedStream:
+    """ Base of the streaming feature extractors: buffers the samples of one modality and emits features for sliding
+    windows [end - window, end] every hop seconds.
+
+    Subclasses implement _features(start, end) and optionally _update(timestamps, values) to keep incremental state
+    (e.g., detected peaks), such that an update only processes the new samples. Only HRVStream does so, the other
+    streams recompute every window from its buffered samples. A window is emitted once _complete_until
+    (by default the latest sample minus delay) reaches its end.
+    """
+    channels = []
+    delay = 0.0  # seconds a window is emitted after its end (e.g., to see complete heart beats)
+
+    def __init__(self, window, hop, sampling_rate, history=0.0):
+        """
+        :param window: Window length in seconds.
+        :param hop: Seconds between two windows.
+        :param sampling_rate: Nominal sampling rate in Hz (sizes the buffer).
+        :param history: Seconds which are buffered in addition to the window.
+        """
+        self.window = window
+        self.hop = hop
+        self.sampling_rate = sampling_rate
+        self.buffer = RingBuffer(np.ceil((window + history + self.delay + hop) * sampling_rate * CAPACITY_MARGIN) + 1,
+                                 len(self.channels))
+        self._next_end = None
+
+    def push(self, timestamps, values) -> list:
+        """ Adds a chunk of samples.
+
+        :param timestamps: Timestamps of the samples in seconds (increasing, continuing the previous chunks).
+        :param values: Values, shape (samples, len(self.channels)).
+
+        :return: list of dicts window_start, window_end, features, one per completed window.
+        """
+        timestamps = np.asarray(timestamps, dtype=float)
+        if timestamps.shape[0] == 0:
+            return []
+        values = np.asarray(values, dtype=float).reshape(timestamps.shape[0], -1)
+        self.buffer.extend(timestamps, values)
+        self._update(timestamps, values)
+        if self._next_end is None:
+            self._next_end = timestamps[0] + self.window
+
+        results = []
+        while self._complete_until() >= self._next_end:
+            start = self._next_end - self.window
+            results.append({"window_start": start, "window_end": self._next_end, **self._features(start,
+                                                                                                   self._next_end)})
+            self._next_end += self.hop
+        return results
+
+    def frame(self, start, end) -> pd.DataFrame:
+        """:return: buffered samples of [start, end] as a data frame with the columns LocalTimestamp and channels."""
+        times, values = self.buffer.window(start, end)
+        frame = pd.DataFrame(values, columns=self.channels)
+        frame.insert(0, "LocalTimestamp", times)
+        return frame
+
+    def _complete_until(self) -> float:
+        # windows ending before this time are emitted, subclasses with incremental state return how far it is final
+        return self.buffer.latest() - self.delay
+
+    def _update(self, timestamps, values):
+        pass
+
+    def _features(self, start, end) -> dict:
+        raise NotImplementedError
+
+
+class HRVStream(WindowedStream):
+    """ Heart rate (variability) of PPG or ECG streams.
+
+    Peaks are detected incrementally: every update filters and searches only the new samples plus a short overlap, the
+    peak times are kept in a ring buffer. The window features are the neurokit HRV features of the peaks within the
+    window (preprocessing_scripts/hrv.py, as in calculate_ppg_features_nk with features), i.e., no window is filtered
+    twice.
+    """
+    channels = ["PG"]
+    delay = 1.0  # the last beat of a window is confirmed after the next samples arrived
+    overlap = 2.0  # seconds before the last processed sample which are filtered again (filter transients)
+    min_update = 1.0  # seconds of new samples before the detection runs
+
+    def __init__(self, window, hop, sampling_rate=constants.PPG_FREQ, kind="ppg", features=None):
+        """
+        :param kind: ppg (neurokit systolic peaks) or ecg (neurokit R peaks).
+        :param features: HRV feature names, see hrv_features; None for the rate (PPG_Rate_Mean or ECG_Rate_Mean) and
+                         STREAM_HRV_FEATURES. The expensive features are not computed.
+        """
+        super().__init__(window, hop, sampling_rate, history=self.overlap)
+        self.kind = kind
+        self.features = [f"{kind.upper()}_Rate_Mean"] + STREAM_HRV_FEATURES if features is None else list(features)
+        # at most 250 bpm
+        self.peaks = RingBuffer(np.ceil((window + self.delay + hop) * 250 / 60) + 1, 0)
+        self._processed = None  # peaks before this time are final
+
+    def _update(self, timestamps, values):
+        if self._processed is None:
+            self._processed = timestamps[0]
+        end = self.buffer.latest() - self.delay
+        # a due window is only emitted once all of its peaks are detected (see _complete_until)
+        due = self._next_end is not None and end >= self._next_end
+        if end - self._processed < self.min_update and not due:
+            return
+        times, signal = self.buffer.window(self._processed - self.overlap)
+        if times.shape[0] < MIN_DETECTION_LENGTH * self.sampling_rate:
+            # too short for the detection (e.g., at the start of the stream), the samples are searched again next time
+            return
+        peak_times = _detect_peaks(times, signal[:, 0], self.sampling_rate, self.kind)
+        last_peak = self.peaks.latest() if len(self.peaks) > 0 else -np.inf
+        # refractory period of 240 ms (250 bpm) against beats found twice at the border of two updates
+        new = (peak_times >= self._processed) & (peak_times < end) & (peak_times > last_peak + 0.24)
+        self.peaks.extend(peak_times[new])
+        self._processed = end
+
+    def _complete_until(self) -> float:
+        return -np.inf if self._processed is None else self._processed
+
+    def _features(self, start, end) -> dict:
+        peak_times, _ = self.peaks.window(start, end)
+        if peak_times.shape[0] < 4:
+            # fewer than three RR intervals
+            return {f: np.nan for f in self.features}
+        # peak times as (fractional) sample indices of the window
+        return hrv_features((peak_times - start) * self.sampling_rate, self.sampling_rate, self.features)
+
+
+class EDAStream(WindowedStream):
+    """ EDA features (calculate_eda_features in native mode) of the latest window, recomputed from the buffered samples
+    every hop (not incremental).
+    """
+    channels = ["EDA"]
+
+    def __init__(self, window, hop, sampling_rate=constants.EDA_FREQ):
+        super().__init__(window, hop, sampling_rate)
+
+    def _features(self, start, end) -> dict:
+        return calculate_eda_features(self.frame(start, end), mode="native").iloc[0].to_dict()
+
+
+class ThermopileStream(WindowedStream):
+    """ Thermo-pile features of aligned T1 / TH samples (see transform_thermo_pile to align two sensor streams),
+    recomputed from the buffered samples every hop (not incremental).
+    """
+    channels = ["T1", "TH"]
+
+    def __init__(self, window, hop, sampling_rate=constants.TMP_FREQ):
+        super().__init__(window, hop, sampling_rate)
+
+    def _features(self, start, end) -> dict:
+        return calculate_thermo_pile_features(self.frame(start, end), target_f=self.sampling_rate).iloc[0].to_dict()
+
+
+class PupilStream(WindowedStream):
+    """ Pupil diameter (mean, max, dev, IPA) and saccade features of a pupil-labs stream.
+
+    Not incremental: every hop recomputes the statistics, the IPA and the saccade detection of the whole window from
+    the buffered samples. Samples below the confidence threshold should be dropped (or set to NaN) before they are
+    pushed.
+    """
+    channels = DIAMETER_COLUMNS + ["norm_pos_x", "norm_pos_y"]
+
+    def __init__(self, window, hop, sampling_rate=120):
+        super().__init__(window, hop, sampling_rate)
+
+    def _features(self, start, end) -> dict:
+        times, values = self.buffer.window(start, end)
+        features = {}
+        for c, col in enumerate(DIAMETER_COLUMNS):
+            valid = ~np.isnan(values[:, c])
+            diameter = values[valid, c]
+            features[f"pupil_{col}_mean"] = np.mean(diameter) if diameter.shape[0] > 0 else np.nan
+            features[f"pupil_{col}_max"] = np.max(diameter) if diameter.shape[0] > 0 else np.nan
+            features[f"pupil_{col}_dev"] = np.std(diameter, ddof=1) if diameter.shape[0] > 1 else np.nan
+            features[f"pupil_{col}_ipa"] = _ipa(np.column_stack((times[valid], diameter)))
+        if times.shape[0] > 5:  # window of the savgol filter
+            gaze = pd.DataFrame({"timestamp": times, "norm_pos_x": values[:, -2], "norm_pos_y": values[:, -1]})
+            features.update(zip(["saccade_frequency", "saccade_durations_mean", "saccade_durations_max",
+                                 "saccade_speed_mean", "saccade_speed_max"], _saccade_features(gaze, self.window)))
+        return features
+
+
+class StreamingSession:
+    """ Streaming feature extraction of a live session: one stream per modality.
+
+    Usage: session = StreamingSession(window=60, hop=5); for every chunk of a sensor:
+           for row in session.push("ppg", timestamps, values): ...
+    """
+    STREAMS = {"ppg": lambda w, h: HRVStream(w, h, constants.PPG_FREQ, kind="ppg"),
+               "ecg": lambda w, h: HRVStream(w, h, 250, kind="ecg"),
+               "eda": EDAStream,
+               "tmp": ThermopileStream,
+               "pupil": PupilStream}
+
+    def __init__(self, window=60.0, hop=5.0, modalities=("ppg", "eda", "tmp", "pupil"), streams=None):
+        """
+        :param window: Window length in seconds.
+        :param hop: Seconds between two windows.
+        :param modalities: Modalities with a default stream, see STREAMS.
+        :param streams: Further (or differently configured) streams, dict modality -> WindowedStream.
+        """
+        self.streams = {modality: self.STREAMS[modality](window, hop) for modality in modalities}
+        self.streams.update(streams or {})
+
+    def push(self, modality, timestamps, values) -> list:
+        """:return: features of the windows completed by the chunk, dicts with the additional key modality."""
+        return [{"modality": modality, **row} for row in self.streams[modality].push(timestamps, values)]
+
+
+def _detect_peaks(times, signal, sampling_rate, kind) -> np.ndarray:
+    # peak times (sub-sample precision by parabolic interpolation) of a PPG or ECG segment
+    if times.shape[0] < MIN_DETECTION_LENGTH * sampling_rate:
+        return np.empty(0)
+    if kind == "ppg":
+        # systolic peaks (neurokit / Elgendi et al.), local maxima of the band passed signal also find diastolic ones
+        filtered = nk.ppg_clean(signal, sampling_rate=sampling_rate)
+        peaks = np.asarray(nk.ppg_findpeaks(filtered, sampling_rate=sampling_rate)["PPG_Peaks"], dtype=int)
+    elif kind == "ecg":
+        filtered = nk.ecg_clean(signal, sampling_rate=sampling_rate)
+        peaks = np.asarray(nk.ecg_findpeaks(filtered, sampling_rate=sampling_rate)["ECG_R_Peaks"], dtype=int)
+    else:
+        raise ValueError(f"unknown kind {kind}, use ppg or ecg")
+    inner = peaks[(peaks > 0) & (peaks < filtered.shape[0] - 1)]
+    y0, y1, y2 = filtered[inner - 1], filtered[inner], filtered[inner + 1]
+    curvature = y0 - 2 * y1 + y2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        offset = np.where(curvature != 0, 0.5 * (y0 - y2) / curvature, 0.0)
+    offset = np.clip(offset, -0.5, 0.5)
+    return np.interp(inner + offset, np.arange(times.shape[0]), times)
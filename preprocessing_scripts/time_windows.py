@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+
+
+def window_index(timestamps, time_window, n_time_window) -> np.ndarray:
+    """ Assigns every sample to its time window in a single pass.
+
+    Window i covers the half open interval [i * time_window, i * time_window + time_window), which is the same
+    slicing as the boolean masks used before.
+
+    :param timestamps: Timestamps of the samples in seconds (do not have to be sorted).
+    :param time_window: time window in seconds.
+    :param n_time_window: number of time windows.
+
+    :return index: window number of every sample, -1 if the sample is not within any window.
+    """
+    timestamps = np.asarray(timestamps, dtype=float)
+    starts = np.arange(n_time_window) * time_window
+    index = np.searchsorted(starts, timestamps, side="right") - 1
+    inside = (index >= 0) & (index < n_time_window)
+    inside[inside] = timestamps[inside] < starts[index[inside]] + time_window
+    index[~inside] = -1
+    return index
+
+
+class WindowIndex:
+    """ Prefix-sum index over a recording to calculate windowed aggregates for many time window sizes.
+
+    The data are sorted by time once. Count, mean and std of a window are calculated from cumulative sums and the max
+    from a sparse table, i.e., every additional time window size costs O(n_windows) instead of O(n_samples).
+    """
+
+    def __init__(self, data: pd.DataFrame, columns, timestamp_column="timestamp"):
+        """
+        :param data: Data frame with one row per sample.
+        :param columns: Numeric columns which should be aggregated.
+        :param timestamp_column: Column with the timestamps in seconds.
+        """
+        timestamps = data[timestamp_column].to_numpy(dtype=float)
+        order = np.argsort(timestamps, kind="stable")
+        self.data = data.iloc[order]
+        self.timestamps = timestamps[order]
+
+        self._count = {}
+        self._sum = {}
+        self._sum_sq = {}
+        self._center = {}
+        self._max_table = {}
+        self._runs = {}
+        for col in columns:
+            values = self.data[col].to_numpy(dtype=float)
+            valid = ~np.isnan(values)
+            # center the values for a numerically stable variance from the cumulative sums
+            center = values[valid].mean() if valid.any() else 0.0
+            centered = np.where(valid, values - center, 0.0)
+            self._center[col] = center
+            self._count[col] = np.concatenate(([0], np.cumsum(valid)))
+            self._sum[col] = np.concatenate(([0.0], np.cumsum(centered)))
+            self._sum_sq[col] = np.concatenate(([0.0], np.cumsum(centered ** 2)))
+            self._max_table[col] = _sparse_table(np.where(valid, values, -np.inf))
+
+    def bounds(self, time_window, n_time_window):
+        """ Row bounds of the windows [i * time_window, i * time_window + time_window) in self.data.
+
+        :return starts: First row of every window.
+        :return ends: End (exclusive) row of every window.
+        """
+        window_starts = np.arange(n_time_window) * time_window
+        starts = np.searchsorted(self.timestamps, window_starts, side="left")
+        ends = np.searchsorted(self.timestamps, window_starts + time_window, side="left")
+        return starts, ends
+
+    def count(self, column, starts, ends) -> np.ndarray:
+        """Number of non NaN values per window."""
+        return self._count[column][ends] - self._count[column][starts]
+
+    def mean(self, column, starts, ends) -> np.ndarray:
+        """NaN ignoring mean per window (NaN for windows without values)."""
+        count = self.count(column, starts, ends)
+        total = self._sum[column][ends] - self._sum[column][starts]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(count > 0, total / count + self._center[column], np.nan)
+
+    def std(self, column, starts, ends) -> np.ndarray:
+        """NaN ignoring sample standard deviation (ddof=1) per window, like pandas."""
+        count = self.count(column, starts, ends)
+        total = self._sum[column][ends] - self._sum[column][starts]
+        total_sq = self._sum_sq[column][ends] - self._sum_sq[column][starts]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            var = (total_sq - total ** 2 / count) / (count - 1)
+        return np.where(count > 1, np.sqrt(np.clip(var, 0.0, None)), np.nan)
+
+    def max(self, column, starts, ends) -> np.ndarray:
+        """NaN ignoring max per window (NaN for windows without values)."""
+        table = self._max_table[column]
+        length = ends - starts
+        level = np.zeros_like(length)
+        level[length > 0] = np.floor(np.log2(length[length > 0])).astype(int)
+        result = np.full(length.shape, -np.inf)
+        for k in np.unique(level[length > 0]):
+            sel = (length > 0) & (level == k)
+            result[sel] = np.maximum(table[k][starts[sel]], table[k][ends[sel] - (1 << k)])
+        result[np.isneginf(result)] = np.nan
+        return result
+
+    def nunique(self, column, starts, ends) -> np.ndarray:
+        """Number of distinct non NaN values per window."""
+        if column not in self._runs:
+            values = self.data[column].to_numpy()
+            run_start = np.ones(values.shape[0], dtype=bool)
+            run_start[1:] = values[1:] != values[:-1]
+            runs = values[run_start]
+            if np.issubdtype(values.dtype, np.number) and not np.isnan(values.astype(float)).any() and \
+                    np.unique(runs).shape[0] == runs.shape[0]:
+                # every value occurs in one contiguous run (e.g., fixation ids) -> count the run starts per window
+                self._runs[column] = np.concatenate(([0], np.cumsum(run_start)))
+            else:
+                self._runs[column] = None
+        cum_runs = self._runs[column]
+        if cum_runs is None:
+            values = self.data[column].to_numpy()
+            return np.array([pd.Series(values[s:e]).nunique() for s, e in zip(starts, ends)])
+        count = cum_runs[ends] - cum_runs[np.minimum(starts + 1, ends)]
+        return np.where(ends > starts, count + 1, 0)
+
+
+def _sparse_table(values) -> list:
+    """Sparse table for range maximum queries: table[k][i] = max(values[i:i + 2 ** k])."""
+    table = [values]
+    k = 1
+    while (1 << k) <= values.shape[0]:
+        prev = table[-1]
+        half = 1 << (k - 1)
+        table.append(np.maximum(prev[:-half], prev[half:]))
+        k += 1
+    return table
@@ -7,7 +7,6 @@ import pandas as pd
 import matplotlib
 import matplotlib.pyplot as plt
 import heartpy as hp
-from scipy.signal import resample
 import neurokit2 as nk
 from scipy.signal import welch
 
@@ -47,29 +46,48 @@ def calculate_thermo_pile_features(tmp_data: pd.DataFrame, target_f=7.5, verbose
     return temp
 
 
-def transform_thermo_pile(raw_data_t1: pd.DataFrame, raw_data_th: pd.DataFrame) -> pd.DataFrame:
-    """Helper function to rename the columns of a data frame such that they work with the rest of the pipeline.
+def transform_thermo_pile(raw_data_t1: pd.DataFrame, raw_data_th: pd.DataFrame, target_f=None) -> pd.DataFrame:
+    """Helper function to align the T1 and TH streams and rename the columns of the data frame such that they work
+    with the rest of the pipeline.
 
-    :param raw_data: Raw data frame which needs to be renamed.
+    TH is linearly interpolated (in time) onto the T1 timestamps, or both streams onto a uniform grid of target_f Hz,
+    i.e., the streams do not have to interleave. Values outside of a stream are the ones of its first / last sample.
 
-    :return raw_data: Renamed data frame.
+    :param raw_data_t1: Raw data frame with a time column and the column T1.
+    :param raw_data_th: Raw data frame with a time column and the column TH.
+    :param target_f: Rate of the common grid in Hz (e.g., constants.TMP_FREQ), None for the T1 timestamps.
+
+    :return raw_data: Data frame with the columns LocalTimestamp, T1 and TH.
 
     :raises Any Errors: ...
     """
-    # catch wrong keys
-    for k in raw_data_t1.keys():
-        if "time" in k.lower():
-            raw_data_t1 = raw_data_t1.rename(columns={k: "LocalTimestamp"})
-    for k in raw_data_th.keys():
-        if "time" in k.lower():
-            raw_data_th = raw_data_th.rename(columns={k: "LocalTimestamp"})
-
-    # merge data frames
-    raw_data = pd.concat([raw_data_t1, raw_data_th], axis=0)
-    raw_data.sort_values(by=['LocalTimestamp'], inplace=True)
-    raw_data["T1"].interpolate(method='linear', axis=0, limit_direction='both', inplace=True)
-    raw_data["TH"].interpolate(method='linear', axis=0, limit_direction='both', inplace=True)
-    # down sample to target frequency -> frequency increased by x 2 because of merging and time steps are not aligned
-    raw_data = raw_data.iloc[::2, :]
-
-    return raw_data
+    time_t1, t1 = _stream(raw_data_t1, "T1")
+    time_th, th = _stream(raw_data_th, "TH")
+    if target_f is None:
+        timestamps = time_t1
+    else:
+        first = min(time_t1[:1].tolist() + time_th[:1].tolist(), default=0.0)
+        last = max(time_t1[-1:].tolist() + time_th[-1:].tolist(), default=0.0)
+        timestamps = first + np.arange(int(np.floor((last - first) * target_f)) + 1) / target_f
+
+    return pd.DataFrame({"LocalTimestamp": timestamps, "T1": _interp(timestamps, time_t1, t1),
+                         "TH": _interp(timestamps, time_th, th)})
+
+
+def _stream(raw_data, column) -> tuple[np.ndarray, np.ndarray]:
+    # (time, values) of one stream, sorted by time, without missing values
+    time_column = [k for k in raw_data.keys() if "time" in k.lower()][0]
+    timestamps = raw_data[time_column].to_numpy(dtype=float)
+    values = raw_data[column].to_numpy(dtype=float)
+    valid = ~(np.isnan(timestamps) | np.isnan(values))
+    timestamps, values = timestamps[valid], values[valid]
+    if np.any(timestamps[1:] < timestamps[:-1]):
+        order = np.argsort(timestamps, kind="stable")
+        timestamps, values = timestamps[order], values[order]
+    return timestamps, values
+
+
+def _interp(timestamps, time_stream, values) -> np.ndarray:
+    if values.shape[0] == 0:
+        return np.full(timestamps.shape[0], np.nan)
+    return np.interp(timestamps, time_stream, values)
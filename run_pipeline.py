@@ -0,0 +1,162 @@
+# Feature extraction of the helicopter (PPG, EDA, thermopile) and the Julia study (ECG, pupil, fixation) as one
+# dependency graph of stages, see utils/pipeline.py, helicopter_features/stages.py and eye_tracking/stages.py.
+# Independent modality branches run concurrently, stages whose outputs are up to date are skipped.
+#
+# (run from the repository root)
+#   python run_pipeline.py --dry-run                              # show which stages are out of date
+#   python run_pipeline.py --modalities eda tmp --data-root /data/chronopilot
+#   python run_pipeline.py --stages ecg/write --force --workers 4
+import argparse
+import os
+
+import constants
+from eye_tracking import stages as julia
+from helicopter_features import stages as helicopter
+from preprocessing_scripts.resampling import RESAMPLING_METHODS
+from utils.pipeline import Pipeline, cache_path
+
+MODALITIES = list(helicopter.HELICOPTER_MODALITIES) + ["ecg", "pupil", "fixation"]
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Feature extraction pipeline of the ChronoPilot studies.")
+    parser.add_argument("--data-root", default=constants.DATA_ROOT,
+                        help="directory with helicopter/ and Julia_study/; the caches are kept in its cache/")
+    parser.add_argument("--output-root", default=None,
+                        help="directory of the feature files (default: the features directories of the studies)")
+    parser.add_argument("--modalities", nargs="+", choices=MODALITIES, default=MODALITIES)
+    parser.add_argument("--stages", nargs="+", default=None,
+                        help="stages to bring up to date, e.g., eda/write (default: the write stages)")
+    parser.add_argument("--force", action="store_true", help="run the stages even if they are up to date")
+    parser.add_argument("--dry-run", action="store_true", help="only list the stages and whether they would run")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes, default all cores but one, 1 = no multiprocessing")
+    # helicopter study
+    parser.add_argument("--experiment-name", default="helicopter_experiment")
+    parser.add_argument("--interval", default="start_posttest", help="<start phase>_<end phase>")
+    parser.add_argument("--baseline-interval", default="start_takeoff", help="subtracted from the interval features")
+    parser.add_argument("--eda-mode", choices=["upsample", "native"], default="upsample")
+    parser.add_argument("--reuse-peaks", action="store_true",
+                        help="detect the PPG / SCR peaks once on the interval covering interval and baseline (faster, "
+                             "the features differ slightly from processing the intervals separately)")
+    parser.add_argument("--fast-hrv", action="store_true",
+                        help="only the PPG / ECG features of constants.py, calculated from the peaks (see "
+                             "preprocessing_scripts/hrv.py) instead of the full neurokit analysis")
+    parser.add_argument("--skip-hrv-expensive", action="store_true",
+                        help="with --fast-hrv, leave the DFA, entropy and fractal features NaN")
+    parser.add_argument("--hrv-entropy-backend", choices=["native", "neurokit"], default="native")
+    parser.add_argument("--resample-method", choices=RESAMPLING_METHODS, default="fft",
+                        help="resampling of the PPG and the EDA (upsample mode)")
+    # Julia study
+    parser.add_argument("--tag", choices=["bsl", "no_bsl", "bs"], default="bsl",
+                        help="bsl = baseline subtraction; no_bsl = no baseline subtraction; bs = baseline")
+    parser.add_argument("--time-windows", nargs="+", type=int, default=[1, 2, 5, 10, 15, 20, 30, 45, 60])
+    parser.add_argument("--confidence-threshold", type=float, default=0.8)
+    return parser.parse_args(argv)
+
+
+def add_helicopter_stages(pipeline, args, modalities):
+    """Adds the stages of the helicopter study (load -> slice -> clean -> features -> subtract -> write)."""
+    data_root = args.data_root
+    output_root = os.path.join(args.output_root, "helicopter") if args.output_root is not None else \
+        os.path.join(data_root, "helicopter", "features")
+    settings = [(subject, session) for subject in helicopter.HELICOPTER_SUBJECTS
+                for session in helicopter.HELICOPTER_SESSIONS]
+
+    pipeline.add("helicopter/phases", helicopter.load_phase_table, inputs=[helicopter.timestamps_path(data_root)],
+                 data_root=data_root)
+    for m in modalities:
+        kinds = helicopter.HELICOPTER_MODALITIES[m]
+        # the PPG peak reuse calculates the features from the peaks, i.e., only with --fast-hrv
+        reuse_peaks = args.reuse_peaks and (m == "eda" or m == "ppg" and args.fast_hrv)
+        pipeline.add(f"{m}/load", helicopter.load_recordings, settings=settings,
+                     inputs=[helicopter.recording_path(data_root, *setting, kind) for setting in settings
+                             for kind in kinds],
+                     data_root=data_root, kinds=kinds)
+        pipeline.add(f"{m}/slice", helicopter.slice_intervals, deps=[f"{m}/load", "helicopter/phases"],
+                     settings=settings, modality=m, interval=args.interval, baseline_interval=args.baseline_interval,
+                     reuse_peaks=reuse_peaks)
+        pipeline.add(f"{m}/clean", helicopter.clean_intervals, deps=[f"{m}/slice"], settings=settings, modality=m)
+        # only the parameters of the modality, i.e., e.g., another EDA mode does not outdate the PPG features
+        params = {"ppg": {"ppg_features": constants.ALL_PPG_FEATURES_NEUROKIT_AVAILABLE if args.fast_hrv else None,
+                          "hrv_expensive": not args.skip_hrv_expensive, "hrv_entropy_backend": args.hrv_entropy_backend,
+                          "resample_method": args.resample_method},
+                  "eda": {"eda_mode": args.eda_mode, "resample_method": args.resample_method}}.get(m, {})
+        pipeline.add(f"{m}/features", helicopter.calc_features, deps=[f"{m}/clean"], settings=settings, modality=m,
+                     baseline_interval=args.baseline_interval, data_root=data_root, **params)
+        pipeline.add(f"{m}/subtract", helicopter.subtract_baseline, deps=[f"{m}/features"], settings=settings)
+        files = {subject: helicopter.output_path(output_root, args.experiment_name, m, args.interval, subject)
+                 for subject in helicopter.HELICOPTER_SUBJECTS}
+        pipeline.add(f"{m}/write", helicopter.write_subject_features, deps=[f"{m}/subtract"],
+                     outputs=list(files.values()), columns=helicopter.HELICOPTER_FEATURES[m], files=files)
+
+
+def add_julia_stages(pipeline, args, modalities):
+    """Adds the stages of the Julia study (ECG: load -> features -> subtract -> write; pupil / fixation: load ->
+    clean -> baseline statistics -> features of all time windows -> write)."""
+    data_root = args.data_root
+    output_root = os.path.join(args.output_root, "julia") if args.output_root is not None else \
+        os.path.join(data_root, "Julia_study", "features")
+    settings = [(t, r, p) for t in julia.JULIA_TIMES for r in julia.JULIA_ROBOTS for p in julia.JULIA_PARTICIPANTS]
+
+    if "ecg" in modalities:
+        pipeline.add("ecg/load", julia.load_ecg, settings=settings,
+                     inputs=[julia.recording_path(data_root, "physio", setting, f"ecg_{part}") for setting in settings
+                             for part in ["experiment", "baseline"]],
+                     data_root=data_root)
+        pipeline.add("ecg/features", julia.ecg_features, deps=["ecg/load"], settings=settings, data_root=data_root,
+                     features=constants.ALL_ECG_FEATURES_NEUROKIT if args.fast_hrv else None,
+                     expensive=not args.skip_hrv_expensive, entropy_backend=args.hrv_entropy_backend)
+        pipeline.add("ecg/subtract", julia.subtract_ecg_baseline, deps=["ecg/features"], settings=settings)
+        files = {part: julia.ecg_output_path(output_root, part) for part in julia.ECG_PARTS}
+        pipeline.add("ecg/write", julia.write_ecg_features, deps=["ecg/subtract"], outputs=list(files.values()),
+                     features=constants.ALL_ECG_FEATURES_NEUROKIT, files=files)
+
+    for m in [m for m in ["pupil", "fixation"] if m in modalities]:
+        name = julia.EYE_RECORDINGS[m][0]
+        pipeline.add(f"{m}/load", julia.load_eye, settings=settings,
+                     inputs=[julia.recording_path(data_root, "pupil", setting, f"{name}_{part}") for setting in settings
+                             for part in ["experiment", "baseline"]],
+                     data_root=data_root, modality=m)
+        pipeline.add(f"{m}/clean", julia.clean_eye, deps=[f"{m}/load"], settings=settings, modality=m,
+                     confidence_threshold=args.confidence_threshold)
+        pipeline.add(f"{m}/baseline", julia.eye_baseline_statistics, deps=[f"{m}/clean"], settings=settings,
+                     modality=m, data_root=data_root, tag=args.tag, confidence_threshold=args.confidence_threshold)
+        pipeline.add(f"{m}/features", julia.eye_features, deps=[f"{m}/clean", f"{m}/baseline"], settings=settings,
+                     modality=m, data_root=data_root, time_windows=args.time_windows, tag=args.tag)
+        files = {tw: julia.eye_output_path(output_root, m, args.tag, tw) for tw in args.time_windows}
+        pipeline.add(f"{m}/write", julia.write_eye_features, deps=[f"{m}/features"],
+                     outputs=sorted(set(files.values())), modality=m, files=files)
+
+
+def build_pipeline(args) -> Pipeline:
+    """:return: pipeline of the selected modalities."""
+    pipeline = Pipeline(os.path.join(cache_path(args.data_root, "pipeline"), "manifest.json"))
+    helicopter_modalities = [m for m in args.modalities if m in helicopter.HELICOPTER_MODALITIES]
+    if helicopter_modalities:
+        add_helicopter_stages(pipeline, args, helicopter_modalities)
+    julia_modalities = [m for m in args.modalities if m not in helicopter.HELICOPTER_MODALITIES]
+    if julia_modalities:
+        add_julia_stages(pipeline, args, julia_modalities)
+    return pipeline
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    pipeline = build_pipeline(args)
+    unknown = [name for name in args.stages or [] if name not in pipeline.stages]
+    if unknown:
+        raise SystemExit(f"unknown stages {unknown}, the stages are {list(pipeline.stages)}")
+    planned = pipeline.plan(args.stages, force=args.force)
+    if args.dry_run:
+        for name in pipeline.stages:
+            print(f"{'run ' if name in planned else 'skip'} {name}")
+        return
+    if not planned:
+        print("all stages are up to date")
+        return
+    pipeline.run(args.stages, n_workers=args.workers, force=args.force, verbose=True)
+
+
+if __name__ == "__main__":
+    main()
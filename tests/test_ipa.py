@@ -0,0 +1,93 @@
+import warnings
+
+import numpy as np
+import pytest
+import pywt
+
+from preprocessing_scripts.eye_features import _ipa, _ipa_batch
+
+
+def _reference_ipa(d):
+    """Loop implementation of the IPA before the vectorization, only with the corrected neighbour bound (len(d) - 1)."""
+
+    def modmax(d):
+        m = [0.0] * len(d)
+        for i in range(len(d)):
+            m[i] = np.fabs(d[i])
+        t = [0.0] * len(d)
+        for i in range(len(d)):
+            ll = m[i - 1] if i >= 1 else m[i]
+            oo = m[i]
+            rr = m[i + 1] if i < len(d) - 1 else m[i]
+            if (ll <= oo and oo >= rr) and (ll < oo or oo > rr):
+                t[i] = np.sqrt(d[i] ** 2)
+            else:
+                t[i] = 0.0
+        return t
+
+    try:
+        (cA2, cD2, cD1) = pywt.wavedec(d[:, 1], 'sym16', 'per', level=2)
+    except ValueError:
+        return np.nan
+    tt = float(d[-1, 0] - d[0, 0])
+    if tt == 0:
+        return np.nan
+    cA2[:] = [x / np.sqrt(4.0) for x in cA2]
+    cD1[:] = [x / np.sqrt(2.0) for x in cD1]
+    cD2[:] = [x / np.sqrt(4.0) for x in cD2]
+    cD2m = modmax(cD2)
+    lambda_univ = np.std(cD2m) * np.sqrt(2.0 * np.log2(len(cD2m)))
+    cD2t = pywt.threshold(cD2m, lambda_univ, mode="hard")
+    ctr = 0
+    for ii in range(len(cD2t)):
+        if np.fabs(cD2t[ii]) > 0:
+            ctr += 1
+    return float(ctr) / tt
+
+
+def _signal(rng, length, sampling_rate=120.0):
+    """Pupil diameter signal (columns timestamp, diameter) with slow drift, noise and a few spikes."""
+    timestamps = np.arange(length) / sampling_rate
+    diameters = 3.5 + 0.3 * np.sin(timestamps) + 0.05 * rng.standard_normal(length)
+    diameters[rng.random(length) < 0.02] += 0.5
+    return np.column_stack((timestamps, diameters))
+
+
+def _assert_same(actual, expected):
+    np.testing.assert_allclose(actual, expected, rtol=1e-12, atol=0, equal_nan=True)
+
+
+@pytest.fixture(autouse=True)
+def _ignore_level_warnings():
+    # pywt warns about the decomposition level of short signals
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)
+        yield
+
+
+@pytest.mark.parametrize("length", [0, 1, 2, 3, 7, 64, 257, 1000, 3001])
+def test_ipa_matches_reference(length):
+    d = _signal(np.random.default_rng(length), length)
+    _assert_same(_ipa(d), _reference_ipa(d))
+
+
+def test_ipa_of_constant_timestamps_is_nan():
+    d = np.column_stack((np.zeros(50), np.random.default_rng(0).random(50)))
+    assert np.isnan(_ipa(d))
+
+
+def test_ipa_batch_matches_reference_for_mixed_lengths():
+    rng = np.random.default_rng(42)
+    lengths = [0, 1, 2, 5, 32, 32, 100, 0, 513, 100, 2, 1200]
+    signals = [_signal(rng, length) for length in lengths]
+    _assert_same(_ipa_batch(signals), [_reference_ipa(d) for d in signals])
+
+
+def test_ipa_batch_matches_ipa():
+    rng = np.random.default_rng(7)
+    signals = [_signal(rng, length) for length in rng.integers(0, 2000, size=40)]
+    _assert_same(_ipa_batch(signals), [_ipa(d) for d in signals])
+
+
+def test_ipa_batch_of_no_signals():
+    assert _ipa_batch([]).shape == (0,)
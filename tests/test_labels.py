@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.labels import PPOT_SCALE, PPOT_5_CLASSES, PPOT_3_CLASSES, PPOT_2_CLASSES, ESTIMATION_3_CLASSES, \
+    ESTIMATION_2_CLASSES, PASSAGE_OF_TIME_3_CLASSES, JULIA_LABEL_SPECS, derive_label, derive_labels, label_counts
+
+
+def _classes(spec, labels):
+    return derive_label(pd.DataFrame(labels), spec).tolist()
+
+
+def test_ppot_classes_of_every_scale_value():
+    labels = {"ppot": PPOT_SCALE}
+    assert PPOT_SCALE == [0, 1, 2, 3, 4]
+    assert _classes(PPOT_5_CLASSES, labels) == [0, 1, 2, 3, 4]
+    # very slow, slow -> slow; medium; fast, very fast -> fast
+    assert _classes(PPOT_3_CLASSES, labels) == [0, 0, 1, 2, 2]
+    # very slow, slow, medium -> slow; fast, very fast -> fast
+    assert _classes(PPOT_2_CLASSES, labels) == [0, 0, 0, 1, 1]
+
+
+@pytest.mark.parametrize("spec", [PPOT_5_CLASSES, PPOT_3_CLASSES, PPOT_2_CLASSES])
+def test_ppot_outside_of_the_scale_raises(spec):
+    # e.g., answers on a 1-5 scale would shift every class
+    with pytest.raises(ValueError, match="unexpected ppot values"):
+        derive_label(pd.DataFrame({"ppot": [1, 2, 3, 4, 5]}), spec)
+
+
+def test_estimation_boundaries():
+    labels = {"time": [4, 4, 4, 4, 4, 4], "duration_estimate": [2.99, 3.0, 3.6, 4.2, 4.21, np.nan]}
+    # below 0.75 * time -> under, above 1.05 * time -> over, both boundaries -> correct
+    assert _classes(ESTIMATION_3_CLASSES, labels) == [0, 1, 1, 1, 2, pd.NA]
+    # below 0.9 * time -> under, 0.9 * time -> over
+    assert _classes(ESTIMATION_2_CLASSES, labels) == [0, 0, 1, 1, 1, pd.NA]
+
+
+def test_passage_of_time_boundaries():
+    labels = {"PassageOfTimeSlowFast": [1, 2, 2.5, 3, 3.5, 4, 5]}
+    assert _classes(PASSAGE_OF_TIME_3_CLASSES, labels) == [0, 0, 0, 1, 2, 2, 2]
+
+
+def test_missing_reference_is_missing():
+    labels = {"time": [np.nan], "duration_estimate": [3.0]}
+    assert _classes(ESTIMATION_2_CLASSES, labels) == [pd.NA]
+
+
+def test_counts_match_the_loops_of_the_original_analysis():
+    rng = np.random.default_rng(0)
+    labels = pd.DataFrame({"time": rng.choice([1, 3, 5], 600), "ppot": rng.integers(0, 5, 600).astype(float)})
+    labels["duration_estimate"] = labels["time"] * rng.uniform(0.5, 1.5, 600)
+    counts = {name: label_counts(derive_labels(labels, JULIA_LABEL_SPECS), name, spec).loc["all"].to_list()
+              for name, spec in JULIA_LABEL_SPECS.items()}
+
+    _, ppot = np.unique(labels["ppot"], return_counts=True)
+    assert counts["ppot_5"] == ppot.tolist()
+    assert counts["ppot_3"] == [ppot[0] + ppot[1], ppot[2], ppot[3] + ppot[4]]
+    assert counts["ppot_2"] == [ppot[0] + ppot[1] + ppot[2], ppot[3] + ppot[4]]
+    estimation_3 = [0, 0, 0]
+    estimation_2 = [0, 0]
+    for _, row in labels.iterrows():
+        if row["duration_estimate"] < row["time"] * 0.75:
+            estimation_3[0] += 1
+        elif row["duration_estimate"] > row["time"] * 1.05:
+            estimation_3[2] += 1
+        else:
+            estimation_3[1] += 1
+        estimation_2[0 if row["duration_estimate"] < row["time"] * 0.9 else 1] += 1
+    assert counts["estimation_3"] == estimation_3
+    assert counts["estimation_2"] == estimation_2
+
+
+def test_counts_of_empty_classes_are_zero():
+    labels = derive_labels(pd.DataFrame({"ppot": [0.0, 0.0, 4.0], "time": [1, 3, 3]}), {"ppot_5": PPOT_5_CLASSES})
+    counts = label_counts(labels, "ppot_5", PPOT_5_CLASSES, by="time")
+    assert counts.loc[1].to_list() == [1, 0, 0, 0, 0]
+    assert counts.loc[3].to_list() == [1, 0, 0, 0, 1]
@@ -0,0 +1,50 @@
+import warnings
+
+import numpy as np
+import pytest
+import neurokit2 as nk
+
+from preprocessing_scripts.streaming import HRVStream, _detect_peaks
+
+SAMPLING_RATE = 64
+# peak times of the streamed and the offline detection differ by up to a sample (filter transients at the segment
+# borders), peaks within this tolerance of a window border may be in the window in one and out of it in the other
+TOLERANCE = 1 / SAMPLING_RATE
+
+
+@pytest.fixture(autouse=True)
+def _ignore_neurokit_warnings():
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        yield
+
+
+@pytest.fixture(scope="module")
+def ppg():
+    signal = nk.ppg_simulate(duration=180, sampling_rate=SAMPLING_RATE, heart_rate=70, ibi_randomness=0.2,
+                             random_state=1)
+    return np.arange(signal.shape[0]) / SAMPLING_RATE, signal
+
+
+def _inner(peaks, start, end):
+    # peaks which are not within the tolerance of the window borders
+    return peaks[(peaks >= start + TOLERANCE) & (peaks <= end - TOLERANCE)]
+
+
+@pytest.mark.parametrize("hop", [0.3, 1.0, 5.0])
+def test_streamed_windows_contain_the_offline_peaks(ppg, hop):
+    timestamps, signal = ppg
+    offline = _detect_peaks(timestamps, signal, SAMPLING_RATE, "ppg")
+    stream = HRVStream(window=30, hop=hop, sampling_rate=SAMPLING_RATE)
+    chunk = SAMPLING_RATE // 2
+    n_windows = 0
+    for i in range(0, timestamps.shape[0], chunk):
+        for row in stream.push(timestamps[i:i + chunk], signal[i:i + chunk]):
+            # the peaks of the window have to be final when it is emitted, i.e., checked before the next push
+            streamed, _ = stream.peaks.window(row["window_start"], row["window_end"])
+            expected = _inner(offline, row["window_start"], row["window_end"])
+            streamed = _inner(streamed, row["window_start"], row["window_end"])
+            assert streamed.shape == expected.shape
+            np.testing.assert_allclose(streamed, expected, rtol=0, atol=TOLERANCE)
+            n_windows += 1
+    assert n_windows == int((timestamps[-1] - HRVStream.delay - 30 - timestamps[0]) // hop) + 1
@@ -0,0 +1,66 @@
+import hashlib
+import os
+import warnings
+
+import pandas as pd
+
+import constants
+
+try:
+    import pyarrow  # noqa: F401 -- parquet engine of pandas
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+
+def read_csv_cached(path, columns=None, cache_path=None, **read_csv_kwargs) -> pd.DataFrame:
+    """ Drop-in replacement of pd.read_csv which serves repeated loads from a typed columnar (Parquet) copy.
+
+    The first load parses the CSV and writes it to the cache, all later loads read the Parquet file instead. The cache
+    entry is keyed by the source path, its modification time and size, and the read_csv arguments, i.e., a changed
+    source file is parsed again. Without pyarrow, or for data which cannot be stored as Parquet (e.g., integer column
+    names from header=None), the CSV is parsed every time.
+
+    :param path: Path of the CSV file.
+    :param columns: Only return these columns (None for all); only these columns are read from the cache.
+    :param cache_path: Directory of the cache files, default constants.CSV_CACHE_PATH.
+    :param read_csv_kwargs: Further arguments of pd.read_csv, e.g., sep, header or decimal.
+
+    :return data: Data frame as returned by pd.read_csv.
+
+    :raises FileNotFoundError: If the CSV file does not exist.
+    """
+    if not HAS_PYARROW:
+        return _read_csv(path, columns, read_csv_kwargs)
+    if cache_path is None:
+        cache_path = constants.CSV_CACHE_PATH
+
+    cache_file = os.path.join(cache_path, _cache_key(path, read_csv_kwargs) + ".parquet")
+    if os.path.exists(cache_file):
+        return pd.read_parquet(cache_file, columns=columns)
+
+    # cache the complete file such that any selection of columns can be served from it later on
+    data = pd.read_csv(path, **read_csv_kwargs)
+    if all(isinstance(c, str) for c in data.columns):
+        try:
+            os.makedirs(cache_path, exist_ok=True)
+            tmp_file = cache_file + f".{os.getpid()}.tmp"
+            data.to_parquet(tmp_file, index=False)
+            os.replace(tmp_file, cache_file)  # atomic, several worker processes may write the same entry
+        except (OSError, ValueError, TypeError, pyarrow.ArrowException) as e:
+            warnings.warn(f"could not cache {path}: {e}")
+    return data if columns is None else data[columns]
+
+
+def _read_csv(path, columns, read_csv_kwargs) -> pd.DataFrame:
+    if columns is None:
+        return pd.read_csv(path, **read_csv_kwargs)
+    return pd.read_csv(path, usecols=columns, **read_csv_kwargs)[columns]
+
+
+def _cache_key(path, read_csv_kwargs) -> str:
+    path = os.path.abspath(path)
+    stat = os.stat(path)  # raises FileNotFoundError like pd.read_csv
+    key = repr((path, stat.st_mtime_ns, stat.st_size, sorted(read_csv_kwargs.items())))
+    name = os.path.splitext(os.path.basename(path))[0]
+    return name + "-" + hashlib.sha1(key.encode()).hexdigest()[:16]
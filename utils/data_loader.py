@@ -1,15 +1,30 @@
 # import csv
+import os
 import pandas as pd
 import numpy as np
 # from IPython.display import display
 
+from utils.csv_cache import read_csv_cached
+from utils.lazy_dataset import LazyDataset
+from utils.signal_store import open_signal_store
+import constants
+
 
 class Data_Loader:
 
-    def __init__(self, data_path, verbose=True):
+    def __init__(self, data_path, verbose=True, cache=True):
         self.verbose = verbose
 
         self.data_path = data_path
+        # serve the raw csv files from a parquet cache after the first load, see utils/csv_cache.py
+        self.cache = cache
+
+    def _read_csv(self, path, columns=None, **read_csv_kwargs):
+        if self.cache:
+            return read_csv_cached(path, columns=columns, **read_csv_kwargs)
+        if columns is not None:
+            return pd.read_csv(path, usecols=columns, **read_csv_kwargs)[columns]
+        return pd.read_csv(path, **read_csv_kwargs)
 
 
     # load the corrected trajectory
@@ -19,8 +34,8 @@ class Data_Loader:
         data_path_y = "data/Experiment1(robot behaviour)/Measurements_fixed/p_" + str(person) + "/" + str(
             speed) + "_" + str(number_robots) + "/Y-CoordinatesWithoutMistakes.csv"
 
-        df_x = pd.read_csv(data_path_x, sep=';', header=0, decimal=',')
-        df_y = pd.read_csv(data_path_y, sep=';', header=0, decimal=',')
+        df_x = self._read_csv(data_path_x, sep=';', header=0, decimal=',')
+        df_y = self._read_csv(data_path_y, sep=';', header=0, decimal=',')
 
         # cut to slice_slow specified length i.e. 180 sec
         df_x = df_x.loc[df_x["TimeStamp"] <= upper_bound]
@@ -35,7 +50,7 @@ class Data_Loader:
         # load correct data frame - ts
         data_path = "data/Experiment1(robot behaviour)/Measurements_fixed/p_" + str(person) + "/" + str(speed) + "_" + str(
             number_robots) + "/" + str(data_type) + ".csv"
-        df_x = pd.read_csv(data_path, sep=';', header=0, decimal=',')
+        df_x = self._read_csv(data_path, sep=';', header=0, decimal=',')
 
         # cut to slice_slow specified length i.e. 180 sec
         df_x["TimeStamp"] = df_x["TimeStamp"].clip(upper=upper_bound)
@@ -89,7 +104,7 @@ class Data_Loader:
     #     return data
 
     def load_experiment1(self, kind="RR", norm_method=None):
-        labels = pd.read_csv("data/Experiment1(robot behaviour)/Questionnaire_data.csv", sep=';', header=0, decimal=',')
+        labels = self._read_csv("data/Experiment1(robot behaviour)/Questionnaire_data.csv", sep=';', header=0, decimal=',')
         data = [[[[None for _ in range(2)] for _ in range(4)] for _ in range(3)] for _ in range(25)]
         for p in range(1, 26):
             for s in range(1, 3):
@@ -102,7 +117,7 @@ class Data_Loader:
 
 
     def load_cue(self, kind="h10_ecg", norm_method=None):
-        labels = pd.read_csv("data/CUE_Experiment/Questionnaire_data.csv", header=0, sep=';')
+        labels = self._read_csv("data/CUE_Experiment/Questionnaire_data.csv", header=0, sep=';')
         persons = ["FS_22", "JS_22", "KP_37", "NC_25", "NW_24", "RA_25", "SZ_30"]  # "AF_27", "MA_24", "AK_26"
         cues = ["cue_0", "cue_1", "cue_2", "cue_3"]
         data = [[[None for _ in range(2)] for _ in range(len(cues))] for _ in range(len(persons))]
@@ -111,7 +126,7 @@ class Data_Loader:
             # for all settings
             for c_i, c in enumerate(cues):
                 data_path = "data/CUE_Experiment/" + p + "/" + c + "/" + kind + ".csv"
-                x = pd.read_csv(data_path, header=None)
+                x = self._read_csv(data_path, header=None)
                 x = x.rename(columns={0: 'TimeStamp', 1: kind})
                 x["TimeStamp"] = x["TimeStamp"] - x["TimeStamp"][0]
                 y = labels.loc[(labels['Initials'] == p) & (labels['Cue Type'] == c_i)]
@@ -122,16 +137,46 @@ class Data_Loader:
 
 
     # Format: person x setting x 0 = data, 1 = label
+    # loads all recordings at once, see helicopter_dataset for loading them on access
     def load_helicopter(self, kind="RR", norm_method=None):
-        labels = pd.read_csv("/Volumes/Data/chronopilot/helicopter/timings.csv", header=0)
+        labels = self.load_helicopter_labels()
         data = [[[None for _ in range(2)] for _ in range(4)] for _ in range(12)]
         # for all subjects
         for p in range(1, 13):
             # for all settings
             for s in range(1, 5):
                 data_path = "/Volumes/Data/chronopilot/helicopter/Physiological/" + kind + "/subject" + str(p) + "-" + str(s) + "_" + kind + ".csv"
-                x = pd.read_csv(data_path, header=0)
+                x = self._read_csv(data_path, header=0)
                 y = labels.loc[(labels['ParticipantID'] == p) & (labels['Session'] == s)]
                 data[p-1][s-1][0] = x
                 data[p-1][s-1][1] = y
         return data
+
+    # Format: dataset[subject, session, kind] with subject 1-12, session 1-4; recordings are loaded on access
+    def helicopter_dataset(self, kinds=("RR",), max_cached=8,
+                           data_path="/Volumes/Data/chronopilot/helicopter/Physiological/"):
+        files = {}
+        for kind in kinds:
+            for p in range(1, 13):
+                for s in range(1, 5):
+                    path = data_path + kind + "/subject" + str(p) + "-" + str(s) + "_" + kind + ".csv"
+                    if os.path.exists(path):
+                        files[(p, s, kind)] = path
+        return LazyDataset(files, lambda path: self._read_csv(path, header=0), max_cached=max_cached)
+
+    # Format: store[subject, session, kind] -> SignalStore, e.g., store[1, 1, "PPG"].frame(start, end); the recordings
+    # are ingested into memory-mapped files on first access
+    def helicopter_store(self, kinds=("RR",), max_cached=64,
+                         data_path="/Volumes/Data/chronopilot/helicopter/Physiological/",
+                         store_path=constants.SIGNAL_STORE_PATH):
+        dataset = self.helicopter_dataset(kinds, max_cached=max_cached, data_path=data_path)
+
+        def open_store(path):
+            name = os.path.splitext(os.path.basename(path))[0]
+            return open_signal_store(path, os.path.join(store_path, "helicopter", name),
+                                     read_fn=lambda p: self._read_csv(p, header=0))
+
+        return LazyDataset(dataset.files, open_store, max_cached=max_cached)
+
+    def load_helicopter_labels(self):
+        return self._read_csv("/Volumes/Data/chronopilot/helicopter/timings.csv", header=0)
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+
+import constants
+
+try:
+    import pyarrow as pa
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# schema registry: name -> columns of the feature blocks
+SCHEMAS = {
+    "pupil": constants.EYE_WINDOW_KEYS + constants.ALL_PUPIL_FEATURES,
+    "fixation": constants.EYE_WINDOW_KEYS + constants.ALL_FIXATION_FEATURES,
+}
+
+
+class FeatureBlock:
+    """ Window-level features of one recording as a struct of arrays.
+
+    All columns are rows of one float64 array (columns x windows), i.e., a feature is set for all windows at once
+    (block["fixation_frequency"] = counts / time_window) instead of per window, and to_frame / to_arrow wrap the array
+    without copying it.
+    """
+    __slots__ = ("columns", "values", "index", "_positions")
+
+    def __init__(self, schema, n_rows, index=None):
+        """
+        :param schema: Name of a schema in SCHEMAS or list of column names.
+        :param n_rows: Number of rows (e.g., windows).
+        :param index: Index labels of the rows (e.g., the window numbers), default 0 .. n_rows - 1.
+        """
+        self.columns = list(SCHEMAS[schema] if isinstance(schema, str) else schema)
+        self.values = np.full((len(self.columns), n_rows), np.nan)
+        self.index = np.arange(n_rows) if index is None else np.asarray(index)
+        self._positions = {c: i for i, c in enumerate(self.columns)}
+
+    def __getitem__(self, column) -> np.ndarray:
+        """:return: view of one column."""
+        return self.values[self._positions[column]]
+
+    def __setitem__(self, column, values):
+        """Sets one column to an array (one value per row) or a scalar."""
+        self.values[self._positions[column]] = values
+
+    def __len__(self) -> int:
+        return self.values.shape[1]
+
+    def to_frame(self) -> pd.DataFrame:
+        """:return: data frame (float columns) which shares the memory of the block."""
+        return pd.DataFrame(self.values.T, columns=self.columns, index=pd.Index(self.index), copy=False)
+
+    def to_arrow(self) -> "pa.Table":
+        """ :return: pyarrow table whose columns share the memory of the block (index as column "index").
+
+        :raises ImportError: If pyarrow is not installed.
+        """
+        if not HAS_PYARROW:
+            raise ImportError("to_arrow requires pyarrow")
+        return pa.table([pa.array(self.index)] + [pa.array(row) for row in self.values],
+                        names=["index"] + self.columns)
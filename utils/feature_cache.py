@@ -0,0 +1,247 @@
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import sys
+import warnings
+from functools import lru_cache, partial, wraps
+from importlib.metadata import version, PackageNotFoundError
+
+import numpy as np
+import pandas as pd
+
+import constants
+
+# libraries whose version changes the features
+VERSIONED_LIBRARIES = ["numpy", "pandas", "scipy", "neurokit2", "heartpy"]
+# parameters which do not change the result of a feature function
+IGNORED_PARAMETERS = ["verbose"]
+
+_REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + os.sep
+
+
+class FeatureCache:
+    """ Content-addressed on-disk cache of feature function results.
+
+    A result is keyed by the function (module and name), a hash of the source of its module and of the repository
+    modules it imports (see code_hash), the bound arguments (data frames and arrays by content) and the versions of
+    VERSIONED_LIBRARIES, i.e., a rerun after a parameter change only recomputes the calls whose inputs changed. The
+    least recently used entries are evicted once the cache exceeds max_size bytes.
+
+    Usage: features = feature_cache.call(calculate_eda_features, eda_data, mode="native") or
+           calculate_eda_features = feature_cache.wrap(calculate_eda_features)
+    """
+
+    def __init__(self, cache_path=constants.FEATURE_CACHE_PATH, max_size=constants.FEATURE_CACHE_MAX_SIZE,
+                 enabled=True):
+        """
+        :param cache_path: Directory of the cache, one sub directory per function.
+        :param max_size: Size limit of the cache in bytes, None for no limit.
+        :param enabled: False calls the functions directly (e.g., for debugging).
+        """
+        self.cache_path = cache_path
+        self.max_size = max_size
+        self.enabled = enabled
+        self._size = None  # bytes on disk, scanned at the first write
+
+    def call(self, fn, *args, **kwargs):
+        """:return: fn(*args, **kwargs), from the cache if it was computed before."""
+        if not self.enabled:
+            return fn(*args, **kwargs)
+        file = os.path.join(self.cache_path, _function_name(fn), self.key(fn, *args, **kwargs) + ".pkl")
+        try:
+            with open(file, "rb") as f:
+                result = pickle.load(f)
+            os.utime(file)  # mark as recently used
+            return result
+        except (OSError, EOFError, pickle.UnpicklingError, ImportError, AttributeError):
+            # not cached, or a stale entry whose classes were renamed or removed since (ModuleNotFoundError is an
+            # ImportError) -> computed again and overwritten
+            pass
+
+        result = fn(*args, **kwargs)
+        try:
+            os.makedirs(os.path.dirname(file), exist_ok=True)
+            tmp_file = file + f".{os.getpid()}.tmp"
+            with open(tmp_file, "wb") as f:
+                pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, file)  # atomic, several worker processes may write the same entry
+            self._add_size(os.path.getsize(file))
+        except (OSError, pickle.PicklingError) as e:
+            warnings.warn(f"could not cache the result of {_function_name(fn)}: {e}")
+        return result
+
+    def wrap(self, fn):
+        """:return: fn with cached results."""
+        @wraps(fn)
+        def cached_fn(*args, **kwargs):
+            return self.call(fn, *args, **kwargs)
+        return cached_fn
+
+    def key(self, fn, *args, **kwargs) -> str:
+        """ :return: cache key of fn(*args, **kwargs); default arguments are part of the key.
+
+        :raises ValueError: If fn is a lambda or a nested function, whose name does not identify it.
+        """
+        bound = inspect.signature(fn).bind(*args, **kwargs)
+        bound.apply_defaults()
+        digest = hashlib.sha1(json.dumps(function_key(fn), default=repr).encode())
+        for name, value in bound.arguments.items():
+            if name not in IGNORED_PARAMETERS:
+                digest.update(name.encode())
+                _update_value(digest, value)
+        return digest.hexdigest()
+
+    def size(self) -> int:
+        """:return: size of the cache in bytes."""
+        return sum(size for _, _, size in self._entries())
+
+    def evict(self, max_size=None):
+        """ Deletes the least recently used entries until the cache is at most max_size bytes.
+
+        :param max_size: Size limit in bytes, default self.max_size.
+        """
+        max_size = self.max_size if max_size is None else max_size
+        entries = sorted(self._entries(), key=lambda e: e[1])
+        size = sum(e[2] for e in entries)
+        for file, _, file_size in entries:
+            if size <= max_size:
+                break
+            try:
+                os.remove(file)
+            except FileNotFoundError:  # evicted by another worker
+                pass
+            size -= file_size
+        self._size = size
+
+    def clear(self):
+        """Deletes all entries."""
+        self.evict(max_size=0)
+
+    def _add_size(self, file_size):
+        if self.max_size is None:
+            return
+        if self._size is None:
+            self._size = self.size()
+        else:
+            self._size += file_size
+        if self._size > self.max_size:
+            self.evict()
+
+    def _entries(self):
+        # (file, last use, size) of all entries
+        if not os.path.isdir(self.cache_path):
+            return []
+        entries = []
+        for function_dir in os.scandir(self.cache_path):
+            if not function_dir.is_dir():
+                continue
+            for entry in os.scandir(function_dir.path):
+                if entry.name.endswith(".pkl"):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((entry.path, stat.st_mtime, stat.st_size))
+        return entries
+
+
+@lru_cache(maxsize=None)
+def library_versions() -> dict:
+    """:return: dict library -> installed version (None if not installed) of VERSIONED_LIBRARIES."""
+    versions = {}
+    for library in VERSIONED_LIBRARIES:
+        try:
+            versions[library] = version(library)
+        except PackageNotFoundError:
+            versions[library] = None
+    return versions
+
+
+def function_key(fn) -> list:
+    """ Identity of a function in cache keys: its qualified name, the code_hash of its module and the library_versions.
+
+    :param fn: Module level function, or a functools.partial of one (its bound arguments are part of the identity).
+
+    :return: JSON serializable list (with default=repr).
+
+    :raises ValueError: If fn is a lambda or a nested function, whose name does not identify it.
+    """
+    arguments = []
+    if isinstance(fn, partial):
+        arguments = [list(fn.args), dict(sorted(fn.keywords.items()))]
+        fn = fn.func
+    if "<" in fn.__qualname__:
+        raise ValueError(f"only module level functions can be cached, not {fn.__qualname__}")
+    return [_function_name(fn), code_hash(fn.__module__), library_versions()] + arguments
+
+
+def _function_name(fn) -> str:
+    fn = fn.func if isinstance(fn, partial) else fn
+    return f"{fn.__module__}.{fn.__qualname__}"
+
+
+@lru_cache(maxsize=None)
+def code_hash(module_name) -> str:
+    """ Hash of the source of a module and of all repository modules it imports, directly or through other repository
+    modules, i.e., a changed helper (e.g., preprocessing_scripts/hrv.py of calculate_ecg_features_nk) changes it too.
+
+    :param module_name: Name of an imported module, e.g., fn.__module__.
+
+    :return: sha1 hex digest.
+    """
+    digest = hashlib.sha1()
+    for name in sorted(_repository_imports(module_name, set())):
+        try:
+            digest.update(name.encode() + inspect.getsource(sys.modules[name]).encode())
+        except (KeyError, TypeError, OSError):
+            pass
+    return digest.hexdigest()
+
+
+def _repository_imports(module_name, visited) -> set:
+    # the module and all modules of the repository it imports, directly or through other repository modules
+    module = sys.modules.get(module_name)
+    if module_name in visited or not os.path.abspath(getattr(module, "__file__", None) or "").startswith(_REPOSITORY):
+        return visited
+    visited.add(module_name)
+    for value in vars(module).values():
+        name = value.__name__ if inspect.ismodule(value) else getattr(value, "__module__", None)
+        if isinstance(name, str):
+            _repository_imports(name, visited)
+    return visited
+
+
+def update_digest(digest, data):
+    """ Adds the content of data (data frame, series, array or None) to a hashlib digest.
+
+    :param digest: hashlib hash object, e.g., hashlib.sha1().
+    :param data: Data to hash; the index of data frames and series is not part of the content.
+    """
+    if isinstance(data, pd.DataFrame):
+        digest.update(json.dumps([str(c) for c in data.columns]).encode())
+        digest.update(pd.util.hash_pandas_object(data, index=False).to_numpy().tobytes())
+    elif isinstance(data, pd.Series):
+        digest.update(pd.util.hash_pandas_object(data, index=False).to_numpy().tobytes())
+    elif data is not None:
+        data = np.ascontiguousarray(data)
+        digest.update(str((data.dtype.str, data.shape)).encode())
+        digest.update(data.tobytes())
+
+
+def _update_value(digest, value):
+    if isinstance(value, (pd.DataFrame, pd.Series, np.ndarray)):
+        digest.update(type(value).__name__.encode())
+        update_digest(digest, value)
+    elif isinstance(value, dict):
+        digest.update(b"dict")
+        for k in sorted(value.keys(), key=str):
+            digest.update(str(k).encode())
+            _update_value(digest, value[k])
+    elif isinstance(value, (list, tuple)):
+        digest.update(type(value).__name__.encode() + str(len(value)).encode())
+        for v in value:
+            _update_value(digest, v)
+    else:
+        digest.update(repr(value).encode())
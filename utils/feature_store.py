@@ -0,0 +1,76 @@
+import hashlib
+import json
+import os
+import pickle
+import warnings
+
+import constants
+from utils.feature_cache import function_key, update_digest
+
+
+class FeatureStore:
+    """ Persistent store of baseline (subtrahend) features.
+
+    Features are computed once per (subject, session, modality, interval definition, parameters) and content of the
+    input data, and written to store_path; later calls (also of later runs) load them instead, i.e., the background
+    subtraction is a lookup. The content hash of the data makes sure that changed recordings or cleaning steps are
+    computed again, the function key (name, source of the repository modules it uses and library versions, see
+    utils/feature_cache.py) that changed feature implementations are.
+    """
+
+    def __init__(self, store_path=constants.FEATURE_STORE_PATH, persist=True):
+        """
+        :param store_path: Directory of the stored features.
+        :param persist: False keeps the features in memory only (e.g., for interactive runs).
+        """
+        self.store_path = store_path
+        self.persist = persist
+        self._memory = {}
+
+    def get(self, compute_fn, data, subject, session, modality, interval="baseline", **params):
+        """ Returns compute_fn(data), computed at most once per key and content of data.
+
+        :param compute_fn: Module level function data -> features (any picklable object, e.g., a data frame or dict),
+                           or a functools.partial of one, e.g., partial(calculate_eda_features, mode="native").
+        :param data: Input data of compute_fn (data frame, array or None).
+        :param subject: Subject / participant id.
+        :param session: Session / setting id.
+        :param modality: Modality, e.g., "eda" or "pupil"; also the sub directory of the stored features.
+        :param interval: Name of the interval definition, e.g., "start_takeoff".
+        :param params: Further key fields which change the features, e.g., confidence_threshold=0.8 of the cleaning
+                       (the arguments of a partial compute_fn are part of the key already).
+
+        :return: Features as returned by compute_fn.
+
+        :raises ValueError: If compute_fn is a lambda or a nested function.
+        """
+        key = feature_key(data, function=function_key(compute_fn), subject=subject, session=session,
+                          modality=modality, interval=interval, **params)
+        if key in self._memory:
+            return self._memory[key]
+
+        file = os.path.join(self.store_path, str(modality), key + ".pkl")
+        if self.persist and os.path.exists(file):
+            with open(file, "rb") as f:
+                features = pickle.load(f)
+        else:
+            features = compute_fn(data)
+            if self.persist:
+                try:
+                    os.makedirs(os.path.dirname(file), exist_ok=True)
+                    tmp_file = file + f".{os.getpid()}.tmp"
+                    with open(tmp_file, "wb") as f:
+                        pickle.dump(features, f)
+                    os.replace(tmp_file, file)
+                except OSError as e:
+                    warnings.warn(f"could not store the {modality} features of subject {subject}: {e}")
+        self._memory[key] = features
+        return features
+
+
+def feature_key(data, **key) -> str:
+    """:return: content hash of the key fields and the data."""
+    digest = hashlib.sha1(json.dumps(key, sort_keys=True, default=str).encode())
+    update_digest(digest, data)
+    return digest.hexdigest()
+
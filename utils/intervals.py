@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+
+# phases of a helicopter session in temporal order (column "Phase" of timestamps.csv)
+HELICOPTER_PHASES = ["pretest", "start", "takeoff", "p1", "p1End", "p2", "p2End", "landing", "posttest"]
+
+
+class PhaseTable:
+    """ (subject, session, phase) -> timestamp lookup of the helicopter experiment.
+
+    The table is built from timestamps.csv in one pass: the k-th row of a phase belongs to subject k // n_sessions + 1
+    and session k % n_sessions + 1 (the i * 4 + s order of the file). Named intervals "<phase>_<phase>", e.g.,
+    "start_posttest" or "start_takeoff", resolve to (start, end) times, which SignalStore.interval / rows turn into row
+    ranges by binary search, i.e., trying a new interval definition does not scan any recording.
+    """
+
+    def __init__(self, time_stamps: pd.DataFrame, n_sessions=4, phase_column="Phase",
+                 timestamp_column="LocalTimestamp"):
+        """
+        :param time_stamps: Data frame with one row per (subject, session, phase), e.g., timestamps.csv.
+        :param n_sessions: Number of sessions per subject.
+        :param phase_column: Column with the phase names.
+        :param timestamp_column: Column with the timestamps in seconds, also the one of the sliced data frames.
+        """
+        self.timestamp_column = timestamp_column
+        occurrence = time_stamps.groupby(phase_column, sort=False).cumcount().to_numpy()
+        table = pd.DataFrame({"subject": occurrence // n_sessions + 1, "session": occurrence % n_sessions + 1,
+                              "phase": time_stamps[phase_column].to_numpy(),
+                              "time": time_stamps[timestamp_column].to_numpy(dtype=float)})
+        self.table = table.pivot(index=["subject", "session"], columns="phase", values="time")
+        self.phases = [p for p in HELICOPTER_PHASES if p in self.table.columns] + \
+                      [p for p in self.table.columns if p not in HELICOPTER_PHASES]
+        self.table = self.table[self.phases]
+        self._times = {(subject, session): dict(zip(self.phases, row))
+                       for (subject, session), row in zip(self.table.index, self.table.to_numpy())}
+
+    @property
+    def subjects(self) -> list:
+        return sorted({subject for subject, _ in self._times})
+
+    @property
+    def sessions(self) -> list:
+        return sorted({session for _, session in self._times})
+
+    def time(self, subject, session, phase) -> float:
+        """:return: timestamp of a phase of a session.
+
+        :raises KeyError: If the session or the phase does not exist.
+        """
+        return self._times[(subject, session)][phase]
+
+    def bounds(self, subject, session, interval, offsets=(0, 0)) -> tuple[float, float]:
+        """ Start and end time of a named interval.
+
+        :param subject: Subject id (starting at 1).
+        :param session: Session id (starting at 1).
+        :param interval: "<start phase>_<end phase>", e.g., "start_posttest", or a tuple (start phase, end phase).
+        :param offsets: Seconds added to the start and the end time, e.g., (-1.5, 0) to extend the interval.
+
+        :return: start, end time in seconds.
+
+        :raises KeyError: If the session or one of the phases does not exist.
+        """
+        start_phase, end_phase = parse_interval(interval)
+        return (self.time(subject, session, start_phase) + offsets[0],
+                self.time(subject, session, end_phase) + offsets[1])
+
+    def duration(self, subject, session, interval) -> float:
+        """:return: duration of a named interval in seconds."""
+        start, end = self.bounds(subject, session, interval)
+        return end - start
+
+    def rows(self, data, subject, session, interval, offsets=(0, 0)) -> slice:
+        """ Rows of data within a named interval (start <= timestamp <= end).
+
+        :param data: SignalStore or data frame sorted by the timestamp column (see sort_by_time).
+
+        :return: slice of the rows, e.g., for data.iloc[rows] (a view for single dtype data frames).
+        """
+        start, end = self.bounds(subject, session, interval, offsets)
+        if not isinstance(data, pd.DataFrame):  # SignalStore
+            return data.interval(start, end)
+        timestamps = data[self.timestamp_column].to_numpy()
+        lo = int(np.searchsorted(timestamps, start, side="left"))
+        hi = int(np.searchsorted(timestamps, end, side="right"))
+        return slice(lo, max(lo, hi))
+
+    def frame(self, data, subject, session, interval, offsets=(0, 0), columns=None) -> pd.DataFrame:
+        """ Data frame of a named interval, like data.loc[(t >= start) & (t <= end)] without the boolean masks.
+
+        :param data: SignalStore or data frame sorted by the timestamp column (see sort_by_time).
+        :param columns: Columns of the data frame, default all.
+
+        :return: data frame of the interval.
+        """
+        if not isinstance(data, pd.DataFrame):  # SignalStore
+            return data.frame(*self.bounds(subject, session, interval, offsets), columns=columns)
+        selected = data.iloc[self.rows(data, subject, session, interval, offsets)]
+        return selected if columns is None else selected[columns]
+
+
+def parse_interval(interval) -> tuple[str, str]:
+    """:return: start phase, end phase of "<start phase>_<end phase>" or a tuple of phases.
+
+    :raises ValueError: If the interval name does not consist of two phases.
+    """
+    phases = interval.split("_") if isinstance(interval, str) else list(interval)
+    if len(phases) != 2:
+        raise ValueError(f"interval {interval} is not of the form <start phase>_<end phase>")
+    return phases[0], phases[1]
+
+
+def sort_by_time(data: pd.DataFrame, timestamp_column="LocalTimestamp") -> pd.DataFrame:
+    """:return: data sorted (stable) by time, the precondition of PhaseTable.rows and PhaseTable.frame."""
+    timestamps = data[timestamp_column].to_numpy()
+    if np.all(timestamps[1:] >= timestamps[:-1]):
+        return data
+    return data.iloc[np.argsort(timestamps, kind="stable")]
+
+
+def cover(*bounds) -> tuple[float, float]:
+    """:return: start, end time of the smallest interval containing all (start, end) bounds, e.g., of a minuend and
+    its baseline for one peak detection (see preprocessing_scripts/peak_index.py)."""
+    return min(start for start, _ in bounds), max(end for _, end in bounds)
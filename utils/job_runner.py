@@ -0,0 +1,47 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Iterable, Iterator, Tuple
+
+
+def default_n_workers() -> int:
+    """Number of worker processes used if none is given, i.e., all cores but one (at least one)."""
+    return max(1, (os.cpu_count() or 1) - 1)
+
+
+def run_jobs(func: Callable, settings: Iterable, n_workers=None, chunksize=1,
+             verbose=False) -> Iterator[Tuple[Any, Any]]:
+    """ Runs a job function for every setting on a process pool.
+
+    Every setting (e.g., a (time, robot, participant) tuple) is processed independently by func. The results are
+    streamed back as soon as they are available, but always in the order of the given settings so that the written
+    feature files are deterministic.
+
+    :param func: Picklable (module level) function taking exactly one setting and returning its result.
+    :param settings: Iterable of settings, each setting is passed as single argument to func.
+    :param n_workers: Number of worker processes. None uses all cores but one, 1 runs everything in the calling
+                        process (handy for debugging).
+    :param chunksize: Number of settings sent to a worker at once; larger values reduce the communication overhead
+                        for many small jobs.
+    :param verbose: True gives debug prints.
+
+    :return: Generator of (setting, result) tuples in the order of the settings.
+
+    :raises Any Errors: Errors raised by func are re-raised when the corresponding result is reached.
+    """
+    settings = list(settings)
+    if n_workers is None:
+        n_workers = default_n_workers()
+    n_workers = max(1, min(n_workers, len(settings)))
+
+    if verbose:
+        print(f"running {len(settings)} jobs on {n_workers} worker(s)")
+
+    if n_workers == 1:
+        for setting in settings:
+            yield setting, func(setting)
+        return
+
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        # map submits all jobs at once and yields the results lazily in submission order
+        for setting, result in zip(settings, executor.map(func, settings, chunksize=chunksize)):
+            yield setting, result
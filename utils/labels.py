@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+
+# Label specs: a derived label bins a column by ascending thresholds, the class of a row is the number of thresholds its
+# value passes. ">=" puts a value equal to the threshold into the upper class, ">" into the lower one. With a reference
+# column, the thresholds are relative to it (value vs. threshold * reference), e.g., the duration estimate vs. the time.
+# With values (the answers of a questionnaire scale), other values raise a ValueError instead of shifting the classes.
+
+# passage of time (Julia study): 0 = very slow, 1 = slow, 2 = medium, 3 = fast, 4 = very fast (as in all_labels.csv)
+PPOT_SCALE = [0, 1, 2, 3, 4]
+PPOT_5_CLASSES = {"column": "ppot", "values": PPOT_SCALE, "thresholds": [(v, ">=") for v in PPOT_SCALE[1:]],
+                  "classes": ["very slow", "slow", "medium", "fast", "very fast"]}
+PPOT_3_CLASSES = {"column": "ppot", "values": PPOT_SCALE, "thresholds": [(PPOT_SCALE[2], ">="), (PPOT_SCALE[3], ">=")],
+                  "classes": ["slow", "medium", "fast"]}
+PPOT_2_CLASSES = {"column": "ppot", "values": PPOT_SCALE, "thresholds": [(PPOT_SCALE[3], ">=")],
+                  "classes": ["slow", "fast"]}
+# account for slight underestimation in all settings
+ESTIMATION_3_CLASSES = {"column": "duration_estimate", "reference": "time", "thresholds": [(0.75, ">="), (1.05, ">")],
+                        "classes": ["under", "correct", "over"]}
+ESTIMATION_2_CLASSES = {"column": "duration_estimate", "reference": "time", "thresholds": [(0.9, ">=")],
+                        "classes": ["under", "over"]}
+# helicopter questionnaire: below 3 -> slow, 3 -> medium, above 3 -> fast
+PASSAGE_OF_TIME_3_CLASSES = {"column": "PassageOfTimeSlowFast", "thresholds": [(3, ">="), (3, ">")],
+                             "classes": ["slow", "medium", "fast"]}
+
+# derived label columns of a study (name -> spec), see derive_labels
+JULIA_LABEL_SPECS = {"ppot_5": PPOT_5_CLASSES, "ppot_3": PPOT_3_CLASSES, "ppot_2": PPOT_2_CLASSES,
+                     "estimation_3": ESTIMATION_3_CLASSES, "estimation_2": ESTIMATION_2_CLASSES}
+HELICOPTER_LABEL_SPECS = {"PassageOfTimeSlowFast": PASSAGE_OF_TIME_3_CLASSES}
+
+
+def derive_label(labels: pd.DataFrame, spec: dict) -> pd.Series:
+    """ Class of every row according to a label spec.
+
+    :param labels: Data frame with the column (and the reference column) of the spec.
+    :param spec: Label spec, e.g., ESTIMATION_3_CLASSES.
+
+    :return: class index (0 = lowest class) per row, <NA> where the value or the reference is missing.
+
+    :raises ValueError: If a value is not one of the values of the spec or a threshold has an unknown comparison.
+    """
+    values = labels[spec["column"]].to_numpy(dtype=float)
+    if "values" in spec:
+        unexpected = np.setdiff1d(values[~np.isnan(values)], spec["values"])
+        if unexpected.shape[0] > 0:
+            raise ValueError(f"unexpected {spec['column']} values {unexpected.tolist()}, expected {spec['values']}")
+    scale = labels[spec["reference"]].to_numpy(dtype=float) if "reference" in spec else 1.0
+    classes = np.zeros(values.shape[0], dtype=np.int64)
+    for threshold, comparison in spec["thresholds"]:
+        if comparison == ">=":
+            classes += values >= threshold * scale
+        elif comparison == ">":
+            classes += values > threshold * scale
+        else:
+            raise ValueError(f"unknown comparison {comparison}, use >= or >")
+    missing = np.isnan(values) | np.isnan(scale)
+    return pd.Series(pd.arrays.IntegerArray(classes, np.broadcast_to(missing, classes.shape).copy()),
+                     index=labels.index)
+
+
+def derive_labels(labels: pd.DataFrame, specs: dict) -> pd.DataFrame:
+    """ Adds the derived label columns of specs (name -> spec), e.g., JULIA_LABEL_SPECS, to labels.
+
+    A column of labels with the name of a spec is replaced, e.g., the raw PassageOfTimeSlowFast by its 3 classes. The
+    labels of several studies or participants are derived at once from their concatenation (see concat_studies).
+
+    :return: copy of labels with the derived columns.
+    """
+    return labels.assign(**{name: derive_label(labels, spec) for name, spec in specs.items()})
+
+
+def label_counts(labels: pd.DataFrame, name: str, spec: dict, by=None) -> pd.DataFrame:
+    """ Number of rows per class of a derived label (classes without rows count 0).
+
+    :param labels: Data frame with the derived label column, see derive_labels.
+    :param name: Name of the derived label column.
+    :param spec: Label spec of the column (for the class names).
+    :param by: Column(s) to count per group, e.g., "robot" or ["study", "participant"], None for one count.
+
+    :return: data frame with one column per class name and one row per group (a single row "all" without groups).
+    """
+    n_classes = len(spec["classes"])
+    if by is None:
+        counts = labels[name].value_counts().to_frame().T.set_axis(["all"])
+    else:
+        counts = labels.groupby(by)[name].value_counts().unstack(fill_value=0)
+    counts = counts.reindex(columns=range(n_classes), fill_value=0).fillna(0).astype(np.int64)
+    counts.columns = spec["classes"]
+    return counts
+
+
+def concat_studies(studies: dict) -> pd.DataFrame:
+    """:return: labels of several studies (name -> data frame) in one data frame with an additional "study" column."""
+    return pd.concat([labels.assign(study=name) for name, labels in studies.items()], ignore_index=True)
@@ -0,0 +1,94 @@
+from collections import OrderedDict
+
+
+class LazyDataset:
+    """ Lazy mapping (subject, session, modality) -> data frame.
+
+    Only an index of the available files is built up front; a recording is read when it is accessed and kept in a
+    least recently used cache of at most max_cached recordings. Views created by slicing share the cache. Cached data
+    frames are returned as they are, i.e., copy them before modifying them in place.
+
+    Access:
+        dataset[subject, session, modality] -> data frame of one recording (ids as in the file names)
+        dataset[1:4], dataset[:, 2], dataset[:, :, ["T1", "TH"]] -> view on a subset; slices are positional over the
+            sorted available ids, single ids and lists of ids select by value
+        for key, data in dataset -> all recordings in index order, loaded one after the other
+    """
+
+    def __init__(self, files, read_fn, max_cached=8, _cache=None):
+        """
+        :param files: dict (subject, session, modality) -> path of the available recordings.
+        :param read_fn: function path -> data frame, e.g., pd.read_csv.
+        :param max_cached: maximum number of recordings kept in memory (None = unbounded).
+        """
+        self.files = OrderedDict(sorted(files.items()))
+        self.read_fn = read_fn
+        self.max_cached = max_cached
+        self._cache = OrderedDict() if _cache is None else _cache
+
+    @property
+    def subjects(self) -> list:
+        return sorted({key[0] for key in self.files})
+
+    @property
+    def sessions(self) -> list:
+        return sorted({key[1] for key in self.files})
+
+    @property
+    def modalities(self) -> list:
+        return sorted({key[2] for key in self.files})
+
+    def keys(self) -> list:
+        return list(self.files.keys())
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def __contains__(self, key) -> bool:
+        return key in self.files
+
+    def __iter__(self):
+        for key in self.files:
+            yield key, self._load(key)
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        if len(key) > 3:
+            raise KeyError(f"expected (subject, session, modality), got {key}")
+        if len(key) == 3 and not any(isinstance(k, (slice, list)) for k in key):
+            if key not in self.files:
+                raise KeyError(f"no recording for subject {key[0]}, session {key[1]}, modality {key[2]}")
+            return self._load(key)
+
+        selected = [self._select(available, k)
+                    for available, k in zip((self.subjects, self.sessions, self.modalities), key)]
+        files = {k: path for k, path in self.files.items() if all(k[j] in selected[j] for j in range(len(selected)))}
+        return LazyDataset(files, self.read_fn, self.max_cached, _cache=self._cache)
+
+    def get(self, key, default=None):
+        return self[key] if key in self.files else default
+
+    def clear_cache(self) -> None:
+        self._cache.clear()
+
+    @staticmethod
+    def _select(available, k) -> set:
+        if isinstance(k, slice):
+            return set(available[k])
+        if isinstance(k, list):
+            return set(k)
+        return {k}
+
+    def _load(self, key):
+        path = self.files[key]
+        if path in self._cache:
+            self._cache.move_to_end(path)
+            return self._cache[path]
+        data = self.read_fn(path)
+        if self.max_cached is None or self.max_cached > 0:
+            self._cache[path] = data
+            if self.max_cached is not None:
+                while len(self._cache) > self.max_cached:
+                    self._cache.popitem(last=False)
+        return data
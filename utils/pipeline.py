@@ -0,0 +1,292 @@
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from utils.feature_cache import code_hash, library_versions
+from utils.job_runner import default_n_workers
+
+
+class Stage:
+    """ One step of a Pipeline, e.g., loading, cleaning or the features of one modality.
+
+    A per-setting stage (settings given) is called once per setting as fn(setting, *dependencies, **params); it gets the
+    value of a per-setting dependency for the same setting and the result of any other dependency as a whole. Missing
+    data of a setting are returned as None by convention, the next stages pass the None on. A study stage (settings
+    None) is called once as fn(*dependencies, **params) and gets a per-setting dependency as dict setting -> value.
+    """
+
+    def __init__(self, name, fn, deps=(), settings=None, outputs=(), inputs=(), params=None):
+        """
+        :param name: Unique name, e.g., "eda/features".
+        :param fn: Picklable (module level) function of the stage.
+        :param deps: Names of the stages whose results fn gets (in this order).
+        :param settings: Settings of a per-setting stage, e.g., (subject, session) tuples, None for a study stage.
+        :param outputs: Files written by the stage; a stage with outputs is skipped while they are up to date.
+        :param inputs: Files read by the stage (e.g., the raw recordings), a change of them outdates the stage.
+        :param params: Keyword arguments of fn.
+        """
+        self.name = name
+        self.fn = fn
+        self.deps = list(deps)
+        self.settings = None if settings is None else list(settings)
+        self.outputs = list(outputs)
+        self.inputs = list(inputs)
+        self.params = {} if params is None else dict(params)
+
+    @property
+    def per_setting(self) -> bool:
+        return self.settings is not None
+
+
+class Pipeline:
+    """ Dependency graph of stages which runs only what is out of date and independent branches concurrently.
+
+    Usage:
+        pipeline = Pipeline("cache/pipeline.json")
+        pipeline.add("eda/load", load_recordings, settings=settings, kinds=["EDA"])
+        pipeline.add("eda/features", eda_features, deps=["eda/load"], settings=settings)
+        pipeline.add("eda/write", write_features, deps=["eda/features"], outputs=files)
+        pipeline.run(n_workers=8)
+
+    Chains of per-setting stages run in one job per setting on a process pool shared by all branches, i.e., the data
+    of a setting (recordings, cleaned and sliced frames) stay in the worker and only the results of the last
+    per-setting stage are sent back. Study stages run on threads as soon as their dependencies are done.
+
+    A stage with outputs is up to date if all its outputs exist and its key matches the key of its last run (kept in
+    the manifest). The key hashes the function (the source of its module and of the repository modules it imports),
+    the parameters, settings, input files and library versions of the stage and of all its dependencies. Up to date
+    stages and the stages which only they need are not run; the features of a stage which runs again are served by the
+    FeatureCache anyway.
+    """
+
+    def __init__(self, manifest_path):
+        """
+        :param manifest_path: JSON file with the keys of the last runs of the stages with outputs.
+        """
+        self.manifest_path = manifest_path
+        self.stages = {}
+        self._keys = {}
+        self._manifest_lock = threading.Lock()
+
+    def add(self, name, fn, deps=(), settings=None, outputs=(), inputs=(), **params) -> Stage:
+        """ Adds a stage (see Stage); dependencies have to be added before, i.e., the graph is acyclic.
+
+        :return: the stage.
+
+        :raises ValueError: If the name exists, a dependency is unknown, or the stage and its per-setting dependencies
+                            have different settings.
+        """
+        if name in self.stages:
+            raise ValueError(f"stage {name} exists")
+        stage = Stage(name, fn, deps, settings, outputs, inputs, params)
+        for dep in stage.deps:
+            if dep not in self.stages:
+                raise ValueError(f"unknown dependency {dep} of stage {name}")
+        settings = [self.stages[dep].settings for dep in stage.deps if self.stages[dep].per_setting]
+        if stage.per_setting:
+            settings.append(stage.settings)
+        if any(s != settings[0] for s in settings):
+            raise ValueError(f"stage {name} and its per-setting dependencies have different settings")
+        self.stages[name] = stage
+        return stage
+
+    def key(self, name) -> str:
+        """:return: hash of everything which changes the result of a stage, see Pipeline."""
+        if name not in self._keys:
+            stage = self.stages[name]
+            digest = hashlib.sha1()
+            digest.update(json.dumps([name, f"{stage.fn.__module__}.{stage.fn.__qualname__}",
+                                      code_hash(stage.fn.__module__), stage.params, stage.settings,
+                                      [_file_stat(path) for path in stage.inputs], stage.outputs,
+                                      library_versions(), [self.key(dep) for dep in stage.deps]],
+                                     sort_keys=True, default=repr).encode())
+            self._keys[name] = digest.hexdigest()
+        return self._keys[name]
+
+    def is_up_to_date(self, name) -> bool:
+        """:return: True if the stage has outputs, they exist and were written by a run with the current key."""
+        stage = self.stages[name]
+        if not stage.outputs or not all(os.path.exists(path) for path in stage.outputs):
+            return False
+        return self._read_manifest().get(name) == self.key(name)
+
+    def sinks(self) -> list:
+        """:return: names of the stages no other stage depends on, e.g., the write stages."""
+        needed = {dep for stage in self.stages.values() for dep in stage.deps}
+        return [name for name in self.stages if name not in needed]
+
+    def plan(self, targets=None, force=False) -> list:
+        """ Stages a run has to execute for the targets, in the order they were added (a topological order).
+
+        :param targets: Names of the stages to bring up to date, None for all sinks.
+        :param force: True runs the targets even if they are up to date.
+
+        :return: names of the stages to run.
+
+        :raises KeyError: If a target does not exist.
+        """
+        needed = set()
+
+        def visit(name):
+            if name not in needed:
+                needed.add(name)
+                for dep in self.stages[name].deps:
+                    visit(dep)
+
+        for name in self.sinks() if targets is None else targets:
+            if name not in self.stages:
+                raise KeyError(f"unknown stage {name}")
+            if force or not self.is_up_to_date(name):
+                visit(name)
+        return [name for name in self.stages if name in needed]
+
+    def run(self, targets=None, n_workers=None, force=False, verbose=False) -> dict:
+        """ Runs the planned stages, see plan.
+
+        :param n_workers: Number of worker processes of the per-setting jobs, None uses all cores but one, 1 runs
+                          them in the calling process.
+        :param verbose: True prints every started and finished stage.
+
+        :return: dict stage name -> result of the study stages which ran.
+
+        :raises RuntimeError: If a stage failed (after the independent stages finished); the error of the first failed
+                              stage is the cause.
+        """
+        planned = self.plan(targets, force)
+        # per-setting stages run within the jobs of the study stages which need them
+        study_stages = [name for name in planned if not self.stages[name].per_setting or
+                        not any(name in self.stages[other].deps for other in planned)]
+        requires = {name: self._study_dependencies(name) for name in study_stages}
+        if n_workers is None:
+            n_workers = default_n_workers()
+
+        results, errors = {}, {}
+        pool = ProcessPoolExecutor(max_workers=n_workers) if n_workers > 1 else None
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, len(study_stages))) as threads:
+                running = {}
+                waiting = list(study_stages)
+                while waiting or running:
+                    for name in list(waiting):
+                        if any(dep in errors for dep in requires[name]):
+                            errors[name] = None  # not run
+                            waiting.remove(name)
+                        elif all(dep in results for dep in requires[name]):
+                            if verbose:
+                                print(f"stage {name}: started")
+                            running[threads.submit(self._run_stage, name, results, pool)] = name
+                            waiting.remove(name)
+                    if not running:
+                        break
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        name = running.pop(future)
+                        try:
+                            results[name] = future.result()
+                        except Exception as e:
+                            errors[name] = e
+                            print(f"stage {name}: failed ({type(e).__name__}: {e})")
+                            continue
+                        if self.stages[name].outputs:
+                            self._write_manifest(name)
+                        if verbose:
+                            print(f"stage {name}: done")
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        failed = [name for name in study_stages if errors.get(name) is not None]
+        if failed:
+            raise RuntimeError(f"stages {failed} failed, {[n for n in errors if errors[n] is None]} did not run") \
+                from errors[failed[0]]
+        return results
+
+    def _study_dependencies(self, name) -> set:
+        # study stages whose results the stage (or its per-setting dependencies) get
+        stage = self.stages[name]
+        dependencies = set()
+        for dep in stage.deps:
+            if self.stages[dep].per_setting:
+                dependencies |= self._study_dependencies(dep)
+            else:
+                dependencies.add(dep)
+        return dependencies
+
+    def _run_stage(self, name, results, pool):
+        stage = self.stages[name]
+        settings = stage.settings if stage.per_setting else \
+            next((self.stages[dep].settings for dep in stage.deps if self.stages[dep].per_setting), None)
+        if settings is None:
+            return stage.fn(*[results[dep] for dep in stage.deps], **stage.params)
+
+        # one job per setting evaluates the per-setting stages of this stage, their study dependencies are bound
+        targets = [name] if stage.per_setting else [dep for dep in stage.deps if self.stages[dep].per_setting]
+        graph = {}
+        for target in targets:
+            self._collect_graph(target, results, graph)
+        if pool is None:
+            values = [_evaluate_setting(graph, targets, setting) for setting in settings]
+        else:
+            values = list(pool.map(_evaluate_setting, [graph] * len(settings), [targets] * len(settings), settings))
+        collected = {target: {setting: value[i] for setting, value in zip(settings, values)}
+                     for i, target in enumerate(targets)}
+        if stage.per_setting:
+            return collected[name]
+        return stage.fn(*[collected[dep] if dep in collected else results[dep] for dep in stage.deps], **stage.params)
+
+    def _collect_graph(self, name, results, graph):
+        # name -> (fn, dependencies, bound study results, params) of the per-setting stages below name
+        if name in graph:
+            return
+        stage = self.stages[name]
+        bound = {dep: results[dep] for dep in stage.deps if not self.stages[dep].per_setting}
+        graph[name] = (stage.fn, stage.deps, bound, stage.params)
+        for dep in stage.deps:
+            if self.stages[dep].per_setting:
+                self._collect_graph(dep, results, graph)
+
+    def _read_manifest(self) -> dict:
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_manifest(self, name):
+        with self._manifest_lock:
+            manifest = self._read_manifest()
+            manifest[name] = self.key(name)
+            os.makedirs(os.path.dirname(os.path.abspath(self.manifest_path)), exist_ok=True)
+            tmp_file = self.manifest_path + f".{os.getpid()}.tmp"
+            with open(tmp_file, "w") as f:
+                json.dump(manifest, f, indent=1, sort_keys=True)
+            os.replace(tmp_file, self.manifest_path)
+
+
+def _evaluate_setting(graph, targets, setting) -> tuple:
+    # values of the target stages for one setting, every per-setting stage is evaluated once
+    values = {}
+
+    def evaluate(name):
+        if name not in values:
+            fn, deps, bound, params = graph[name]
+            values[name] = fn(setting, *[bound[dep] if dep in bound else evaluate(dep) for dep in deps], **params)
+        return values[name]
+
+    return tuple(evaluate(target) for target in targets)
+
+
+def _file_stat(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def cache_path(data_root, name) -> str:
+    """:return: directory of a cache under a data root, e.g., cache_path("/Volumes/Data/chronopilot", "results") is
+    constants.FEATURE_CACHE_PATH ("csv", "signals", "features" and "results", see constants.py)."""
+    return os.path.join(data_root, "cache", name) + os.sep
@@ -0,0 +1,83 @@
+import pandas as pd
+
+
+class ResultAccumulator:
+    """ Collects feature rows and data frames and builds the result data frame once at the end.
+
+    Replaces feature_df.loc[i] = row and acc = pd.concat([acc, df]) in loops, which copy the whole data frame at every
+    append, i.e., are quadratic in the number of rows. Rows are kept as lists (one per column) and data frames as
+    chunks, to_frame concatenates them once in the order they were added.
+    """
+
+    def __init__(self, columns, dtype=None):
+        """
+        :param columns: Column names of the result.
+        :param dtype: dtype of all columns (e.g., float like the rows set with .loc on an empty data frame), None to
+                      infer it per column.
+        """
+        self.columns = list(columns)
+        self.dtype = dtype
+        self._values = [[] for _ in self.columns]  # pending rows, one list per column
+        self._index = []
+        self._has_index = False
+        self._chunks = []  # data frames (incl. flushed rows) in order
+        self._length = 0
+
+    def append(self, row, index=None) -> None:
+        """ Adds one row.
+
+        :param row: List of values in the order of the columns, dict column -> value (missing columns are NaN) or
+                    pandas series.
+        :param index: Index label of the row (default: position in the result).
+
+        :raises ValueError: If a list row does not have one value per column.
+        """
+        if isinstance(row, (dict, pd.Series)):
+            row = [row.get(c, float("nan")) for c in self.columns]
+        elif len(row) != len(self.columns):
+            raise ValueError(f"row has {len(row)} values, but there are {len(self.columns)} columns")
+        for values, value in zip(self._values, row):
+            values.append(value)
+        self._index.append(self._length if index is None else index)
+        self._has_index = self._has_index or index is not None
+        self._length += 1
+
+    def extend(self, data) -> None:
+        """ Adds all rows of a data frame (columns are matched by name, missing ones are NaN) or a list of rows.
+
+        :param data: Data frame, list of rows (see append) or None (ignored, e.g., a setting without features).
+        """
+        if data is None:
+            return
+        if isinstance(data, pd.DataFrame):
+            if data.shape[0] == 0:
+                return
+            self._flush()
+            self._chunks.append(data.reindex(columns=self.columns))
+            self._has_index = True
+            self._length += data.shape[0]
+        else:
+            for row in data:
+                self.append(row)
+
+    def to_frame(self) -> pd.DataFrame:
+        """:return: data frame of all rows in the order they were added (numeric columns are inferred)."""
+        self._flush()
+        if not self._chunks:
+            return pd.DataFrame(columns=self.columns, dtype=self.dtype)
+        frame = self._chunks[0] if len(self._chunks) == 1 else pd.concat(self._chunks, axis=0)
+        if self.dtype is not None:
+            frame = frame.astype(self.dtype)
+        if not self._has_index:
+            frame = frame.reset_index(drop=True)
+        return frame
+
+    def __len__(self) -> int:
+        return self._length
+
+    def _flush(self):
+        if self._index:
+            self._chunks.append(pd.DataFrame(dict(zip(self.columns, self._values)), index=self._index,
+                                             columns=self.columns).infer_objects())
+            self._values = [[] for _ in self.columns]
+            self._index = []
@@ -0,0 +1,118 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+_META_FILE = "meta.json"
+
+
+def ingest_csv(csv_path, store_path, timestamp_column="LocalTimestamp", read_fn=pd.read_csv) -> None:
+    """ Writes every numeric channel of a recording to a contiguous binary array file (one file per channel).
+
+    The rows are sorted by time (stable), the timestamps are stored as a channel of their own and serve as the index of
+    interval queries, see SignalStore. Non-numeric columns are not stored.
+
+    :param csv_path: Path of the raw recording.
+    :param store_path: Directory of the store, created if needed.
+    :param timestamp_column: Name of the timestamp column.
+    :param read_fn: Function path -> data frame used to read the recording.
+
+    :raises KeyError: If there is no timestamp column.
+    """
+    data = read_fn(csv_path)
+    if timestamp_column not in data.columns:
+        raise KeyError(f"{csv_path} has no timestamp column {timestamp_column}")
+    data = data.sort_values(by=timestamp_column, kind="stable")
+    os.makedirs(store_path, exist_ok=True)
+
+    channels = {}
+    for i, column in enumerate(data.columns):
+        if not pd.api.types.is_numeric_dtype(data[column]) or pd.api.types.is_bool_dtype(data[column]):
+            continue
+        values = np.ascontiguousarray(data[column].to_numpy())
+        file_name = f"channel_{i}.bin"
+        values.tofile(os.path.join(store_path, file_name))
+        channels[str(column)] = {"file": file_name, "dtype": values.dtype.str}
+
+    stat = os.stat(csv_path)
+    meta = {"source": os.path.abspath(csv_path), "source_mtime_ns": stat.st_mtime_ns, "source_size": stat.st_size,
+            "length": int(data.shape[0]), "timestamp_column": str(timestamp_column), "channels": channels}
+    # the meta file is written last, i.e., a store without it is incomplete
+    tmp_file = os.path.join(store_path, _META_FILE + f".{os.getpid()}.tmp")
+    with open(tmp_file, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp_file, os.path.join(store_path, _META_FILE))
+
+
+def is_up_to_date(csv_path, store_path) -> bool:
+    """:return: True if the store exists and was ingested from the current version of the recording."""
+    meta_file = os.path.join(store_path, _META_FILE)
+    if not os.path.exists(meta_file):
+        return False
+    with open(meta_file) as f:
+        meta = json.load(f)
+    stat = os.stat(csv_path)
+    return meta["source_mtime_ns"] == stat.st_mtime_ns and meta["source_size"] == stat.st_size
+
+
+def open_signal_store(csv_path, store_path, timestamp_column="LocalTimestamp", read_fn=pd.read_csv) -> "SignalStore":
+    """Opens the store of a recording, the recording is ingested first if the store is missing or outdated."""
+    if not is_up_to_date(csv_path, store_path):
+        ingest_csv(csv_path, store_path, timestamp_column=timestamp_column, read_fn=read_fn)
+    return SignalStore(store_path)
+
+
+class SignalStore:
+    """ Read-only, memory-mapped access to one ingested recording.
+
+    All channels are np.memmap arrays, i.e., only the pages of a requested interval are read from disk and worker
+    processes reading the same recording share the page cache. Views returned by read are zero-copy.
+    """
+
+    def __init__(self, store_path):
+        with open(os.path.join(store_path, _META_FILE)) as f:
+            meta = json.load(f)
+        self.store_path = store_path
+        self.length = meta["length"]
+        self.timestamp_column = meta["timestamp_column"]
+        self.channels = list(meta["channels"].keys())
+        self._arrays = {}
+        for column, channel in meta["channels"].items():
+            if self.length == 0:
+                self._arrays[column] = np.empty(0, dtype=np.dtype(channel["dtype"]))
+            else:
+                self._arrays[column] = np.memmap(os.path.join(store_path, channel["file"]), mode="r",
+                                                 dtype=np.dtype(channel["dtype"]), shape=(self.length,))
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        return self._arrays[self.timestamp_column]
+
+    def interval(self, start=None, end=None) -> slice:
+        """:return: rows with start <= timestamp <= end (None = open bound) as a slice."""
+        lo = 0 if start is None else int(np.searchsorted(self.timestamps, start, side="left"))
+        hi = self.length if end is None else int(np.searchsorted(self.timestamps, end, side="right"))
+        return slice(lo, max(lo, hi))
+
+    def read(self, channel, start=None, end=None) -> np.ndarray:
+        """:return: zero-copy view of one channel for start <= timestamp <= end."""
+        return self._arrays[channel][self.interval(start, end)]
+
+    def frame(self, start=None, end=None, columns=None) -> pd.DataFrame:
+        """ Data frame of the interval start <= timestamp <= end, like d.loc[(t >= start) & (t <= end)] on the raw
+        recording (the index are the row numbers of the time-sorted recording).
+
+        :param start: Start time (None = beginning of the recording).
+        :param end: End time (None = end of the recording).
+        :param columns: Channels of the data frame, default all.
+
+        :return: data frame of the interval.
+        """
+        rows = self.interval(start, end)
+        columns = self.channels if columns is None else columns
+        return pd.DataFrame({c: np.asarray(self._arrays[c][rows]) for c in columns},
+                            index=pd.RangeIndex(rows.start, rows.stop))
+
+    def __len__(self) -> int:
+        return self.length